@@ -0,0 +1,16 @@
+#!/bin/sh
+# Entrypoint of database-replica: clone the primary into an empty data
+# directory as a streaming standby (-R writes primary_conninfo and
+# standby.signal), then start postgres as the image normally would.
+set -e
+
+if [ ! -s "$PGDATA/PG_VERSION" ]; then
+    until pg_isready -h "$PRIMARY_HOST" -U "$POSTGRES_USER" -q; do
+        sleep 1
+    done
+    export PGPASSWORD="$POSTGRES_PASSWORD"
+    pg_basebackup -h "$PRIMARY_HOST" -U "$POSTGRES_USER" -D "$PGDATA" -R -X stream -c fast
+    chmod 700 "$PGDATA"
+fi
+
+exec docker-entrypoint.sh "$@"
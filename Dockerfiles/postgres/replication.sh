@@ -0,0 +1,6 @@
+#!/bin/sh
+# Run once by the postgres image on a new data directory: let the replicas
+# of the "replicas" compose profile stream WAL with the database user.
+set -e
+
+echo "host replication all all scram-sha-256" >> "$PGDATA/pg_hba.conf"
@@ -0,0 +1,358 @@
+"""
+Admission control: load shedding and rate limiting shared by all workers.
+
+LoadSheddingMiddleware runs first and answers 503 before any other work
+when this worker is overloaded. Two signals measure overload: event loop
+lag (how late a LoopLagMonitor task wakes up from a short sleep) and the
+number of requests in flight in the worker. Between SHED_*_TARGET and
+SHED_*_MAX the share of shed requests rises linearly, so the worker sheds
+just enough load to keep the accepted requests fast instead of flipping
+between all and nothing.
+
+RateLimitMiddleware applies the token buckets of RATE_LIMITS, each per
+client IP or per logged-in user and optionally limited to some views and
+methods, and answers 429 with Retry-After when a bucket is empty. IP
+buckets are checked first, so a flood from one address is rejected before
+its session is even loaded. The client IP is REMOTE_ADDR, or the address
+a proxy in RATE_LIMIT_TRUSTED_PROXIES (nginx) passes in RATE_LIMIT_IP_HEADER;
+the header of any other peer is ignored, as it could name any address.
+Peers in RATE_LIMIT_EXEMPT_IPS that do not forward a client address are not
+limited at all: loopback by default, which covers the in-process benchmark
+and warm-up clients (app.loadtest) and healthchecks, and in the compose
+setup nginx's micro-cache refreshes (app.microcache), which its internal
+server sends without X-Real-IP.
+
+The buckets live in a memory-mapped file (SharedBuckets, on /dev/shm when
+available) that every worker of the host maps, so a client gets one budget
+no matter which worker serves it, without a network round trip. The file
+is a fixed-size hash table of sets of four slots; each set is guarded by
+an fcntl lock on its byte range, and a full set reuses its least recently
+updated slot, which at worst hands a forgotten client a fresh bucket. On the
+event loop the lock is only tried; a set another worker holds is waited for
+in a thread, so that contention does not stall every request of the worker.
+"""
+import asyncio
+import errno
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import random
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpRequest, HttpResponse
+from django.urls import Resolver404, resolve
+
+from app.au.auth import SESSION_USER_KEY
+
+# Key hash (0 for a free slot), tokens, last update (Unix time).
+SLOT = struct.Struct('<Qdd')
+WAYS = 4
+SET_SIZE = SLOT.size * WAYS
+
+
+class SharedBuckets:
+    """
+    Token buckets in a memory-mapped file shared by the processes of a host.
+    """
+    def __init__(self, path: str, slots: int):
+        self.path = path
+        self.sets = max(slots // WAYS, 1)
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _open(self) -> None:
+        # Mapped per process: fcntl locks belong to the process that took them.
+        size = self.sets * SET_SIZE
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(fd).st_size < size:
+            os.ftruncate(fd, size)
+        self._fd, self._map, self._pid = fd, mmap.mmap(fd, size), os.getpid()
+
+    def take(self, key: str, rate: float, burst: float, cost: float = 1.0, blocking: bool = True) -> float | None:
+        """
+        Take cost tokens from key's bucket; return 0 if it had them, else the seconds until it will.
+
+        Unless blocking, return None at once if another thread or process holds the bucket's set.
+        """
+        digest = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+        offset = (digest % self.sets) * SET_SIZE
+        # fcntl locks exclude processes; the threads of one process take turns here.
+        if not self._lock.acquire(blocking):
+            return None
+        try:
+            if self._pid != os.getpid():
+                self._open()
+            try:
+                fcntl.lockf(self._fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB), SET_SIZE, offset, os.SEEK_SET)
+            except OSError as exc:
+                if blocking or exc.errno not in (errno.EACCES, errno.EAGAIN):
+                    raise
+                return None
+            try:
+                return self._take(offset, digest, rate, burst, cost)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, SET_SIZE, offset, os.SEEK_SET)
+        finally:
+            self._lock.release()
+
+    def _take(self, offset: int, digest: int, rate: float, burst: float, cost: float) -> float:
+        now = time.time()
+        victim, victim_updated, tokens = None, math.inf, burst
+        for way in range(WAYS):
+            position = offset + way * SLOT.size
+            slot_digest, slot_tokens, updated = SLOT.unpack_from(self._map, position)
+            if slot_digest == digest:
+                victim = position
+                tokens = min(burst, slot_tokens + max(now - updated, 0) * rate)
+                break
+            if updated < victim_updated:
+                victim, victim_updated = position, updated
+        wait = 0.0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            wait = (cost - tokens) / rate
+        SLOT.pack_into(self._map, victim, digest, tokens, now)
+        return wait
+
+
+buckets = SharedBuckets(settings.RATE_LIMIT_FILE, settings.RATE_LIMIT_SLOTS)
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    name: str
+    # Tokens added per second, and the bucket size (the allowed burst).
+    rate: float
+    burst: float
+    # 'ip', or 'user' for logged-in users (anonymous clients by IP).
+    scope: str = 'ip'
+    # View names (e.g. 'au:place_bid') and methods the limit applies to;
+    # empty for all.
+    views: frozenset = frozenset()
+    methods: frozenset = frozenset()
+
+    def applies(self, view_name: str | None, method: str) -> bool:
+        return (not self.views or view_name in self.views) and (not self.methods or method in self.methods)
+
+
+def load_rate_limits() -> list:
+    return [
+        RateLimit(
+            name, rule['rate'], rule['burst'], rule.get('scope', 'ip'),
+            frozenset(rule.get('views', ())), frozenset(rule.get('methods', ())),
+        )
+        for name, rule in settings.RATE_LIMITS.items()
+    ]
+
+
+def client_ip(request: HttpRequest) -> str:
+    """
+    The client's address: forwarded by a trusted proxy, else the peer's own.
+    """
+    remote = request.META.get('REMOTE_ADDR', '')
+    header = settings.RATE_LIMIT_IP_HEADER
+    if header and remote in settings.RATE_LIMIT_TRUSTED_PROXIES:
+        return request.META.get(header) or remote
+    return remote
+
+
+@lru_cache(maxsize=4096)
+def _view_name(path: str) -> str | None:
+    try:
+        return resolve(path).view_name
+    except Resolver404:
+        return None
+
+
+def _too_many(wait: float) -> HttpResponse:
+    response = HttpResponse("Too many requests, try again shortly.", status=429)
+    response['Retry-After'] = str(max(math.ceil(wait), 1))
+    return response
+
+
+class RateLimitMiddleware:
+    """
+    Answer 429 to clients that exhausted one of their RATE_LIMITS buckets.
+
+    Comes after the session middleware, which per-user limits read.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.limits = load_rate_limits()
+        if not self.limits:
+            raise MiddlewareNotUsed()
+        self.routed = any(limit.views for limit in self.limits)
+        self.exempt_ips = frozenset(settings.RATE_LIMIT_EXEMPT_IPS)
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def _applicable(self, request: HttpRequest) -> tuple[list, list]:
+        """
+        The (per-IP, per-user) limits that apply to the request.
+        """
+        view_name = _view_name(request.path_info) if self.routed else None
+        limits = [limit for limit in self.limits if limit.applies(view_name, request.method)]
+        return (
+            [limit for limit in limits if limit.scope == 'ip'],
+            [limit for limit in limits if limit.scope == 'user'],
+        )
+
+    def _exempt(self, request: HttpRequest) -> bool:
+        # The peer itself, not an address it forwards.
+        remote = request.META.get('REMOTE_ADDR', '')
+        return remote in self.exempt_ips and client_ip(request) == remote
+
+    @staticmethod
+    def _key(request: HttpRequest, limit: RateLimit, user_id=None) -> str:
+        identity = f'user:{user_id}' if user_id is not None else f'ip:{client_ip(request)}'
+        return f'{limit.name}:{identity}'
+
+    @classmethod
+    def _take(cls, request: HttpRequest, limits: list, user_id=None) -> float:
+        """
+        Take a token from each bucket; return the wait of the first empty one, 0 if admitted.
+        """
+        for limit in limits:
+            wait = buckets.take(cls._key(request, limit, user_id), limit.rate, limit.burst)
+            if wait:
+                return wait
+        return 0.0
+
+    @classmethod
+    async def _atake(cls, request: HttpRequest, limits: list, user_id=None) -> float:
+        for limit in limits:
+            key = cls._key(request, limit, user_id)
+            wait = buckets.take(key, limit.rate, limit.burst, blocking=False)
+            if wait is None:
+                # Held elsewhere: wait for the lock off the event loop.
+                wait = await sync_to_async(buckets.take, thread_sensitive=False)(key, limit.rate, limit.burst)
+            if wait:
+                return wait
+        return 0.0
+
+    def __call__(self, request: HttpRequest):
+        if self.is_async:
+            return self.__acall__(request)
+        if self._exempt(request):
+            return self.get_response(request)
+        ip_limits, user_limits = self._applicable(request)
+        wait = self._take(request, ip_limits)
+        if not wait and user_limits:
+            wait = self._take(request, user_limits, request.session.get(SESSION_USER_KEY))
+        if wait:
+            return _too_many(wait)
+        return self.get_response(request)
+
+    async def __acall__(self, request: HttpRequest):
+        if self._exempt(request):
+            return await self.get_response(request)
+        ip_limits, user_limits = self._applicable(request)
+        wait = await self._atake(request, ip_limits)
+        if not wait and user_limits:
+            wait = await self._atake(request, user_limits, await request.session.aget(SESSION_USER_KEY))
+        if wait:
+            return _too_many(wait)
+        return await self.get_response(request)
+
+
+class LoopLagMonitor:
+    """
+    Measures how late the event loop runs a task that sleeps every interval.
+    """
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.lag = 0.0
+        self._task = None
+
+    def ensure_started(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._run(loop), name='loop-lag-monitor')
+
+    async def _run(self, loop) -> None:
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(loop.time() - started - self.interval, 0.0)
+            # Rise at once, settle gradually: one stall is enough to start
+            # shedding, and shedding eases off as the loop recovers.
+            self.lag = lag if lag > self.lag else self.lag * 0.8 + lag * 0.2
+
+
+def _pressure(value: float, target: float, limit: float) -> float:
+    return min(max((value - target) / (limit - target), 0.0), 1.0)
+
+
+class LoadSheddingMiddleware:
+    """
+    Answer 503 to a share of requests that grows with event loop lag and requests in flight.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.LOAD_SHEDDING_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        self.monitor = LoopLagMonitor(settings.SHED_LAG_CHECK_INTERVAL)
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def shed_probability(self) -> float:
+        return max(
+            _pressure(self.monitor.lag, settings.SHED_LOOP_LAG_TARGET, settings.SHED_LOOP_LAG_MAX),
+            _pressure(self.in_flight, settings.SHED_IN_FLIGHT_TARGET, settings.SHED_IN_FLIGHT_MAX),
+        )
+
+    def _shed(self, request: HttpRequest) -> bool:
+        if request.path_info in settings.SHED_EXEMPT_PATHS:
+            return False
+        probability = self.shed_probability()
+        return probability > 0 and random.random() < probability
+
+    @staticmethod
+    def _overloaded() -> HttpResponse:
+        response = HttpResponse("The server is busy, try again shortly.", status=503)
+        response['Retry-After'] = '1'
+        return response
+
+    def __call__(self, request: HttpRequest):
+        if self.is_async:
+            return self.__acall__(request)
+        if self._shed(request):
+            return self._overloaded()
+        with self._lock:
+            self.in_flight += 1
+        try:
+            return self.get_response(request)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    async def __acall__(self, request: HttpRequest):
+        self.monitor.ensure_started()
+        if self._shed(request):
+            return self._overloaded()
+        # Only the event loop thread changes the count here.
+        self.in_flight += 1
+        try:
+            return await self.get_response(request)
+        finally:
+            self.in_flight -= 1
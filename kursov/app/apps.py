@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class AppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import signals  # noqa: F401
+        from .au import notifications  # noqa: F401  (registers its jobs)
+        from .metrics import install_sql_wrapper
+
+        connection_created.connect(install_sql_wrapper, dispatch_uid='app.metrics.sql_wrapper')
@@ -0,0 +1,243 @@
+"""
+Chunked, resumable uploads of lot attachments.
+
+The protocol is a small subset of tus:
+
+1. POST lots/<id>/attachments/ with filename, size and sha256 (hex) of the
+   whole file creates a LotAttachment and returns its upload_id.
+2. Each chunk is POSTed to attachments/<upload_id>/ as multipart field
+   "chunk", with an Upload-Offset header equal to the bytes received so
+   far and optionally Upload-Checksum: sha256 <hex> of the chunk.
+3. HEAD (or GET) attachments/<upload_id>/ returns the current offset, so
+   an interrupted client resumes from there.
+
+Under ASGI Django reads the request body before the view runs, into an
+in-memory buffer: ATTACHMENT_CHUNK_SIZE is kept below
+FILE_UPLOAD_MAX_MEMORY_SIZE, so a chunk is never spooled to a temporary
+file. ChunkUploadHandler then copies it from that buffer into the .part
+file at the offset while hashing it, instead of into an UploadedFile that
+would be copied again. A chunk that fails its checksum is cut off again. When the
+last byte arrives, the whole file is checked against the announced sha256
+and moved into MEDIA_ROOT.
+
+Locks are advisory file locks (flock), which every uvicorn worker on the
+host sees and which the kernel drops if a worker dies: one on the .part
+file so that two requests never write the same upload, and
+ATTACHMENT_UPLOADS_PER_USER slot files per user to bound how many chunks
+one user may stream at a time.
+"""
+import fcntl
+import hashlib
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile, StopUpload
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from app.models import LotAttachment
+
+UPLOAD_DIR = 'uploads'
+HASH_BLOCK = 1024 * 1024
+
+
+class UploadRejected(Exception):
+    """
+    Raised for an upload request that cannot be accepted; status is the HTTP status to answer with.
+    """
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def _upload_dir() -> Path:
+    path = Path(settings.MEDIA_ROOT) / UPLOAD_DIR
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def part_path(attachment: LotAttachment) -> Path:
+    return _upload_dir() / f'{attachment.upload_id}.part'
+
+
+def create_attachment(product_id: int, user_id: int, filename: str, size, sha256: str) -> LotAttachment:
+    """
+    Validate an announced upload and create its LotAttachment.
+    """
+    filename = get_valid_filename(os.path.basename(filename or ''))
+    if not filename.lower().endswith(settings.ATTACHMENT_EXTENSIONS):
+        raise UploadRejected(f"Allowed file types: {', '.join(settings.ATTACHMENT_EXTENSIONS)}.")
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadRejected("Invalid file size.")
+    if not 0 < size <= settings.ATTACHMENT_MAX_SIZE:
+        raise UploadRejected(f"File size must be between 1 and {settings.ATTACHMENT_MAX_SIZE} bytes.")
+    sha256 = (sha256 or '').lower()
+    if len(sha256) != 64 or any(c not in '0123456789abcdef' for c in sha256):
+        raise UploadRejected("sha256 must be a hex digest.")
+    attachment = LotAttachment.objects.create(
+        product_id=product_id, user_id=user_id, filename=filename, size=size, sha256=sha256,
+    )
+    part_path(attachment).touch()
+    return attachment
+
+
+@contextmanager
+def upload_slot(user_id: int):
+    """
+    Hold one of the user's ATTACHMENT_UPLOADS_PER_USER upload slots.
+    """
+    lock_dir = _upload_dir() / 'locks'
+    lock_dir.mkdir(exist_ok=True)
+    for slot in range(settings.ATTACHMENT_UPLOADS_PER_USER):
+        fd = os.open(lock_dir / f'user-{user_id}-{slot}.lock', os.O_CREAT | os.O_RDWR, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            continue
+        try:
+            yield
+        finally:
+            os.close(fd)
+        return
+    raise UploadRejected("Too many uploads in progress, try again when one has finished.", status=429)
+
+
+@contextmanager
+def open_part(attachment: LotAttachment, offset: int):
+    """
+    Open the .part file of an upload for writing at offset, locked against other writers.
+    """
+    try:
+        part = open(part_path(attachment), 'r+b')
+    except FileNotFoundError:
+        raise UploadRejected("Upload does not exist anymore.", status=410)
+    with part:
+        try:
+            fcntl.flock(part, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadRejected("Another chunk of this upload is being written.", status=409)
+        # Re-read under the lock: a concurrent chunk may just have finished.
+        attachment.refresh_from_db(fields=['received', 'completed_at'])
+        if attachment.is_complete:
+            raise UploadRejected("Upload is already complete.", status=409)
+        if offset != attachment.received:
+            raise UploadRejected(f"Upload-Offset must be {attachment.received}.", status=409)
+        part.seek(offset)
+        part.truncate()
+        yield part
+
+
+class ChunkUploadHandler(FileUploadHandler):
+    """
+    Upload handler copying the "chunk" field from the request body into an open .part file.
+    """
+    field_name = 'chunk'
+
+    def __init__(self, request, part, limit: int):
+        super().__init__(request)
+        self.part = part
+        self.limit = limit
+        self.digest = hashlib.sha256()
+        self.written = 0
+        self.received_chunk = False
+        self.too_large = False
+
+    def new_file(self, field_name, *args, **kwargs):
+        if field_name != self.field_name or self.received_chunk:
+            raise SkipFile()
+        super().new_file(field_name, *args, **kwargs)
+        self.received_chunk = True
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.written + len(raw_data) > self.limit:
+            self.too_large = True
+            raise StopUpload(connection_reset=True)
+        self.part.write(raw_data)
+        self.digest.update(raw_data)
+        self.written += len(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        return None
+
+
+def _checksum_header(value: str | None) -> str | None:
+    if not value:
+        return None
+    algorithm, _, digest = value.partition(' ')
+    if algorithm.lower() != 'sha256' or not digest:
+        raise UploadRejected("Upload-Checksum must be 'sha256 <hex digest>'.")
+    return digest.strip().lower()
+
+
+def receive_chunk(request, attachment: LotAttachment) -> LotAttachment:
+    """
+    Stream one chunk of request into the upload, finishing it after the last byte.
+    """
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        raise UploadRejected("Upload-Offset header is required.")
+    expected_chunk_digest = _checksum_header(request.headers.get('Upload-Checksum'))
+
+    with upload_slot(attachment.user_id), open_part(attachment, offset) as part:
+        limit = min(settings.ATTACHMENT_CHUNK_SIZE, attachment.size - offset)
+        handler = ChunkUploadHandler(request, part, limit)
+        request.upload_handlers = [handler]
+        request.FILES  # noqa: B018  (parses the body through the handler)
+        ok = handler.received_chunk and not handler.too_large and handler.written > 0
+        if ok and expected_chunk_digest is not None:
+            ok = handler.digest.hexdigest() == expected_chunk_digest
+        if not ok:
+            part.truncate(offset)
+            if handler.too_large:
+                raise UploadRejected(f"Chunk exceeds {limit} bytes.", status=413)
+            if not handler.received_chunk or handler.written == 0:
+                raise UploadRejected("Multipart field 'chunk' is missing or empty.")
+            raise UploadRejected("Chunk checksum mismatch.", status=422)
+        part.flush()
+        os.fsync(part.fileno())
+        attachment.received = offset + handler.written
+        LotAttachment.objects.filter(pk=attachment.pk).update(received=attachment.received)
+        if attachment.received == attachment.size:
+            _finish(attachment)
+    return attachment
+
+
+def _finish(attachment: LotAttachment) -> None:
+    source = part_path(attachment)
+    digest = hashlib.sha256()
+    with open(source, 'rb') as f:
+        while block := f.read(HASH_BLOCK):
+            digest.update(block)
+    if digest.hexdigest() != attachment.sha256:
+        # Start over: the client sent different bytes than it announced.
+        with open(source, 'r+b') as f:
+            f.truncate(0)
+        LotAttachment.objects.filter(pk=attachment.pk).update(received=0)
+        attachment.received = 0
+        raise UploadRejected("File checksum mismatch, upload restarted from offset 0.", status=422)
+    name = f'lots/{attachment.product_id}/{attachment.upload_id.hex}-{attachment.filename}'
+    target = Path(settings.MEDIA_ROOT) / name
+    target.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(source, target)
+    attachment.file.name = name
+    attachment.completed_at = timezone.now()
+    attachment.save(update_fields=['file', 'completed_at'])
+
+
+def upload_status(attachment: LotAttachment) -> dict:
+    return {
+        'upload_id': str(attachment.upload_id),
+        'filename': attachment.filename,
+        'size': attachment.size,
+        'offset': attachment.received,
+        'chunk_size': settings.ATTACHMENT_CHUNK_SIZE,
+        'complete': attachment.is_complete,
+        'url': attachment.file.url if attachment.is_complete else None,
+    }
@@ -0,0 +1,118 @@
+"""
+Session authentication for CustomUser.
+
+Password hashing is deliberately slow (PBKDF2 with a million iterations by
+default), so it never runs on the event loop: every hash or check is handed
+to a small thread pool (hashlib releases the GIL, so the threads really run
+in parallel). At most PASSWORD_HASH_QUEUE operations may wait for the pool;
+beyond that HashingBusy is raised and the view answers 503 instead of letting
+a login storm grow an unbounded backlog.
+
+When a stored hash uses an outdated hasher or iteration count, it is
+re-hashed with the current PASSWORD_HASHERS settings on the next successful
+login.
+
+New users are created together with their welcome email job, see
+app.au.notifications.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.db import transaction
+from django.http import HttpRequest
+
+from app.jobs import enqueue
+from app.models import CustomUser
+
+SESSION_USER_KEY = 'custom_user_id'
+
+_pool = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix='password-hash')
+_slots = asyncio.Semaphore(settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_QUEUE)
+
+
+class HashingBusy(Exception):
+    """
+    Raised when too many password operations are already queued.
+    """
+
+
+async def _run(func, *args):
+    if _slots.locked():
+        raise HashingBusy("Too many password operations in progress.")
+    async with _slots:
+        return await asyncio.get_running_loop().run_in_executor(_pool, func, *args)
+
+
+async def ahash_password(raw_password: str) -> str:
+    return await _run(make_password, raw_password)
+
+
+def _check(raw_password: str, encoded: str) -> tuple[bool, bool]:
+    """
+    Return (matches, needs_upgrade) for a stored hash.
+    """
+    outdated = []
+    matches = check_password(raw_password, encoded, setter=outdated.append)
+    return matches, bool(outdated)
+
+
+async def acheck_password(user: CustomUser, raw_password: str) -> bool:
+    """
+    Check raw_password against user's hash, upgrading the hash if it is outdated.
+    """
+    matches, needs_upgrade = await _run(_check, raw_password, user.password)
+    if matches and needs_upgrade:
+        old, user.password = user.password, await ahash_password(raw_password)
+        # Only replace the hash that was checked, in case the password changed meanwhile.
+        await CustomUser.objects.filter(pk=user.pk, password=old).aupdate(password=user.password)
+    return matches
+
+
+def create_user(username: str, email: str, password: str) -> CustomUser:
+    """
+    Create a user from an already hashed password and queue the welcome email.
+    """
+    with transaction.atomic():
+        user = CustomUser.objects.create(username=username, email=email, password=password)
+        enqueue('send_welcome_email', user_id=user.pk)
+    return user
+
+
+async def acreate_user(username: str, email: str, password: str) -> CustomUser:
+    return await sync_to_async(create_user)(username, email, password)
+
+
+async def aauthenticate(username: str, raw_password: str) -> CustomUser | None:
+    """
+    Return the user for valid credentials, otherwise None.
+    """
+    try:
+        user = await CustomUser.objects.aget(username=username)
+    except CustomUser.DoesNotExist:
+        # Hash anyway so that unknown usernames take as long as wrong passwords.
+        await ahash_password(raw_password)
+        return None
+    return user if await acheck_password(user, raw_password) else None
+
+
+async def alogin(request: HttpRequest, user: CustomUser) -> None:
+    # A new session key on login prevents session fixation.
+    await request.session.acycle_key()
+    await request.session.aset(SESSION_USER_KEY, user.pk)
+
+
+async def alogout(request: HttpRequest) -> None:
+    await request.session.aflush()
+
+
+async def aget_user(request: HttpRequest) -> CustomUser | None:
+    """
+    The CustomUser logged in on this session, if any.
+    """
+    user_id = await request.session.aget(SESSION_USER_KEY)
+    if user_id is None:
+        return None
+    return await CustomUser.objects.filter(pk=user_id).afirst()
@@ -0,0 +1,92 @@
+"""
+Bid placement for auction lots.
+
+A bid is accepted with a single conditional UPDATE on the lot row
+("set current_bid = amount where current_bid < amount"). PostgreSQL takes
+a row lock only for the lot being bid on and re-checks the condition after
+waiting, so concurrent bids on one hot lot are applied one by one without
+SELECT ... FOR UPDATE round-trips, lost updates or table locks. The Bid
+row is inserted in the same transaction, so the lot and its bid history
+never disagree. Accepted bids are published to live subscribers from
+inside the transaction, so only committed bids reach them.
+
+The same UPDATE requires the lot to be open. Closing a lot (see
+app.au.closing) locks its row as well, so a bid racing the close either
+commits first and takes part in deciding the winner, or is re-checked
+against the closed row and rejected.
+"""
+from decimal import Decimal, InvalidOperation
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.functions import Now
+
+from app.conditional import bumped
+from app.models import Bid, Product
+from .broker import get_broker
+
+# current_bid is a DecimalField(max_digits=10, decimal_places=2).
+MAX_AMOUNT = Decimal(10) ** 8
+
+
+class BidRejected(Exception):
+    """
+    Raised when a bid cannot be accepted.
+    """
+
+
+def parse_amount(value) -> Decimal:
+    """
+    Convert a raw request value into a positive bid amount.
+    """
+    try:
+        amount = Decimal(str(value))
+        if not amount.is_finite():
+            raise BidRejected("Invalid bid amount.")
+        amount = amount.quantize(Decimal('0.01'))
+    except (InvalidOperation, TypeError, ValueError):
+        raise BidRejected("Invalid bid amount.")
+    if amount <= 0:
+        raise BidRejected("Bid amount must be positive.")
+    if amount >= MAX_AMOUNT:
+        raise BidRejected(f"Bid amount must be below {MAX_AMOUNT}.")
+    return amount
+
+
+def place_bid(product_id: int, user_id: int, amount: Decimal) -> Bid:
+    """
+    Place a bid that must be higher than the current top bid of the lot.
+
+    The first bid on a lot must be at least the lot price.
+    """
+    outbids = Q(current_bid__lt=amount) | Q(current_bid__isnull=True, price__lte=amount)
+    is_open = Q(closed_at__isnull=True) & (Q(ends_at__isnull=True) | Q(ends_at__gt=Now()))
+    with transaction.atomic():
+        updated = (
+            Product.objects
+            .filter(outbids, is_open, pk=product_id)
+            .update(current_bid=amount, bid_count=F('bid_count') + 1, **bumped())
+        )
+        if not updated:
+            if not Product.objects.filter(pk=product_id).exists():
+                raise BidRejected("Lot does not exist.")
+            if not Product.objects.filter(is_open, pk=product_id).exists():
+                raise BidRejected("Auction for this lot has ended.")
+            raise BidRejected("Bid must be higher than the current top bid.")
+        bid = Bid.objects.create(product_id=product_id, user_id=user_id, amount=amount)
+        get_broker().publish(product_id, {
+            'type': 'bid',
+            'bid': bid.pk,
+            'user': user_id,
+            'amount': bid.amount,
+            'created_at': bid.created_at,
+        })
+        return bid
+
+
+async def aplace_bid(product_id: int, user_id: int, amount: Decimal) -> Bid:
+    """
+    Async version of place_bid() for use from async views.
+    """
+    return await sync_to_async(place_bid)(product_id, user_id, amount)
@@ -0,0 +1,164 @@
+"""
+Pub/sub fan-out of new bids to live WebSocket subscribers.
+
+Every worker keeps one in-memory set of subscribers per lot and pushes an
+already serialized message to each of them, so a bid costs one encode and
+no database query per subscriber. The broker class is picked with the
+LIVE_BIDS_BROKER setting:
+
+* InProcessBroker only reaches sockets held by the worker that accepted the
+  bid. It is the stand-in for local development with a single process.
+* PostgresBroker sends the bid through LISTEN/NOTIFY on the database every
+  worker already talks to, so all uvicorn workers receive it and fan it out
+  to their own sockets.
+"""
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from functools import cache
+
+import psycopg
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+def conninfo(using: str = 'default') -> str:
+    """
+    libpq connection string of a DATABASES entry, for dedicated LISTEN connections.
+    """
+    db = settings.DATABASES[using]
+    return psycopg.conninfo.make_conninfo(
+        dbname=db['NAME'],
+        user=db.get('USER') or None,
+        password=db.get('PASSWORD') or None,
+        host=db.get('HOST') or None,
+        port=db.get('PORT') or None,
+    )
+
+
+class Subscription:
+    """
+    A bounded message queue for one WebSocket connection.
+    """
+    def __init__(self, broker: 'InProcessBroker', lot_id: int, maxsize: int):
+        self.broker = broker
+        self.lot_id = lot_id
+        self.queue = asyncio.Queue(maxsize)
+
+    def deliver(self, message) -> None:
+        # A slow client must not hold up the others: drop its oldest message.
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self):
+        """
+        Wait for the next message; None means the subscription was closed.
+        """
+        return await self.queue.get()
+
+    def close(self) -> None:
+        self.broker.unsubscribe(self)
+        self.deliver(None)
+
+
+class InProcessBroker:
+    """
+    Fan-out limited to the current process.
+    """
+    def __init__(self, queue_size: int = 64):
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)
+        self._loop = None
+
+    async def subscribe(self, lot_id: int) -> Subscription:
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription(self, lot_id, self.queue_size)
+        self._subscribers[lot_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self._subscribers.get(subscription.lot_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.lot_id]
+
+    def subscriber_count(self, lot_id: int) -> int:
+        return len(self._subscribers.get(lot_id, ()))
+
+    @staticmethod
+    def encode(lot_id: int, payload: dict) -> str:
+        return json.dumps({'lot': lot_id, **payload}, cls=DjangoJSONEncoder)
+
+    def publish(self, lot_id: int, payload: dict) -> None:
+        """
+        Publish a bid from synchronous ORM code once its transaction commits.
+        """
+        message = self.encode(lot_id, payload)
+        transaction.on_commit(lambda: self._dispatch_threadsafe(lot_id, message))
+
+    def _dispatch_threadsafe(self, lot_id: int, message: str) -> None:
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self._fan_out, lot_id, message)
+
+    def _fan_out(self, lot_id: int, message: str) -> None:
+        for subscription in tuple(self._subscribers.get(lot_id, ())):
+            subscription.deliver(message)
+
+
+class PostgresBroker(InProcessBroker):
+    """
+    Fan-out across worker processes through PostgreSQL LISTEN/NOTIFY.
+
+    NOTIFY is transactional, so subscribers only hear about committed bids.
+    Each worker holds a single listening connection.
+    """
+    channel = 'live_bids'
+    reconnect_delay = 1.0
+
+    def __init__(self, queue_size: int = 64, using: str = 'default'):
+        super().__init__(queue_size)
+        self.using = using
+        self._listener = None
+
+    def publish(self, lot_id: int, payload: dict) -> None:
+        message = self.encode(lot_id, payload)
+        with connections[self.using].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.channel, f'{lot_id}:{message}'])
+
+    async def subscribe(self, lot_id: int) -> Subscription:
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+        return await super().subscribe(lot_id)
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                conn = await psycopg.AsyncConnection.connect(conninfo(self.using), autocommit=True)
+                async with conn:
+                    await conn.execute(f'LISTEN {self.channel}')
+                    async for notify in conn.notifies():
+                        lot_id, _, message = notify.payload.partition(':')
+                        self._fan_out(int(lot_id), message)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Live bid listener failed, reconnecting.")
+                await asyncio.sleep(self.reconnect_delay)
+
+
+@cache
+def get_broker() -> InProcessBroker:
+    """
+    Return the broker configured by the LIVE_BIDS_BROKER setting.
+    """
+    broker_class = import_string(settings.LIVE_BIDS_BROKER)
+    return broker_class(queue_size=settings.LIVE_BIDS_QUEUE_SIZE)
@@ -0,0 +1,262 @@
+"""
+Closing auction lots at their end time.
+
+Every uvicorn worker runs one AuctionScheduler task, started from the ASGI
+lifespan (see conf.asgi). It keeps a heap of (ends_at, lot id) for the open
+lots ending within AUCTION_SCHEDULE_HORIZON seconds and sleeps until the
+earliest one is due, so an idle scheduler costs nothing and a due lot is
+closed within milliseconds instead of at the next cron minute. The heap is
+refilled from the partial product_open_ends_at_idx index every half
+horizon, and lots saved with a new end time are announced to all workers
+through LISTEN/NOTIFY, so a lot ending a few seconds after it was created
+is not missed.
+
+Due lots are closed in batches of up to AUCTION_CLOSE_BATCH_SIZE in one
+transaction: the lots are locked with SELECT ... FOR UPDATE SKIP LOCKED,
+the top bid of each is looked up with a single DISTINCT ON query, winners
+get an Order and a notification job (see app.jobs) and all lots get
+closed_at. All workers hold the same schedule and race for the same lots;
+SKIP LOCKED hands every lot to one of them, and the closed_at filter makes
+the others ignore it afterwards, so each lot closes exactly once. Bids
+lock the lot row too (see app.au.bidding), so a bid either commits before
+the lot closes and can win, or sees the closed lot and is rejected.
+"""
+import asyncio
+import heapq
+import logging
+from datetime import UTC, datetime, timedelta
+
+import psycopg
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from app.cache import catalog_cache
+from app.conditional import bumped
+from app.jobs import enqueue_many
+from app.microcache import purge_lot
+from app.models import Bid, Order, Product
+from .broker import conninfo, get_broker
+
+logger = logging.getLogger(__name__)
+
+SCHEDULE_CHANNEL = 'auction_schedule'
+REFILL_LIMIT = 10000
+
+
+def announce(product: Product, using: str = 'default') -> None:
+    """
+    Tell every worker's scheduler about the end time of a saved lot.
+
+    NOTIFY is transactional, so the lot is only announced once it commits.
+    """
+    if product.ends_at is None or product.closed_at is not None:
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            'SELECT pg_notify(%s, %s)', [SCHEDULE_CHANNEL, f'{product.pk}:{product.ends_at.timestamp()}'],
+        )
+
+
+def winning_bids(product_ids: list):
+    """
+    The highest bid of each lot, the earliest one on ties, in one DISTINCT ON query.
+    """
+    return (
+        Bid.objects.filter(product_id__in=product_ids)
+        .order_by('product_id', '-amount', 'created_at')
+        .distinct('product_id')
+    )
+
+
+def close_lots(product_ids: list, now: datetime | None = None) -> list:
+    """
+    Close the given lots that are due and still open; return the ids closed by this call.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        lots = list(
+            Product.objects
+            .select_for_update(skip_locked=True)
+            .filter(pk__in=product_ids, closed_at__isnull=True, ends_at__lte=now)
+            .order_by('pk')
+            .values_list('pk', 'stock')
+        )
+        if not lots:
+            return []
+        ids = [pk for pk, _ in lots]
+        top_bids = {bid.product_id: bid for bid in winning_bids(ids)}
+        # A lot whose stock was sold out by direct orders closes without a winner.
+        won = [pk for pk, stock in lots if pk in top_bids and stock > 0]
+        orders = Order.objects.bulk_create(
+            Order(product_id=pk, user_id=top_bids[pk].user_id, quantity=1) for pk in won
+        )
+        enqueue_many('notify_auction_winner', [{'order_id': order.pk} for order in orders])
+        Product.objects.filter(pk__in=won).update(stock=F('stock') - 1, closed_at=now, **bumped())
+        Product.objects.filter(pk__in=ids).exclude(pk__in=won).update(closed_at=now, **bumped())
+
+        broker = get_broker()
+        for pk in ids:
+            bid = top_bids.get(pk) if pk in won else None
+            broker.publish(pk, {
+                'type': 'closed',
+                'closed_at': now,
+                'winner': bid.user_id if bid else None,
+                'amount': bid.amount if bid else None,
+            })
+            transaction.on_commit(lambda pk=pk: _invalidate_lot(pk))
+    return ids
+
+
+def _invalidate_lot(product_id: int) -> None:
+    catalog_cache.bump('product', product_id)
+    catalog_cache.bump('lot', product_id)
+    purge_lot(product_id)
+
+
+def still_due(product_ids, now: datetime) -> list:
+    """
+    The given lots that are still open and due, e.g. after close_lots()
+    skipped them. A plain read, so rows locked by a bid do not block it.
+    """
+    return list(
+        Product.objects
+        .filter(pk__in=product_ids, closed_at__isnull=True, ends_at__lte=now)
+        .values_list('pk', flat=True)
+    )
+
+
+def due_lots(until: datetime, limit: int = REFILL_LIMIT) -> list:
+    """
+    (ends_at, id) of open lots ending before until, earliest first.
+    """
+    return list(
+        Product.objects
+        .filter(closed_at__isnull=True, ends_at__isnull=False, ends_at__lt=until)
+        .order_by('ends_at')
+        .values_list('ends_at', 'pk')[:limit]
+    )
+
+
+class AuctionScheduler:
+    """
+    Per-worker timer heap of lots about to end.
+    """
+    retry_delay = 1.0
+    # Due lots close_lots() skipped because a bid or order held their row
+    # are tried again this soon, not at the next refill.
+    locked_retry_delay = 0.1
+
+    def __init__(self, horizon: float, batch_size: int, using: str = 'default'):
+        self.horizon = timedelta(seconds=horizon)
+        self.batch_size = batch_size
+        self.using = using
+        self._heap = []
+        # Latest known end time per scheduled lot; heap entries that do not
+        # match it are stale and skipped when popped.
+        self._scheduled = {}
+        # Every open lot ending before this is in the heap.
+        self._loaded_until = None
+        self._next_refill = None
+        self._wake = asyncio.Event()
+
+    def schedule(self, product_id: int, ends_at: datetime) -> None:
+        if self._loaded_until is not None and ends_at >= self._loaded_until:
+            return  # Picked up by a later refill.
+        if self._scheduled.get(product_id) == ends_at:
+            return
+        self._scheduled[product_id] = ends_at
+        heapq.heappush(self._heap, (ends_at, product_id))
+        if self._heap[0] == (ends_at, product_id):
+            self._wake.set()
+
+    async def refill(self) -> None:
+        now = timezone.now()
+        until = now + self.horizon
+        rows = await sync_to_async(due_lots)(until)
+        self._loaded_until = None
+        for ends_at, product_id in rows:
+            self.schedule(product_id, ends_at)
+        # A truncated refill only covers lots up to the last one loaded.
+        self._loaded_until = rows[-1][0] if len(rows) == REFILL_LIMIT else until
+        self._next_refill = min(now + self.horizon / 2, self._loaded_until)
+
+    def _retry(self, product_id: int, at: datetime) -> None:
+        # Past the _loaded_until check of schedule(): the lot is already due.
+        self._scheduled[product_id] = at
+        heapq.heappush(self._heap, (at, product_id))
+
+    def _pop_due(self, now: datetime) -> list:
+        due = []
+        while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+            ends_at, product_id = heapq.heappop(self._heap)
+            if self._scheduled.get(product_id) == ends_at:
+                del self._scheduled[product_id]
+                due.append(product_id)
+        return due
+
+    def _seconds_to_next(self, now: datetime) -> float:
+        wake_at = self._next_refill
+        if self._heap:
+            wake_at = min(wake_at, self._heap[0][0])
+        return max((wake_at - now).total_seconds(), 0)
+
+    async def run(self) -> None:
+        listener = asyncio.create_task(self._listen())
+        try:
+            while True:
+                try:
+                    await self._tick()
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    logger.exception("Auction scheduler failed, retrying.")
+                    self._next_refill = None
+                    await asyncio.sleep(self.retry_delay)
+        finally:
+            listener.cancel()
+
+    async def _tick(self) -> None:
+        now = timezone.now()
+        if self._next_refill is None or now >= self._next_refill:
+            await self.refill()
+        due = self._pop_due(timezone.now())
+        if due:
+            now = timezone.now()
+            closed = await sync_to_async(close_lots)(due, now)
+            if closed:
+                logger.info("Closed %d of %d due lots.", len(closed), len(due))
+            skipped = set(due).difference(closed)
+            if skipped:
+                # Closed by another worker, or locked by an in-flight bid.
+                retry_at = now + timedelta(seconds=self.locked_retry_delay)
+                for product_id in await sync_to_async(still_due)(skipped, now):
+                    self._retry(product_id, retry_at)
+            return
+        self._wake.clear()
+        try:
+            await asyncio.wait_for(self._wake.wait(), self._seconds_to_next(timezone.now()))
+        except TimeoutError:
+            pass
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                conn = await psycopg.AsyncConnection.connect(conninfo(self.using), autocommit=True)
+                async with conn:
+                    await conn.execute(f'LISTEN {SCHEDULE_CHANNEL}')
+                    async for notify in conn.notifies():
+                        product_id, _, timestamp = notify.payload.partition(':')
+                        ends_at = datetime.fromtimestamp(float(timestamp), tz=UTC)
+                        self.schedule(int(product_id), ends_at)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Auction schedule listener failed, reconnecting.")
+                await asyncio.sleep(self.retry_delay)
+
+
+def get_scheduler() -> AuctionScheduler:
+    return AuctionScheduler(settings.AUCTION_SCHEDULE_HORIZON, settings.AUCTION_CLOSE_BATCH_SIZE)
@@ -0,0 +1,49 @@
+"""
+ASGI WebSocket endpoint streaming new bids of a lot.
+
+Clients connect to /ws/lots/<product_id>/ and receive one JSON text frame
+per accepted bid. Incoming frames are ignored.
+"""
+import asyncio
+import re
+
+from .broker import get_broker
+
+LOT_PATH = re.compile(r'^/ws/lots/(?P<product_id>\d+)/$')
+
+
+async def _wait_for_disconnect(receive) -> None:
+    while True:
+        message = await receive()
+        if message['type'] == 'websocket.disconnect':
+            return
+
+
+async def websocket_application(scope, receive, send) -> None:
+    """
+    Accept a live-bid subscription and stream bids until the client leaves.
+    """
+    match = LOT_PATH.match(scope['path'])
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    if match is None:
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+
+    subscription = await get_broker().subscribe(int(match['product_id']))
+    await send({'type': 'websocket.accept'})
+
+    async def close_on_disconnect():
+        await _wait_for_disconnect(receive)
+        subscription.close()
+
+    watcher = asyncio.create_task(close_on_disconnect())
+    try:
+        while (text := await subscription.get()) is not None:
+            await send({'type': 'websocket.send', 'text': text})
+    except OSError:
+        pass
+    finally:
+        watcher.cancel()
+        subscription.close()
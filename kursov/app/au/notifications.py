@@ -0,0 +1,41 @@
+"""
+Emails to users, sent as background jobs (see app.jobs) so that a slow or
+unreachable mail server never holds up a request or an auction closing.
+
+Jobs get ids rather than objects and load them when they run; a user or
+order deleted in the meantime is skipped.
+"""
+from django.core.mail import send_mail
+
+from app.jobs import job
+from app.models import CustomUser, Order
+
+# Mail servers throttle parallel connections from one client.
+EMAIL_CONCURRENCY = 2
+
+
+@job('send_welcome_email', concurrency=EMAIL_CONCURRENCY)
+def send_welcome_email(user_id: int) -> None:
+    user = CustomUser.objects.filter(pk=user_id).first()
+    if user is None:
+        return
+    send_mail(
+        "Welcome to the auction",
+        f"Hi {user.username},\n\nyour account is ready. Happy bidding!",
+        None,
+        [user.email],
+    )
+
+
+@job('notify_auction_winner', concurrency=EMAIL_CONCURRENCY)
+def notify_auction_winner(order_id: int) -> None:
+    order = Order.objects.select_related('product', 'user').filter(pk=order_id).first()
+    if order is None or order.user is None:
+        return
+    send_mail(
+        f"You won {order.product.name}",
+        f"Hi {order.user.username},\n\nyour bid won the auction for {order.product.name}. "
+        f"Your order number is {order.pk}.",
+        None,
+        [order.user.email],
+    )
@@ -0,0 +1,96 @@
+"""
+Order placement with atomic stock decrements.
+
+Each line of an order takes its stock with one conditional UPDATE
+("set stock = stock - n where stock >= n"). The database evaluates the
+condition and the new value on the locked row, so there is no
+read-modify-write in Python and concurrent orders can never take more
+stock than there is: when the row is locked by another order, PostgreSQL
+waits and re-checks the condition against the committed stock.
+
+All lines of an order run in one transaction and an unavailable line rolls
+back the lines before it. Lines for the same lot are merged and the
+updates run in ascending lot id order, so every transaction takes its row
+locks in the same global order and two orders sharing lots cannot
+deadlock. The Order rows are then written with a single bulk INSERT.
+"""
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import F
+
+from app.cache import catalog_cache
+from app.conditional import bumped
+from app.microcache import purge_lot
+from app.models import Order, Product
+
+MAX_ORDER_LINES = 50
+MAX_LINE_QUANTITY = 1000
+
+
+class OrderRejected(Exception):
+    """
+    Raised when an order cannot be placed.
+    """
+
+
+def parse_lines(products: list, quantities: list) -> dict:
+    """
+    Convert the parallel product/quantity lists of a request into {product_id: quantity}.
+
+    Lines for the same lot are added up.
+    """
+    if not products:
+        raise OrderRejected("An order needs at least one line.")
+    if len(products) != len(quantities):
+        raise OrderRejected("Every product needs a quantity.")
+    lines = {}
+    for product, quantity in zip(products, quantities):
+        try:
+            product_id, quantity = int(product), int(quantity)
+        except (TypeError, ValueError):
+            raise OrderRejected("Invalid product or quantity.")
+        if quantity <= 0 or quantity > MAX_LINE_QUANTITY:
+            raise OrderRejected(f"Quantity must be between 1 and {MAX_LINE_QUANTITY}.")
+        lines[product_id] = lines.get(product_id, 0) + quantity
+    if len(lines) > MAX_ORDER_LINES:
+        raise OrderRejected(f"An order can have at most {MAX_ORDER_LINES} lots.")
+    return lines
+
+
+def place_order(user_id: int, lines: dict) -> list:
+    """
+    Take stock for every {product_id: quantity} line and create the orders, all or nothing.
+    """
+    with transaction.atomic():
+        for product_id in sorted(lines):
+            quantity = lines[product_id]
+            updated = (
+                Product.objects
+                .filter(pk=product_id, stock__gte=quantity)
+                .update(stock=F('stock') - quantity, **bumped())
+            )
+            if not updated:
+                if not Product.objects.filter(pk=product_id).exists():
+                    raise OrderRejected(f"Lot {product_id} does not exist.")
+                raise OrderRejected(f"Not enough stock for lot {product_id}.")
+        orders = Order.objects.bulk_create(
+            Order(product_id=product_id, user_id=user_id, quantity=lines[product_id])
+            for product_id in sorted(lines)
+        )
+        # Queryset updates and bulk_create send no signals, see app.signals.
+        for product_id in lines:
+            transaction.on_commit(lambda product_id=product_id: _invalidate_lot(product_id))
+        return orders
+
+
+def _invalidate_lot(product_id: int) -> None:
+    catalog_cache.bump('product', product_id)
+    catalog_cache.bump('lot', product_id)
+    purge_lot(product_id)
+
+
+async def aplace_order(user_id: int, lines: dict) -> list:
+    """
+    Async version of place_order() for use from async views.
+    """
+    return await sync_to_async(place_order)(user_id, lines)
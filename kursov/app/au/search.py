@@ -0,0 +1,54 @@
+"""
+Ranked full-text search over lot names and descriptions.
+
+Product.search_vector is filled by a database trigger on every insert or
+change of name/description (name weighted A, description B) and backed by a
+GIN index. Every query word is matched as a prefix, so "steam acc" finds
+"Steam account". When nothing matches, a trigram word-similarity lookup on
+the name (also GIN indexed) catches typos such as "stema".
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db.models import F
+
+from app.models import Product
+
+# Must match the configuration used by the trigger in migration 0003.
+SEARCH_CONFIG = 'simple'
+MAX_TERMS = 8
+
+_WORD = re.compile(r'\w+')
+
+
+def _prefix_query(query: str) -> SearchQuery | None:
+    terms = _WORD.findall(query.lower())[:MAX_TERMS]
+    if not terms:
+        return None
+    # Terms only contain word characters, so they are safe in a raw tsquery.
+    return SearchQuery(' & '.join(f'{term}:*' for term in terms), search_type='raw', config=SEARCH_CONFIG)
+
+
+def search_products(query: str, limit: int = 20) -> list:
+    """
+    Best matching lots for a free-text query, most relevant first.
+    """
+    ts_query = _prefix_query(query)
+    if ts_query is None:
+        return []
+    results = list(
+        Product.objects
+        .select_related('rating')
+        .filter(search_vector=ts_query)
+        .annotate(rank=SearchRank(F('search_vector'), ts_query))
+        .order_by('-rank', '-id')[:limit]
+    )
+    if results:
+        return results
+    return list(
+        Product.objects
+        .select_related('rating')
+        .filter(name__trigram_word_similar=query)
+        .annotate(rank=TrigramWordSimilarity(query, 'name'))
+        .order_by('-rank', '-id')[:limit]
+    )
@@ -25,6 +25,15 @@ urlpatterns = [
     path('profile/', views.profile, name='profile'),
     path('profile/edit/', views.edit_profile, name='edit_profile'),
     path('password_change/', views.password_change, name='password_change'),
+    path('lots/', views.lot_list, name='lot_list'),
+    path('lots/export/', views.lots_export, name='lots_export'),
+    path('categories/', views.category_list, name='category_list'),
+    path('search/', views.search, name='search'),
+    path('lots/<int:product_id>/', views.auction_detail, name='auction_detail'),
+    path('lots/<int:product_id>/bid/', views.place_bid, name='place_bid'),
+    path('orders/', views.place_order, name='place_order'),
+    path('lots/<int:product_id>/attachments/', views.create_lot_attachment, name='create_lot_attachment'),
+    path('attachments/<uuid:upload_id>/', views.lot_attachment_upload, name='lot_attachment_upload'),
     # path('password_reset/', views.password_reset, name='password_reset'),
     # path('password_reset/done/', views.password_reset_done, name='password_reset_done'),
 ]
\ No newline at end of file
@@ -1,16 +1,89 @@
-from django.http import HttpResponse, HttpRequest
-from django.shortcuts import render
-from django.views.decorators.http import require_GET
+import json
+
+from django.core.paginator import Paginator
+from django.db import IntegrityError, router
+from django.http import Http404, HttpResponse, HttpRequest, JsonResponse
+from django.middleware.csrf import get_token
+from django.templatetags.static import static
+from django.views.decorators.cache import cache_page
+from django.views.decorators.http import require_GET, require_POST
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.contrib.auth.decorators import login_required
 
+from app.catalog import get_categories, get_lot
+from app.conditional import conditional_response, lot_etag, page_etag, page_last_modified
+from app.models import CustomUser, LotAttachment, Product
+from app.pagination import InvalidCursor, KeysetPaginator
+from app.ratings import rating_summary
+from app.rendering import arender, render
+from app.streaming import FORMATS, streaming_json_response
+from .attachments import UploadRejected, create_attachment, receive_chunk, upload_status
+from .auth import (
+    SESSION_USER_KEY, HashingBusy, aauthenticate, acheck_password, acreate_user, aget_user, ahash_password, alogin,
+    alogout,
+)
+from .bidding import BidRejected, aplace_bid, parse_amount
+from .forms import LoginForm, PasswordChangeForm, RegisterForm
+from .ordering import OrderRejected, aplace_order, parse_lines
+from .search import search_products
+
+LOTS_PER_PAGE = 20
+SEARCH_MAX_RESULTS = 50
+EXPORT_CHUNK_SIZE = 2000
+LOT_ORDERINGS = {
+    'newest': ('-created_at', '-id'),
+    'price': ('price', 'id'),
+    '-price': ('-price', '-id'),
+}
+
+def _lot_page(request: HttpRequest):
+    """
+    Keyset-paginated page of lots for the ?sort= and ?cursor= parameters.
+    """
+    ordering = LOT_ORDERINGS.get(request.GET.get('sort'), LOT_ORDERINGS['newest'])
+    paginator = KeysetPaginator(Product.objects.select_related('rating'), ordering, per_page=LOTS_PER_PAGE)
+    return paginator.get_page(request.GET.get('cursor'))
+
+def _lot_summary(product: Product) -> dict:
+    return {
+        'id': product.pk,
+        'name': product.name,
+        'price': str(product.price),
+        'current_bid': str(product.current_bid) if product.current_bid is not None else None,
+        'bid_count': product.bid_count,
+        'created_at': product.created_at,
+        **rating_summary(product),
+    }
+
 @require_GET
 def index(request: HttpRequest) -> HttpResponse:
     """
-    Render the index page.
+    Render the index page with one page of lots.
     """
-    return render(request, 'au/index.html')
+    try:
+        page = _lot_page(request)
+    except InvalidCursor as exc:
+        return HttpResponse(str(exc), status=400)
+    return conditional_response(
+        request, page_etag(page), page_last_modified(page),
+        lambda: render(request, 'au/index.html', {'page': page, 'sort': request.GET.get('sort', 'newest')}),
+    )
+
+@require_GET
+def lot_list(request: HttpRequest) -> HttpResponse:
+    """
+    One page of lots as JSON with opaque next/previous cursors.
+    """
+    try:
+        page = _lot_page(request)
+    except InvalidCursor as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return conditional_response(request, page_etag(page), page_last_modified(page), lambda: JsonResponse({
+        'results': [_lot_summary(product) for product in page],
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    }))
 
 @csrf_exempt
 @login_required
@@ -19,7 +92,6 @@ def custom_view_with_csrf(request: HttpRequest) -> HttpResponse:
     Custom view that requires CSRF protection and authentication.
     """
     if request.method == 'POST':
-        from django.middleware.csrf import get_token
         csrf_token = get_token(request)
         return HttpResponse(f"CSRF token: {csrf_token}")
     else:
@@ -64,7 +136,6 @@ def custom_view_with_json(request: HttpRequest) -> HttpResponse:
     """
     Custom view that accepts JSON data in POST requests.
     """
-    import json
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
@@ -101,7 +172,6 @@ def custom_view_with_pagination(request: HttpRequest) -> HttpResponse:
     """
     Custom view that demonstrates pagination.
     """
-    from django.core.paginator import Paginator
     items = list(range(1, 101))
 
     paginator = Paginator(items, 10)  # Show 10 items per page
@@ -120,24 +190,18 @@ def custom_view_with_custom_response(request: HttpRequest) -> HttpResponse:
     return response
 
 @csrf_exempt
+@cache_page(60 * 15)  # Cache for 15 minutes
 def custom_view_with_caching(request: HttpRequest) -> HttpResponse:
     """
     Custom view that demonstrates caching.
     """
-    from django.views.decorators.cache import cache_page
-    @cache_page(60 * 15)  # Cache for 15 minutes
-    def cached_view(request: HttpRequest) -> HttpResponse:
-        return HttpResponse("This response is cached for 15 minutes.")
-    
-    return cached_view(request)
+    return HttpResponse("This response is cached for 15 minutes.")
 
 @csrf_exempt
 def custom_view_with_static_files(request: HttpRequest) -> HttpResponse:
     """
     Custom view that serves static files.
     """
-    from django.conf import settings
-    from django.templatetags.static import static
     static_file_url = static('css/style.css')
 
     return HttpResponse(f"Static file URL: {static_file_url}")
@@ -147,8 +211,6 @@ def custom_view_with_media_files(request: HttpRequest) -> HttpResponse:
     """
     Custom view that serves media files.
     """
-    from django.conf import settings
-    from django.templatetags.static import static
     media_file_url = static('media/example.jpg')
 
     return HttpResponse(f"Media file URL: {media_file_url}")
@@ -177,7 +239,6 @@ def custom_view_with_template_and_static(request: HttpRequest) -> HttpResponse:
     """
     Custom view that renders a template with static files.
     """
-    from django.templatetags.static import static
     context = {
         'title': 'Custom Template with Static Files',
         'static_file': static('css/style.css'),
@@ -189,7 +250,6 @@ def custom_view_with_template_and_media(request: HttpRequest) -> HttpResponse:
     """
     Custom view that renders a template with media files.
     """
-    from django.templatetags.static import static
     context = {
         'title': 'Custom Template with Media Files',
         'media_file': static('media/example.jpg'),
@@ -201,7 +261,6 @@ def custom_view_with_template_and_csrf(request: HttpRequest) -> HttpResponse:
     """
     Custom view that renders a template with CSRF protection.
     """
-    from django.middleware.csrf import get_token
     csrf_token = get_token(request)
     context = {
         'title': 'Custom Template with CSRF',
@@ -210,40 +269,61 @@ def custom_view_with_template_and_csrf(request: HttpRequest) -> HttpResponse:
     return render(request, 'au/custom_template_with_csrf.html', context)
 
 @csrf_exempt
-def login_view(request: HttpRequest) -> HttpResponse:
-    """
-    Custom login view.
-    """
-    if request.method == 'POST':
-        username = request.POST.get('username')
-        password = request.POST.get('password')
-        # Here you would typically authenticate the user
-        return HttpResponse(f"Logged in as {username}")
-    else:
-        return render(request, 'au/login.html')
-    
+async def login_view(request: HttpRequest) -> HttpResponse:
+    """
+    Log a CustomUser in with username and password.
+    """
+    if request.method != 'POST':
+        return await arender(request, 'au/login.html', {'form': LoginForm()})
+    form = LoginForm(request.POST)
+    if not form.is_valid():
+        return await arender(request, 'au/login.html', {'form': form}, status=400)
+    try:
+        user = await aauthenticate(form.cleaned_data['username'], form.cleaned_data['password'])
+    except HashingBusy:
+        return HttpResponse("Too many login attempts right now, try again shortly.", status=503)
+    if user is None:
+        form.add_error(None, "Invalid username or password.")
+        return await arender(request, 'au/login.html', {'form': form}, status=401)
+    await alogin(request, user)
+    return HttpResponse(f"Logged in as {user.username}")
+
 @csrf_exempt
-def logout_view(request: HttpRequest) -> HttpResponse:
+async def logout_view(request: HttpRequest) -> HttpResponse:
     """
-    Custom logout view.
+    Log the current user out.
     """
-    # Here you would typically log out the user
+    await alogout(request)
     return HttpResponse("Logged out successfully.")
 
 @csrf_exempt
-def register(request: HttpRequest) -> HttpResponse:
-    """
-    Custom registration view.
-    """
-    if request.method == 'POST':
-        username = request.POST.get('username')
-        email = request.POST.get('email')
-        password = request.POST.get('password')
-        # Here you would typically create a new user
-        return HttpResponse(f"Registered user: {username}")
-    else:
-        return render(request, 'au/register.html')
-    
+async def register(request: HttpRequest) -> HttpResponse:
+    """
+    Create a CustomUser and log it in.
+    """
+    if request.method != 'POST':
+        return await arender(request, 'au/register.html', {'form': RegisterForm()})
+    form = RegisterForm(request.POST)
+    if form.is_valid():
+        username, email = form.cleaned_data['username'], form.cleaned_data['email']
+        if await CustomUser.objects.filter(username=username).aexists():
+            form.add_error('username', "This username is already taken.")
+        elif await CustomUser.objects.filter(email=email).aexists():
+            form.add_error('email', "This email is already registered.")
+    if not form.is_valid():
+        return await arender(request, 'au/register.html', {'form': form}, status=400)
+    try:
+        password = await ahash_password(form.cleaned_data['password'])
+    except HashingBusy:
+        return HttpResponse("Too many registrations right now, try again shortly.", status=503)
+    try:
+        user = await acreate_user(username, email, password)
+    except IntegrityError:
+        form.add_error(None, "This username or email is already registered.")
+        return await arender(request, 'au/register.html', {'form': form}, status=400)
+    await alogin(request, user)
+    return HttpResponse(f"Registered user: {user.username}", status=201)
+
 @csrf_exempt
 def profile(request: HttpRequest) -> HttpResponse:
     """
@@ -264,14 +344,163 @@ def edit_profile(request: HttpRequest) -> HttpResponse:
         return render(request, 'au/edit_profile.html', {'username': 'example_user'})
     
 @csrf_exempt
-def password_change(request: HttpRequest) -> HttpResponse:
+async def password_change(request: HttpRequest) -> HttpResponse:
+    """
+    Change the password of the logged in user.
+    """
+    user = await aget_user(request)
+    if user is None:
+        return HttpResponse("You must be logged in to change your password.", status=403)
+    if request.method != 'POST':
+        return await arender(request, 'au/password_change.html', {'form': PasswordChangeForm()})
+    form = PasswordChangeForm(request.POST)
+    if not form.is_valid():
+        return await arender(request, 'au/password_change.html', {'form': form}, status=400)
+    try:
+        if not await acheck_password(user, form.cleaned_data['old_password']):
+            form.add_error('old_password', "Wrong password.")
+            return await arender(request, 'au/password_change.html', {'form': form}, status=400)
+        user.password = await ahash_password(form.cleaned_data['new_password'])
+    except HashingBusy:
+        return HttpResponse("Too many password changes right now, try again shortly.", status=503)
+    await user.asave(update_fields=['password'])
+    await request.session.acycle_key()
+    return HttpResponse("Password changed successfully.")
+
+@require_GET
+def auction_detail(request: HttpRequest, product_id: int) -> HttpResponse:
+    """
+    Lot details with the top bids and the latest reviews and comments.
+    """
+    lot = get_lot(product_id)
+    if lot is None:
+        raise Http404("Lot does not exist.")
+    return conditional_response(request, lot_etag(lot), lot['updated_at'], lambda: JsonResponse(lot))
+
+@require_GET
+async def lots_export(request: HttpRequest) -> HttpResponse:
+    """
+    Stream every lot as a JSON array or NDJSON (?format=ndjson).
+    """
+    fmt = request.GET.get('format', 'json')
+    if fmt not in FORMATS:
+        return JsonResponse({'error': "Unknown export format."}, status=400)
+    rows = (
+        # Bound to the database now: the rows are read while the response
+        # streams, after the routing state of the request has been reset.
+        Product.objects
+        .using(router.db_for_read(Product))
+        .order_by('id')
+        .values('id', 'name', 'price', 'current_bid', 'bid_count', 'stock', 'created_at')
+        .aiterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    return streaming_json_response(rows, fmt, filename=f'lots.{fmt}')
+
+@require_GET
+def search(request: HttpRequest) -> HttpResponse:
+    """
+    Ranked full-text search over lots, ?q=<words>&limit=<n>.
+    """
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = min(int(request.GET.get('limit', LOTS_PER_PAGE)), SEARCH_MAX_RESULTS)
+    except ValueError:
+        return JsonResponse({'error': "Invalid limit."}, status=400)
+    results = search_products(query, limit=max(limit, 1)) if query else []
+    return JsonResponse({
+        'query': query,
+        'results': [{**_lot_summary(product), 'rank': product.rank} for product in results],
+    })
+
+@require_GET
+def category_list(request: HttpRequest) -> HttpResponse:
     """
-    Custom view to change user password.
+    All categories as JSON.
     """
+    return JsonResponse({'results': get_categories()})
+
+@csrf_exempt
+@require_POST
+async def place_bid(request: HttpRequest, product_id: int) -> HttpResponse:
+    """
+    Place a bid on a lot on behalf of the logged in user.
+    """
+    user_id = await request.session.aget(SESSION_USER_KEY)
+    if user_id is None:
+        return HttpResponse("You must be logged in to place a bid.", status=403)
+    try:
+        amount = parse_amount(request.POST.get('amount'))
+    except BidRejected as exc:
+        return JsonResponse({'accepted': False, 'error': str(exc)}, status=400)
+    try:
+        bid = await aplace_bid(product_id, user_id, amount)
+    except BidRejected as exc:
+        return JsonResponse({'accepted': False, 'error': str(exc)}, status=409)
+    return JsonResponse({'accepted': True, 'bid': bid.pk, 'amount': str(bid.amount)}, status=201)
+
+@csrf_exempt
+@require_POST
+async def place_order(request: HttpRequest) -> HttpResponse:
+    """
+    Order one or more lots at once: repeated product=<id>&quantity=<n> pairs.
+    """
+    user_id = await request.session.aget(SESSION_USER_KEY)
+    if user_id is None:
+        return HttpResponse("You must be logged in to place an order.", status=403)
+    try:
+        lines = parse_lines(request.POST.getlist('product'), request.POST.getlist('quantity'))
+    except OrderRejected as exc:
+        return JsonResponse({'accepted': False, 'error': str(exc)}, status=400)
+    try:
+        orders = await aplace_order(user_id, lines)
+    except OrderRejected as exc:
+        return JsonResponse({'accepted': False, 'error': str(exc)}, status=409)
+    return JsonResponse({
+        'accepted': True,
+        'orders': [{'id': order.pk, 'product': order.product_id, 'quantity': order.quantity} for order in orders],
+    }, status=201)
+
+@csrf_exempt
+@require_POST
+def create_lot_attachment(request: HttpRequest, product_id: int) -> HttpResponse:
+    """
+    Announce an attachment upload: filename, size and sha256 of the whole file.
+    """
+    user_id = request.session.get(SESSION_USER_KEY)
+    if user_id is None:
+        return HttpResponse("You must be logged in to upload attachments.", status=403)
+    if not Product.objects.filter(pk=product_id).exists():
+        raise Http404("Lot does not exist.")
+    try:
+        attachment = create_attachment(
+            product_id, user_id, request.POST.get('filename'), request.POST.get('size'), request.POST.get('sha256'),
+        )
+    except UploadRejected as exc:
+        return JsonResponse({'error': str(exc)}, status=exc.status)
+    return JsonResponse(upload_status(attachment), status=201)
+
+@csrf_exempt
+def lot_attachment_upload(request: HttpRequest, upload_id) -> HttpResponse:
+    """
+    HEAD/GET: current offset of an upload. POST: append one chunk at Upload-Offset.
+    """
+    user_id = request.session.get(SESSION_USER_KEY)
+    if user_id is None:
+        return HttpResponse("You must be logged in to upload attachments.", status=403)
+    try:
+        attachment = LotAttachment.objects.get(upload_id=upload_id, user_id=user_id)
+    except LotAttachment.DoesNotExist:
+        raise Http404("Upload does not exist.")
     if request.method == 'POST':
-        old_password = request.POST.get('old_password')
-        new_password = request.POST.get('new_password')
-        # Here you would typically change the user's password
-        return HttpResponse("Password changed successfully.")
-    else:
-        return render(request, 'au/password_change.html')
+        try:
+            receive_chunk(request, attachment)
+        except UploadRejected as exc:
+            response = JsonResponse({'error': str(exc), 'offset': attachment.received}, status=exc.status)
+            response['Upload-Offset'] = attachment.received
+            return response
+    elif request.method not in ('GET', 'HEAD'):
+        return HttpResponse(status=405, headers={'Allow': 'GET, HEAD, POST'})
+    response = JsonResponse(upload_status(attachment))
+    response['Upload-Offset'] = attachment.received
+    response['Cache-Control'] = 'no-store'
+    return response
@@ -0,0 +1,39 @@
+"""
+Small helpers shared by the bench_* management commands.
+"""
+import math
+
+
+def percentile(samples: list, pct: float) -> float:
+    """
+    Return the pct-th percentile of samples (nearest-rank method).
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(latencies: list) -> dict:
+    """
+    Latency summary in milliseconds for a list of durations in seconds.
+    """
+    return {
+        'count': len(latencies),
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'max_ms': max(latencies, default=0.0) * 1000,
+    }
+
+
+def format_summary(summary: dict) -> str:
+    """
+    Render a latency summary as a single report line.
+    """
+    return (
+        f"n={summary['count']} p50={summary['p50_ms']:.2f}ms "
+        f"p95={summary['p95_ms']:.2f}ms p99={summary['p99_ms']:.2f}ms "
+        f"max={summary['max_ms']:.2f}ms"
+    )
@@ -0,0 +1,310 @@
+"""
+Read-through cache for catalog payloads (products, categories, lot details).
+
+Two tiers are consulted in order:
+
+* a bounded in-process LRU per worker, which answers hot keys without any
+  I/O;
+* the shared Django cache (CACHES['default']) used by every worker.
+
+Keys embed a version number per cached object, stored in the shared tier.
+Invalidation never deletes payloads: post_save/post_delete handlers in
+app.signals bump the version, so every worker starts missing on the old
+keys once its short-lived local copy of the version expires.
+
+Concurrent misses on the same key are collapsed: one thread per process
+loads the value while the others wait for it, and a short-lived lock key in
+the shared tier does the same across workers. Both the lock (add()) and
+the version bumps (incr()) rely on the shared backend doing them
+atomically; ThrottledFileBasedCache, the default, does.
+"""
+import fcntl
+import os
+import pickle
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.filebased import FileBasedCache
+
+from app.replicas import use_primary
+
+_MISSING = object()
+# Byte-range locks of ThrottledFileBasedCache's lock file.
+LOCK_STRIPES = 1024
+
+
+class ThrottledFileBasedCache(FileBasedCache):
+    """
+    FileBasedCache that checks whether to cull at most every CULL_INTERVAL
+    seconds (an OPTIONS entry, default 10) instead of on every set(), and
+    whose add() and incr() are atomic across processes.
+
+    The stock backend lists the whole cache directory on each write, which
+    makes every write cost O(entries); with tens of thousands of catalog
+    entries that dominated bid placement. MAX_ENTRIES may now be exceeded
+    briefly between checks.
+
+    The stock add() and incr() read the key and then write it, so two
+    workers could both take the same lock key or lose one of two concurrent
+    increments. Here they run under an fcntl lock on one of LOCK_STRIPES
+    bytes of a lock file in the cache directory, picked by the key's file.
+    """
+    def __init__(self, dir, params):
+        super().__init__(dir, params)
+        self._cull_interval = float(params.get('OPTIONS', {}).get('CULL_INTERVAL', 10))
+        self._next_cull = 0.0
+        self._lock_path = os.path.join(self._dir, 'locks')
+        self._lock_fd = None
+        self._lock_pid = None
+        self._open_lock = threading.Lock()
+        # fcntl locks exclude processes; the threads of one process take
+        # turns on these.
+        self._stripe_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+    def _lock_file(self) -> int:
+        with self._open_lock:
+            # Reopened per process, and when the cache directory was deleted
+            # under us (locks on an unlinked file exclude nobody).
+            if self._lock_pid != os.getpid() or os.fstat(self._lock_fd).st_nlink == 0:
+                self._createdir()
+                self._lock_fd = os.open(self._lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+                self._lock_pid = os.getpid()
+            return self._lock_fd
+
+    @contextmanager
+    def _locked(self, fname: str):
+        stripe = zlib.crc32(fname.encode()) % LOCK_STRIPES
+        with self._stripe_locks[stripe]:
+            fd = self._lock_file()
+            fcntl.lockf(fd, fcntl.LOCK_EX, 1, stripe, os.SEEK_SET)
+            try:
+                yield
+            finally:
+                fcntl.lockf(fd, fcntl.LOCK_UN, 1, stripe, os.SEEK_SET)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._locked(self._key_to_file(key, version)):
+            return super().add(key, value, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        fname = self._key_to_file(key, version)
+        with self._locked(fname):
+            try:
+                with open(fname, 'rb') as f:
+                    expiry = pickle.load(f)
+                    value = pickle.loads(zlib.decompress(f.read()))
+            except FileNotFoundError:
+                expiry = 0
+            if expiry is not None and expiry < time.time():
+                raise ValueError(f"Key '{key}' not found")
+            new_value = value + delta
+            # Keep the expiry (catalog versions never expire), which the
+            # stock incr() resets to the default timeout.
+            self.set(key, new_value, None if expiry is None else expiry - time.time(), version)
+            return new_value
+
+    def _cull(self):
+        now = time.monotonic()
+        if now < self._next_cull:
+            return
+        self._next_cull = now + self._cull_interval
+        super()._cull()
+
+
+class LocalLRU:
+    """
+    Thread-safe LRU mapping with a size bound and per-entry expiry.
+    """
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=_MISSING):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float) -> None:
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class CatalogCache:
+    """
+    Two-tier versioned read-through cache.
+    """
+    def __init__(self, alias: str = 'default', local_size: int = 1024, local_ttl: float = 5,
+                 ttl: float = 300, version_ttl: float = 1, lock_timeout: float = 5):
+        self.alias = alias
+        self.local = LocalLRU(local_size)
+        self.local_ttl = local_ttl
+        self.ttl = ttl
+        self.version_ttl = version_ttl
+        self.lock_timeout = lock_timeout
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.stampede_waits = 0
+        self._versions = LocalLRU(local_size)
+        self._key_locks = {}
+        self._key_locks_guard = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    @staticmethod
+    def _version_key(namespace: str, ident) -> str:
+        return f'catalog:ver:{namespace}:{ident}'
+
+    def version(self, namespace: str, ident='*') -> int:
+        """
+        Current version of a cached object, read from the shared tier at most
+        once per version_ttl seconds.
+        """
+        key = self._version_key(namespace, ident)
+        version = self._versions.get(key)
+        if version is _MISSING:
+            version = self.shared.get(key)
+            if version is None:
+                # Start from the clock rather than 1, so that a version key
+                # evicted from the shared tier can never come back with a
+                # number that older payloads were stored under.
+                self.shared.add(key, time.time_ns() // 1000, timeout=None)
+                version = self.shared.get(key, 0)
+            self._versions.set(key, version, self.version_ttl)
+        return version
+
+    def bump(self, namespace: str, ident='*') -> None:
+        """
+        Invalidate every payload cached for (namespace, ident).
+        """
+        key = self._version_key(namespace, ident)
+        try:
+            self.shared.incr(key)
+        except ValueError:
+            self.shared.set(key, time.time_ns() // 1000, timeout=None)
+        self._versions.delete(key)
+
+    def key(self, namespace: str, ident='*', *parts) -> str:
+        suffix = ':'.join(str(part) for part in parts)
+        return f'catalog:{namespace}:{ident}:v{self.version(namespace, ident)}:{suffix}'
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._key_locks_guard:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                lock = self._key_locks[key] = threading.Lock()
+            return lock
+
+    def _release_key_lock(self, key: str) -> None:
+        with self._key_locks_guard:
+            self._key_locks.pop(key, None)
+
+    def get_or_set(self, namespace: str, ident, loader, *parts, ttl: float | None = None):
+        """
+        Return the cached payload for (namespace, ident, *parts), calling
+        loader() on a miss. Payloads must be picklable.
+        """
+        key = self.key(namespace, ident, *parts)
+        value = self.local.get(key)
+        if value is not _MISSING:
+            self.local_hits += 1
+            return value
+        value = self.shared.get(key, _MISSING)
+        if value is not _MISSING:
+            self.shared_hits += 1
+            self.local.set(key, value, self.local_ttl)
+            return value
+
+        with self._key_lock(key):
+            # Another thread of this worker may have loaded it meanwhile.
+            value = self.local.get(key)
+            if value is _MISSING:
+                value = self._load_once(key, loader, self.ttl if ttl is None else ttl)
+                self.local.set(key, value, self.local_ttl)
+            else:
+                self.local_hits += 1
+        self._release_key_lock(key)
+        return value
+
+    def _load_once(self, key: str, loader, ttl: float):
+        lock_key = f'{key}:lock'
+        token = uuid.uuid4().hex
+        owned = self.shared.add(lock_key, token, timeout=self.lock_timeout)
+        if not owned:
+            # Another worker is loading this key: wait for its result instead
+            # of hitting the database too.
+            self.stampede_waits += 1
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(0.02)
+                value = self.shared.get(key, _MISSING)
+                if value is not _MISSING:
+                    self.shared_hits += 1
+                    return value
+        self.misses += 1
+        try:
+            # Not from a replica: a lagging one could cache data older than
+            # the invalidation that caused this miss.
+            with use_primary():
+                value = loader()
+            self.shared.set(key, value, timeout=ttl)
+        finally:
+            # Not a lock that expired meanwhile and is now another worker's.
+            if owned and self.shared.get(lock_key) == token:
+                self.shared.delete(lock_key)
+        return value
+
+    async def aget_or_set(self, namespace: str, ident, loader, *parts, ttl: float | None = None):
+        """
+        Async version of get_or_set(); the loader runs in a worker thread.
+        """
+        return await sync_to_async(self.get_or_set)(namespace, ident, loader, *parts, ttl=ttl)
+
+    def stats(self) -> dict:
+        lookups = self.local_hits + self.shared_hits + self.misses
+        return {
+            'local_hits': self.local_hits,
+            'shared_hits': self.shared_hits,
+            'misses': self.misses,
+            'hit_rate': (self.local_hits + self.shared_hits) / lookups if lookups else 0.0,
+            'local_evictions': self.local.evictions,
+            'local_size': len(self.local),
+            'stampede_waits': self.stampede_waits,
+        }
+
+
+catalog_cache = CatalogCache(**settings.CATALOG_CACHE)
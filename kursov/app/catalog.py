@@ -0,0 +1,117 @@
+"""
+Cached catalog payloads.
+
+Each function returns plain, picklable data loaded through catalog_cache;
+app.signals bumps the matching versions when the underlying rows change.
+"""
+from django.db.models import Prefetch
+
+from app.cache import catalog_cache
+from app.models import Bid, Category, Comment, Product, Review
+from app.ratings import rating_summary
+from app.querybudget import query_budget
+
+TOP_BIDS = 10
+RECENT_REVIEWS = 10
+RECENT_COMMENTS = 20
+LOT_DETAIL_QUERIES = 4
+
+
+def _product_payload(product: Product) -> dict:
+    return {
+        'id': product.pk,
+        'name': product.name,
+        'description': product.description,
+        'price': str(product.price),
+        'stock': product.stock,
+        'current_bid': str(product.current_bid) if product.current_bid is not None else None,
+        'bid_count': product.bid_count,
+        'created_at': product.created_at,
+        'ends_at': product.ends_at,
+        'closed_at': product.closed_at,
+        'version': product.version,
+        'updated_at': product.updated_at,
+        **rating_summary(product),
+    }
+
+
+def get_product(product_id: int) -> dict | None:
+    """
+    Product payload, or None if it does not exist.
+    """
+    def load():
+        product = Product.objects.select_related('rating').filter(pk=product_id).first()
+        return _product_payload(product) if product is not None else None
+    return catalog_cache.get_or_set('product', product_id, load)
+
+
+def lot_detail_queryset():
+    """
+    Products with everything the lot detail needs, in LOT_DETAIL_QUERIES
+    queries however many reviews, comments and bids there are: the product
+    with its rating, then one query each for the latest reviews and comments
+    (with their users) and the top bids.
+    """
+    return Product.objects.select_related('rating').prefetch_related(
+        Prefetch(
+            'review_set',
+            queryset=Review.objects.select_related('user').order_by('-created_at', '-id')[:RECENT_REVIEWS],
+            to_attr='recent_reviews',
+        ),
+        Prefetch(
+            'comment_set',
+            queryset=Comment.objects.select_related('user').order_by('-created_at', '-id')[:RECENT_COMMENTS],
+            to_attr='recent_comments',
+        ),
+        Prefetch(
+            'bid_set',
+            queryset=Bid.objects.order_by('-amount')[:TOP_BIDS],
+            to_attr='top_bids',
+        ),
+    )
+
+
+@query_budget(LOT_DETAIL_QUERIES)
+def _load_lot(product_id: int) -> dict | None:
+    product = lot_detail_queryset().filter(pk=product_id).first()
+    if product is None:
+        return None
+    return {
+        **_product_payload(product),
+        'bids': [
+            {'user': bid.user_id, 'amount': str(bid.amount), 'created_at': bid.created_at}
+            for bid in product.top_bids
+        ],
+        'reviews': [
+            {
+                'user': review.user.username,
+                'rating': review.rating,
+                'comment': review.comment,
+                'created_at': review.created_at,
+            }
+            for review in product.recent_reviews
+        ],
+        'comments': [
+            {'user': comment.user.username, 'content': comment.content, 'created_at': comment.created_at}
+            for comment in product.recent_comments
+        ],
+    }
+
+
+def get_lot(product_id: int) -> dict | None:
+    """
+    Lot detail payload: the product with its top bids and latest reviews
+    and comments, or None.
+    """
+    return catalog_cache.get_or_set('lot', product_id, lambda: _load_lot(product_id))
+
+
+def _load_categories() -> list:
+    return list(Category.objects.order_by('name').values('id', 'name', 'description'))
+
+
+def get_categories() -> list:
+    """
+    All categories ordered by name.
+    """
+    return catalog_cache.get_or_set('category', '*', _load_categories)
@@ -0,0 +1,115 @@
+"""
+Streaming CSV/JSONL readers and writers for the catalog import/export
+commands, plus the checkpoint file used to resume them.
+"""
+import csv
+import json
+import os
+from pathlib import Path
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from app.models import Category, Product
+
+# Columns exchanged per model; "id" is optional on import.
+CATALOG_MODELS = {
+    'product': (Product, ['id', 'name', 'description', 'price', 'stock']),
+    'category': (Category, ['id', 'name', 'description']),
+}
+FORMATS = ('csv', 'jsonl')
+
+
+class RowError(ValueError):
+    """
+    Raised for an input row that cannot be imported.
+    """
+    def __init__(self, line: int, message: str):
+        super().__init__(f"row {line}: {message}")
+
+
+def detect_format(path: str, requested: str | None) -> str:
+    if requested:
+        return requested
+    suffix = Path(path).suffix.lstrip('.').lower()
+    if suffix in ('jsonl', 'ndjson'):
+        return 'jsonl'
+    return 'csv'
+
+
+def read_rows(stream, fmt: str):
+    """
+    Yield raw dicts from a CSV (with header) or JSONL text stream, one at a time.
+    """
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    else:
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+
+
+def build_instance(model, columns: list, row: dict, line: int):
+    """
+    Convert one raw row into an unsaved model instance.
+    """
+    values = {}
+    for name in columns:
+        raw = row.get(name)
+        if raw in (None, ''):
+            if name == 'id':
+                continue
+            field = model._meta.get_field(name)
+            if not field.null:
+                raise RowError(line, f"missing value for {name}")
+            values[name] = None
+            continue
+        try:
+            values[name] = model._meta.get_field(name).to_python(raw)
+        except ValidationError as exc:
+            raise RowError(line, f"{name}: {' '.join(exc.messages)}")
+    return model(**values)
+
+
+def row_writer(stream, fmt: str, columns: list, header: bool = True):
+    """
+    Return a function that writes one tuple of column values to stream.
+    """
+    if fmt == 'csv':
+        writer = csv.writer(stream)
+        if header:
+            writer.writerow(columns)
+        return writer.writerow
+
+    def write_jsonl(values):
+        stream.write(json.dumps(dict(zip(columns, values)), cls=DjangoJSONEncoder, ensure_ascii=False))
+        stream.write('\n')
+    return write_jsonl
+
+
+class Checkpoint:
+    """
+    Progress of an import or export, stored next to the data file so an
+    interrupted run can continue with --resume.
+    """
+    def __init__(self, path: str):
+        self.path = f'{path}.checkpoint'
+
+    def load(self) -> dict:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def save(self, **state) -> None:
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp, self.path)
+
+    def clear(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
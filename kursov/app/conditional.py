@@ -0,0 +1,77 @@
+"""
+Conditional GET for the lot pages.
+
+Every Product carries a version and updated_at (see the model), bumped by
+each write that changes what its pages show. Model saves do that on their
+own; the queryset UPDATEs of the hot paths (bids, orders, closing) add
+bumped() to their fields, and app.signals uses bump_versions() for the
+related rows a lot page lists (reviews, comments, bids).
+
+conditional_response() turns them into a strong ETag and Last-Modified and
+answers a revalidating client with 304 before the response is rendered.
+The lot detail takes its validators from the cached lot payload, so a 304
+costs no database query; the listings run their page query and skip the
+template. Responses carry Cache-Control: no-cache so that browsers always
+revalidate (auction pages must not be kept by heuristic freshness), which
+the nginx micro-cache in front ignores, see app.microcache. The ETags also
+carry settings.RELEASE: a deploy may change a page without bumping any
+version, and must not be answered with 304 for the old one.
+"""
+import hashlib
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import F
+from django.db.models.functions import Now
+from django.http import HttpRequest, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from app.models import Product
+
+
+def bumped() -> dict:
+    """
+    Fields for a queryset update() that bump the version of the updated lots.
+    """
+    return {'version': F('version') + 1, 'updated_at': Now()}
+
+
+def bump_versions(product_ids, using: str = 'default') -> None:
+    Product.objects.using(using).filter(pk__in=product_ids).update(**bumped())
+
+
+def lot_etag(lot: dict) -> str:
+    return f"lot-{lot['id']}-{lot['version']}-{settings.RELEASE}"
+
+
+def page_etag(page) -> str:
+    """
+    ETag of a page of lots: changes when any lot on it or the page boundaries do.
+    """
+    digest = hashlib.blake2b(settings.RELEASE.encode(), digest_size=12)
+    for product in page:
+        digest.update(f'{product.pk}:{product.version};'.encode())
+    digest.update(f'{page.previous_cursor}|{page.next_cursor}'.encode())
+    return f'lots-{digest.hexdigest()}'
+
+
+def page_last_modified(page) -> datetime | None:
+    return max((product.updated_at for product in page), default=None)
+
+
+def conditional_response(request: HttpRequest, etag: str, last_modified: datetime | None, render) -> HttpResponse:
+    """
+    304 (or 412) if the client's copy is current, else render(); with the validators set.
+    """
+    etag = quote_etag(etag)
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = render()
+    if request.method in ('GET', 'HEAD'):
+        if timestamp and not response.has_header('Last-Modified'):
+            response.headers['Last-Modified'] = http_date(timestamp)
+        response.headers.setdefault('ETag', etag)
+        patch_cache_control(response, no_cache=True)
+    return response
@@ -0,0 +1,324 @@
+"""
+Background jobs with a transactional outbox.
+
+Side effects that may be slow or fail (emails, notifications) do not run in
+the request. enqueue() inserts a Job row instead, in the transaction of the
+caller: the job exists if and only if the work that caused it commits, and
+the response never waits for it. A NOTIFY, delivered on commit as well,
+wakes the workers.
+
+Workers are JobRunner tasks: one per uvicorn worker, started from the ASGI
+lifespan (see conf.asgi) when JOB_WORKERS_ENABLED, and/or dedicated
+processes running `manage.py run_jobs`. A runner claims due jobs with
+SELECT ... FOR UPDATE SKIP LOCKED, so every job goes to one runner, and
+leases them by moving run_at past their timeout. A job that succeeds is
+deleted; one that raises is retried with exponential backoff and kept with
+failed_at once it is out of attempts. A runner that dies mid-job leaves the
+lease to expire and the job runs again, so delivery is at least once and
+jobs must be idempotent.
+
+Each runner runs at most JOB_CONCURRENCY jobs at a time, and at most
+`concurrency` of one kind when the job sets it. Plain functions run in a
+thread, coroutine functions on the event loop. A coroutine is cancelled at
+its timeout; a thread cannot be, so a plain job past its timeout keeps its
+slot and renews its lease until the thread returns, and only then is it
+completed or failed: it is never retried while it may still succeed.
+"""
+import asyncio
+import logging
+import random
+from dataclasses import dataclass
+from datetime import timedelta
+
+import psycopg
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from app.au.broker import conninfo
+from app.models import Job
+
+logger = logging.getLogger(__name__)
+
+JOB_CHANNEL = 'jobs'
+# Time a worker keeps a job beyond its timeout to record the outcome.
+LEASE_MARGIN = 30
+
+
+@dataclass
+class JobSpec:
+    name: str
+    func: object
+    max_attempts: int
+    timeout: float
+    # Jobs of this kind one runner may run at once; None for no limit
+    # beyond JOB_CONCURRENCY.
+    concurrency: int | None = None
+
+    @property
+    def lease(self) -> timedelta:
+        return timedelta(seconds=self.timeout + LEASE_MARGIN)
+
+
+JOBS = {}
+
+
+def job(name: str, *, max_attempts: int | None = None, timeout: float | None = None, concurrency: int | None = None):
+    """
+    Register a function taking the payload as keyword arguments as a job.
+    """
+    def decorator(func):
+        JOBS[name] = JobSpec(
+            name, func,
+            max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+            timeout=timeout or settings.JOB_TIMEOUT,
+            concurrency=concurrency,
+        )
+        return func
+    return decorator
+
+
+def enqueue(name: str, *, delay: float = 0, using: str = DEFAULT_DB_ALIAS, **payload) -> Job:
+    """
+    Record a job in the current transaction; it runs once the transaction commits.
+    """
+    if name not in JOBS:
+        raise ValueError(f"Unknown job {name!r}.")
+    created = Job.objects.using(using).create(
+        name=name, payload=payload, run_at=timezone.now() + timedelta(seconds=delay),
+    )
+    # NOTIFY is transactional too: the workers wake up on commit.
+    with connections[using].cursor() as cursor:
+        cursor.execute('SELECT pg_notify(%s, %s)', [JOB_CHANNEL, name])
+    return created
+
+
+def enqueue_many(name: str, payloads: list, using: str = DEFAULT_DB_ALIAS) -> list:
+    """
+    Record one job per payload with a single INSERT.
+    """
+    if name not in JOBS:
+        raise ValueError(f"Unknown job {name!r}.")
+    if not payloads:
+        return []
+    now = timezone.now()
+    created = Job.objects.using(using).bulk_create(Job(name=name, payload=payload, run_at=now) for payload in payloads)
+    with connections[using].cursor() as cursor:
+        cursor.execute('SELECT pg_notify(%s, %s)', [JOB_CHANNEL, name])
+    return created
+
+
+async def aenqueue(name: str, **kwargs) -> Job:
+    """
+    Async version of enqueue() for use from async views.
+    """
+    return await sync_to_async(enqueue)(name, **kwargs)
+
+
+def retry_delay(attempts: int) -> float:
+    """
+    Exponential backoff with jitter, so failing jobs do not retry in lockstep.
+    """
+    delay = min(settings.JOB_RETRY_DELAY * 2 ** (attempts - 1), settings.JOB_RETRY_MAX_DELAY)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def claim(names: list, limit: int) -> list:
+    """
+    Lease up to limit due jobs of the given kinds, earliest first.
+    """
+    if not names or limit <= 0:
+        return []
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            Job.objects
+            .select_for_update(skip_locked=True)
+            .filter(failed_at__isnull=True, run_at__lte=now, name__in=names)
+            .order_by('run_at')[:limit]
+        )
+        if jobs:
+            leases = [When(name=name, then=Value(now + JOBS[name].lease)) for name in {claimed.name for claimed in jobs}]
+            Job.objects.filter(pk__in=[claimed.pk for claimed in jobs]).update(
+                attempts=F('attempts') + 1, run_at=Case(*leases),
+            )
+    for claimed in jobs:
+        claimed.attempts += 1
+    return jobs
+
+
+def complete(job: Job) -> None:
+    Job.objects.filter(pk=job.pk).delete()
+
+
+def fail(job: Job, error: str) -> None:
+    """
+    Schedule a retry of a failed job, or give up on it after its last attempt.
+    """
+    spec = JOBS[job.name]
+    now = timezone.now()
+    # Only while the job is still ours: after an expired lease another
+    # runner may have claimed it again.
+    pending = Job.objects.filter(pk=job.pk, attempts=job.attempts)
+    if job.attempts >= spec.max_attempts:
+        pending.update(failed_at=now, last_error=error)
+        logger.error("Job %s #%d failed for good after %d attempts: %s", job.name, job.pk, job.attempts, error)
+    else:
+        pending.update(run_at=now + timedelta(seconds=retry_delay(job.attempts)), last_error=error)
+        logger.warning("Job %s #%d failed (attempt %d), retrying: %s", job.name, job.pk, job.attempts, error)
+
+
+def renew(job: Job) -> None:
+    """
+    Extend the lease of a job whose thread overran its timeout.
+    """
+    Job.objects.filter(pk=job.pk, attempts=job.attempts).update(
+        run_at=timezone.now() + timedelta(seconds=LEASE_MARGIN),
+    )
+
+
+def release(jobs: list) -> None:
+    """
+    Hand jobs interrupted by a shutdown back without using up an attempt.
+    """
+    for job in jobs:
+        Job.objects.filter(pk=job.pk, attempts=job.attempts).update(
+            run_at=timezone.now(), attempts=F('attempts') - 1,
+        )
+
+
+def _run_sync(func, payload: dict) -> None:
+    try:
+        func(**payload)
+    finally:
+        # Job threads are reused: give their connections back to the pool.
+        connections.close_all()
+
+
+class JobRunner:
+    """
+    Claims due jobs and runs them, up to concurrency at a time.
+    """
+    retry_delay = 1.0
+
+    def __init__(self, concurrency: int, poll_interval: float, using: str = DEFAULT_DB_ALIAS):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.using = using
+        self._running = {}
+        self._wake = asyncio.Event()
+
+    def _batches(self) -> list:
+        """
+        (names, limit) claims filling the free slots within the per-kind limits.
+        """
+        free = self.concurrency - len(self._running)
+        if free <= 0:
+            return []
+        unlimited = [name for name, spec in JOBS.items() if spec.concurrency is None]
+        batches = [(unlimited, free)] if unlimited else []
+        for name, spec in JOBS.items():
+            if spec.concurrency is not None:
+                running = sum(1 for job in self._running.values() if job.name == name)
+                batches.append(([name], min(spec.concurrency - running, free)))
+        return batches
+
+    async def _claim(self) -> int:
+        claimed = 0
+        for names, limit in self._batches():
+            limit = min(limit, self.concurrency - len(self._running))
+            for claimed_job in await sync_to_async(claim)(names, limit):
+                task = asyncio.create_task(self._execute(claimed_job), name=f'job-{claimed_job.pk}')
+                self._running[task] = claimed_job
+                task.add_done_callback(self._finished)
+                claimed += 1
+        return claimed
+
+    def _finished(self, task: asyncio.Task) -> None:
+        self._running.pop(task, None)
+        self._wake.set()
+
+    async def _execute(self, job: Job) -> None:
+        spec = JOBS[job.name]
+        try:
+            if iscoroutinefunction(spec.func):
+                await asyncio.wait_for(spec.func(**job.payload), spec.timeout)
+            else:
+                await self._run_thread(job, spec)
+        except TimeoutError:
+            await sync_to_async(fail)(job, f"Timed out after {spec.timeout:g}s.")
+        except Exception as exc:
+            logger.debug("Job %s #%d raised.", job.name, job.pk, exc_info=True)
+            await sync_to_async(fail)(job, f'{type(exc).__name__}: {exc}')
+        else:
+            await sync_to_async(complete)(job)
+
+    @staticmethod
+    async def _run_thread(job: Job, spec: JobSpec) -> None:
+        thread = asyncio.ensure_future(sync_to_async(_run_sync, thread_sensitive=False)(spec.func, job.payload))
+        done, _ = await asyncio.wait([thread], timeout=spec.timeout)
+        if not done:
+            logger.warning("Job %s #%d overran its %gs timeout; waiting for its thread.", job.name, job.pk, spec.timeout)
+        while not done:
+            # Renewed well before it expires, so no other runner claims it.
+            await sync_to_async(renew)(job)
+            done, _ = await asyncio.wait([thread], timeout=LEASE_MARGIN / 3)
+        thread.result()
+
+    async def run(self, until_empty: bool = False) -> None:
+        """
+        Run jobs until cancelled, or with until_empty until none are due.
+        """
+        listener = asyncio.create_task(self._listen())
+        try:
+            while True:
+                self._wake.clear()
+                try:
+                    claimed = await self._claim()
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    logger.exception("Claiming jobs failed, retrying.")
+                    await asyncio.sleep(self.retry_delay)
+                    continue
+                if until_empty and not claimed and not self._running:
+                    return
+                if claimed and len(self._running) < self.concurrency:
+                    continue  # There may be more due jobs.
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                except TimeoutError:
+                    pass
+        finally:
+            listener.cancel()
+            await self._shutdown()
+
+    async def _shutdown(self) -> None:
+        interrupted = list(self._running.values())
+        for task in list(self._running):
+            task.cancel()
+        if interrupted:
+            try:
+                await sync_to_async(release)(interrupted)
+            except Exception:
+                logger.exception("Could not release %d interrupted jobs.", len(interrupted))
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                conn = await psycopg.AsyncConnection.connect(conninfo(self.using), autocommit=True)
+                async with conn:
+                    await conn.execute(f'LISTEN {JOB_CHANNEL}')
+                    async for _ in conn.notifies():
+                        self._wake.set()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Job listener failed, reconnecting.")
+                await asyncio.sleep(self.retry_delay)
+
+
+def get_runner(concurrency: int | None = None) -> JobRunner:
+    return JobRunner(concurrency or settings.JOB_CONCURRENCY, settings.JOB_POLL_INTERVAL)
@@ -0,0 +1,253 @@
+"""
+HTTP load-test harness used by the bench_http command.
+
+Scenarios are scripted request generators run by a number of concurrent
+virtual users. Requests go either straight into the ASGI application of
+conf.asgi (AsgiClient, no network or server in between) or over TCP to a
+running uvicorn (HttpClient). SQL counts come from the db entry of the
+Server-Timing header added by app.metrics.MetricsMiddleware.
+"""
+import asyncio
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+from app.bench import summarize
+
+_SQL_COUNT = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+@dataclass
+class Response:
+    status: int
+    headers: dict
+    body: bytes
+    cookies: dict = field(default_factory=dict)
+
+    @property
+    def sql_queries(self) -> int | None:
+        match = _SQL_COUNT.search(self.headers.get('server-timing', ''))
+        return int(match.group(1)) if match else None
+
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    data: dict | None = None
+    cookies: dict = field(default_factory=dict)
+
+    def encode(self) -> tuple[bytes, list]:
+        body = urlencode(self.data).encode() if self.data is not None else b''
+        headers = [(b'host', b'localhost')]
+        if self.data is not None:
+            headers.append((b'content-type', b'application/x-www-form-urlencoded'))
+        headers.append((b'content-length', str(len(body)).encode()))
+        if self.cookies:
+            headers.append((b'cookie', '; '.join(f'{k}={v}' for k, v in self.cookies.items()).encode()))
+        return body, headers
+
+
+def _cookies(headers: list) -> dict:
+    jar = SimpleCookie()
+    for name, value in headers:
+        if name.lower() == 'set-cookie':
+            jar.load(value)
+    return {key: morsel.value for key, morsel in jar.items()}
+
+
+class AsgiClient:
+    """
+    Calls an ASGI application in-process, one scope per request.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def send(self, request: Request) -> Response:
+        body, headers = request.encode()
+        path, _, query = request.path.partition('?')
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': request.method,
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query.encode(),
+            'root_path': '',
+            'headers': headers,
+            'client': ('127.0.0.1', 0),
+            'server': ('localhost', 80),
+        }
+        done = asyncio.Event()
+        sent_body = False
+        start, chunks = {}, []
+
+        async def receive():
+            nonlocal sent_body
+            if not sent_body:
+                sent_body = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            await done.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                start.update(message)
+            elif message['type'] == 'http.response.body':
+                chunks.append(message.get('body', b''))
+                if not message.get('more_body', False):
+                    done.set()
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            done.set()
+        response_headers = [(k.decode('latin-1'), v.decode('latin-1')) for k, v in start.get('headers', [])]
+        return Response(start['status'], _header_dict(response_headers), b''.join(chunks), _cookies(response_headers))
+
+
+class HttpClient:
+    """
+    Minimal HTTP/1.1 client for a local server, one connection per request.
+    """
+    def __init__(self, base_url: str):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+
+    async def send(self, request: Request) -> Response:
+        body, headers = request.encode()
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            head = [f'{request.method} {request.path} HTTP/1.1'.encode()]
+            head += [name + b': ' + value for name, value in headers]
+            head.append(b'connection: close')
+            writer.write(b'\r\n'.join(head) + b'\r\n\r\n' + body)
+            await writer.drain()
+            raw = await reader.read()
+        finally:
+            writer.close()
+        head, _, payload = raw.partition(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        status = int(lines[0].split()[1])
+        response_headers = [tuple(part.strip() for part in line.split(':', 1)) for line in lines[1:] if ':' in line]
+        headers_dict = _header_dict(response_headers)
+        if headers_dict.get('transfer-encoding') == 'chunked':
+            payload = _dechunk(payload)
+        return Response(status, headers_dict, payload, _cookies(response_headers))
+
+
+def _header_dict(headers: list) -> dict:
+    return {name.lower(): value for name, value in headers}
+
+
+def _dechunk(payload: bytes) -> bytes:
+    out = []
+    while payload:
+        size_line, _, payload = payload.partition(b'\r\n')
+        size = int(size_line.split(b';')[0], 16)
+        if size == 0:
+            break
+        out.append(payload[:size])
+        payload = payload[size + 2:]
+    return b''.join(out)
+
+
+@dataclass
+class Scenario:
+    """
+    A named request script: build(i, state) returns the i-th request.
+    """
+    name: str
+    build: object
+    ok: frozenset = frozenset({200})
+    requests: int = 500
+
+
+async def login(client, username: str, password: str) -> dict:
+    """
+    Log in through the login view and return the session cookies.
+    """
+    response = await client.send(Request('POST', '/app/au/login/', {'username': username, 'password': password}))
+    if response.status != 200:
+        raise RuntimeError(f"Benchmark login failed with status {response.status}.")
+    return response.cookies
+
+
+async def run_scenario(client, scenario: Scenario, state: dict, requests: int, concurrency: int) -> dict:
+    """
+    Send requests of one scenario from concurrency virtual users and summarize them.
+    """
+    latencies, sql_counts, statuses = [], [], Counter()
+    counter = iter(range(requests))
+
+    async def user():
+        for i in counter:
+            started = time.perf_counter()
+            response = await client.send(scenario.build(i, state))
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status] += 1
+            if response.sql_queries is not None:
+                sql_counts.append(response.sql_queries)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+    return {
+        **summarize(latencies),
+        'rps': len(latencies) / wall if wall else 0.0,
+        'sql_mean': sum(sql_counts) / len(sql_counts) if sql_counts else None,
+        'sql_max': max(sql_counts, default=None),
+        'errors': sum(count for status, count in statuses.items() if status not in scenario.ok),
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+    }
+
+
+SEARCH_TERMS = ('steam', 'account', 'key', 'game', 'skin', 'gift', 'card', 'stema')
+
+SCENARIOS = {
+    scenario.name: scenario for scenario in (
+        Scenario('home', lambda i, state: Request('GET', '/app/main/')),
+        Scenario('lots', lambda i, state: Request('GET', '/app/au/' if i % 2 else '/app/au/lots/?sort=price')),
+        Scenario('search', lambda i, state: Request('GET', f'/app/au/search/?q={SEARCH_TERMS[i % len(SEARCH_TERMS)]}')),
+        Scenario(
+            'login',
+            lambda i, state: Request('POST', '/app/au/login/', {'username': state['username'], 'password': state['password']}),
+            requests=20,
+        ),
+        Scenario(
+            'bid',
+            lambda i, state: Request(
+                'POST', f"/app/au/lots/{state['lot_id']}/bid/", {'amount': str(state['bid_base'] + i)},
+                cookies=state['cookies'],
+            ),
+            # Concurrent bids overtake each other, so some are rejected.
+            ok=frozenset({201, 409}),
+        ),
+    )
+}
+
+
+def compare(results: dict, baselines: dict, tolerance: float) -> list:
+    """
+    Regressions of results against baselines: slower p95, lower RPS or more SQL.
+    """
+    problems = []
+    for name, result in results.items():
+        baseline = baselines.get(name)
+        if baseline is None:
+            continue
+        if result['p95_ms'] > baseline['p95_ms'] * (1 + tolerance):
+            problems.append(f"{name}: p95 {result['p95_ms']:.1f}ms > baseline {baseline['p95_ms']:.1f}ms")
+        if result['rps'] < baseline['rps'] * (1 - tolerance):
+            problems.append(f"{name}: {result['rps']:.1f} rps < baseline {baseline['rps']:.1f} rps")
+        if (result['sql_max'] or 0) > (baseline['sql_max'] or 0):
+            problems.append(f"{name}: up to {result['sql_max']} queries > baseline {baseline['sql_max']}")
+        if result['errors'] > baseline['errors']:
+            problems.append(f"{name}: {result['errors']} errors > baseline {baseline['errors']}")
+    return problems
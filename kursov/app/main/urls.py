@@ -18,9 +18,10 @@ from django.urls import path
 from . import views
 
 urlpatterns = [
-    path('/', views.index, name='home'),
+    path('', views.index, name='home'),
     path('index/', views.index, name='home'),
     path('about/', views.about, name='about'),
     path('terms/', views.terms, name='terms'),
     path('privacy/', views.privacy, name='privacy'),
+    path('orders/export/', views.orders_export, name='orders_export'),
 ]
\ No newline at end of file
@@ -1,9 +1,23 @@
-from django.shortcuts import render
+import json
+
+from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
+from django.db import router
 from django.http import HttpRequest, HttpResponse
+from django.middleware.csrf import get_token
+from django.templatetags.static import static
+from django.views.decorators.cache import cache_page
+from django.views.decorators.http import require_GET
+
+from app.models import Order
+from app.rendering import arender
+from app.streaming import FORMATS, streaming_json_response
+
+EXPORT_CHUNK_SIZE = 2000
 
 
 async def index(request: HttpRequest) -> HttpResponse:
-    return render(request, 'main/index.html')
+    return await arender(request, 'main/index.html')
 
 async def about(request: HttpRequest) -> HttpResponse:
     return HttpResponse("This is the about page.")
@@ -71,7 +85,6 @@ async def custom_view_with_post(request: HttpRequest) -> HttpResponse:
         return HttpResponse("This view only accepts POST requests.", status=405)
     
 async def custom_view_with_json(request: HttpRequest) -> HttpResponse:
-    import json
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
@@ -90,13 +103,12 @@ async def custom_view_with_file_upload(request: HttpRequest) -> HttpResponse:
     
 async def custom_view_with_session(request: HttpRequest) -> HttpResponse:
     if request.method == 'POST':
-        request.session['key'] = request.POST.get('value', 'default')
-        return HttpResponse(f"Session value set: {request.session['key']}")
+        await request.session.aset('key', request.POST.get('value', 'default'))
+        return HttpResponse(f"Session value set: {await request.session.aget('key')}")
     else:
-        return HttpResponse(f"Current session value: {request.session.get('key', 'not set')}")
+        return HttpResponse(f"Current session value: {await request.session.aget('key', 'not set')}")
     
 async def custom_view_with_csrf(request: HttpRequest) -> HttpResponse:
-    from django.middleware.csrf import get_token
     if request.method == 'POST':
         csrf_token = get_token(request)
         return HttpResponse(f"CSRF token: {csrf_token}")
@@ -104,9 +116,6 @@ async def custom_view_with_csrf(request: HttpRequest) -> HttpResponse:
         return HttpResponse("This view only accepts POST requests with CSRF protection.", status=405)
     
 async def custom_view_with_authentication(request: HttpRequest) -> HttpResponse:
-    from django.contrib.auth.decorators import login_required
-    from django.utils.decorators import method_decorator
-
     @login_required
     async def authenticated_view(request: HttpRequest) -> HttpResponse:
         return HttpResponse("This is a protected view. You are authenticated.")
@@ -114,8 +123,6 @@ async def custom_view_with_authentication(request: HttpRequest) -> HttpResponse:
     return await authenticated_view(request)
 
 async def custom_view_with_pagination(request: HttpRequest) -> HttpResponse:
-
-    from django.core.paginator import Paginator
     items = list(range(1, 101))  # Example data
     paginator = Paginator(items, 10)  # Show 10 items per page
 
@@ -125,31 +132,20 @@ async def custom_view_with_pagination(request: HttpRequest) -> HttpResponse:
     response_content = f"Page {page_obj.number} of {paginator.num_pages}: " + ", ".join(map(str, page_obj.object_list))
     return HttpResponse(response_content)
 
+@cache_page(60 * 15)  # Cache this view for 15 minutes
 async def custom_view_with_caching(request: HttpRequest) -> HttpResponse:
-    from django.views.decorators.cache import cache_page
-
-    @cache_page(60 * 15)  # Cache this view for 15 minutes
-    async def cached_view(request: HttpRequest) -> HttpResponse:
-        return HttpResponse("This view is cached for 15 minutes.")
-
-    return await cached_view(request)
+    return HttpResponse("This view is cached for 15 minutes.")
 
 async def custom_view_with_static_files(request: HttpRequest) -> HttpResponse:
-    from django.conf import settings
-    from django.templatetags.static import static
-
     static_file_url = static('css/style.css')  # Example static file
     return HttpResponse(f"Static file URL: {static_file_url}")
 
 async def custom_view_with_media_files(request: HttpRequest) -> HttpResponse:
-    from django.conf import settings
-    from django.templatetags.static import static
-
     media_file_url = static('media/example.jpg')  # Example media file
     return HttpResponse(f"Media file URL: {media_file_url}")
 
 async def custom_view_with_template(request: HttpRequest) -> HttpResponse:
-    return render(request, 'main/custom_template.html', {'message': 'This is a custom template view.'})
+    return await arender(request, 'main/custom_template.html', {'message': 'This is a custom template view.'})
 
 async def custom_view_with_template_and_context(request: HttpRequest) -> HttpResponse:
     context = {
@@ -157,4 +153,26 @@ async def custom_view_with_template_and_context(request: HttpRequest) -> HttpRes
         'message': 'This view uses a custom template with context data.',
         'items': ['Item 1', 'Item 2', 'Item 3']
     }
-    return render(request, 'main/custom_template_with_context.html', context)
+    return await arender(request, 'main/custom_template_with_context.html', context)
+
+@require_GET
+async def orders_export(request: HttpRequest) -> HttpResponse:
+    """
+    Stream all orders as a JSON array or NDJSON (?format=ndjson). Staff only.
+    """
+    user = await request.auser()
+    if not user.is_staff:
+        return HttpResponse("403 Forbidden", status=403)
+    fmt = request.GET.get('format', 'json')
+    if fmt not in FORMATS:
+        return HttpResponse("Unknown export format.", status=400)
+    rows = (
+        # Bound to the database now: the rows are read while the response
+        # streams, after the routing state of the request has been reset.
+        Order.objects
+        .using(router.db_for_read(Order))
+        .order_by('id')
+        .values('id', 'product_id', 'user_id', 'quantity', 'order_date')
+        .aiterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    return streaming_json_response(rows, fmt, filename=f'orders.{fmt}')
@@ -0,0 +1,144 @@
+"""
+EXPLAIN (ANALYZE, BUFFERS) audit of the hot queries in app.query_audit.
+
+By default the database is first seeded with a temporary catalog (lots
+with reviews, comments, bids and orders, inserted with generate_series)
+and ANALYZEd, because on a nearly empty table the planner rightly prefers
+a sequential scan and the audit would prove nothing. --no-seed audits the
+database as it is, e.g. a copy of production.
+
+Every statement is reported with its execution time and shared buffers.
+The command fails when a plan scans a table sequentially or runs longer
+than --slow-ms, so it can guard migrations and ORM changes in CI.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from app.models import Bid, Comment, CustomUser, LotAttachment, Order, Product, ProductRating, Review
+from app.query_audit import HOT_QUERIES, audit
+
+SEED_PREFIX = 'audit-queries-'
+
+
+class Command(BaseCommand):
+    help = "Run EXPLAIN (ANALYZE, BUFFERS) on the registered hot queries and flag seq scans and slow plans."
+
+    def add_arguments(self, parser):
+        parser.add_argument('queries', nargs='*', help=f"Queries to audit: {', '.join(HOT_QUERIES)} (default: all).")
+        parser.add_argument('--lots', type=int, default=20_000, help="Number of lots to seed.")
+        parser.add_argument('--per-lot', type=int, default=10, help="Reviews, comments, bids and orders per lot.")
+        parser.add_argument('--slow-ms', type=float, default=50.0, help="Flag statements slower than this.")
+        parser.add_argument('--no-seed', action='store_true', help="Audit the database as it is.")
+        parser.add_argument('--verbose-sql', action='store_true', help="Print the SQL of every statement.")
+
+    def handle(self, *args, **options):
+        names = options['queries'] or list(HOT_QUERIES)
+        unknown = set(names) - set(HOT_QUERIES)
+        if unknown:
+            raise CommandError(f"Unknown queries: {', '.join(sorted(unknown))}.")
+        if options['lots'] < 1 or options['per_lot'] < 1:
+            raise CommandError("--lots and --per-lot must be positive.")
+
+        seeded = not options['no_seed']
+        if seeded:
+            self._seed(options['lots'], options['per_lot'])
+        try:
+            lots = Product.objects.order_by('-bid_count', '-id').values_list('pk', flat=True)[:50]
+            product_ids = list(lots)
+            if not product_ids:
+                raise CommandError("There are no lots to audit against; run without --no-seed.")
+            context = {'product_id': product_ids[0], 'product_ids': product_ids}
+            flagged = 0
+            for name in names:
+                for finding in audit(HOT_QUERIES[name], context, options['slow_ms']):
+                    flagged += finding.flagged
+                    self._report(finding, options['verbose_sql'])
+        finally:
+            if seeded:
+                self._cleanup()
+
+        if flagged:
+            raise CommandError(f"{flagged} statements with sequential scans, slow plans or errors.")
+        self.stdout.write(self.style.SUCCESS("All hot queries use indexes and are within budget."))
+
+    def _report(self, finding, verbose_sql: bool) -> None:
+        if finding.error:
+            self.stdout.write(self.style.ERROR(f"{finding.query:<22} error: {finding.error}"))
+            return
+        problems = [f"seq scan on {table}" for table in finding.seq_scans]
+        if finding.slow:
+            problems.append("slow")
+        line = f"{finding.query:<22} {finding.execution_ms:8.2f}ms {finding.buffers:7} buffers"
+        if problems:
+            self.stdout.write(self.style.WARNING(f"{line}  {', '.join(problems)}"))
+        else:
+            self.stdout.write(line)
+        if verbose_sql or problems:
+            self.stdout.write(f"    {finding.sql}")
+
+    @transaction.atomic
+    def _seed(self, lots: int, per_lot: int) -> None:
+        started = time.perf_counter()
+        # About one user per lot: with a handful of users the planner rightly
+        # hashes the whole user table, which says nothing about production.
+        users = lots
+        qn = connection.ops.quote_name
+        user_table, product_table = qn(CustomUser._meta.db_table), qn(Product._meta.db_table)
+        pattern = f'{SEED_PREFIX}%'
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {user_table} (username, email, password)
+                SELECT %s || i, %s || i || '@audit.invalid', '!'
+                FROM generate_series(1, %s) AS i
+                RETURNING id
+                """,
+                [SEED_PREFIX, SEED_PREFIX, users],
+            )
+            user_ids = [row[0] for row in cursor.fetchall()]
+            cursor.execute(
+                f"""
+                INSERT INTO {product_table} (name, description, price, stock, bid_count, created_at)
+                SELECT %s || i, 'audit lot', (random() * 1000)::numeric(10, 2), 10, %s,
+                       now() - make_interval(secs => i)
+                FROM generate_series(1, %s) AS i
+                """,
+                [SEED_PREFIX, per_lot, lots],
+            )
+            children = [
+                (Review, 'rating, comment, created_at', "1 + mod(n, 5), 'audit review', now() - make_interval(secs => n)"),
+                (Comment, 'content, created_at', "'audit comment', now() - make_interval(secs => n)"),
+                (Bid, 'amount, created_at', "(n + 1)::numeric(10, 2), now() - make_interval(secs => n)"),
+                (Order, 'quantity, order_date', "1, now() - make_interval(mins => n)"),
+            ]
+            for model, columns, values in children:
+                # Spread the rows over the seeded users.
+                cursor.execute(
+                    f"""
+                    INSERT INTO {qn(model._meta.db_table)} (product_id, user_id, {columns})
+                    SELECT p.id, (%s::bigint[])[1 + mod(p.id + n, %s)], {values}
+                    FROM (SELECT id FROM {product_table} WHERE name LIKE %s) AS p
+                    CROSS JOIN generate_series(1, %s) AS n
+                    """,
+                    [user_ids, users, pattern, per_lot],
+                )
+            for model in (CustomUser, Product, Review, Comment, Bid, Order):
+                cursor.execute(f"ANALYZE {qn(model._meta.db_table)}")
+        self.stdout.write(
+            f"seeded {lots} lots and {users} users with {per_lot} reviews, comments, bids and orders per lot "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+
+    def _cleanup(self) -> None:
+        # Raw deletes: collecting a few hundred thousand rows for the ORM
+        # cascade would take longer than seeding them.
+        qn = connection.ops.quote_name
+        seeded = f"SELECT id FROM {qn(Product._meta.db_table)} WHERE name LIKE %s"
+        pattern = f'{SEED_PREFIX}%'
+        with connection.cursor() as cursor:
+            for model in (Review, Comment, Bid, Order, ProductRating, LotAttachment):
+                cursor.execute(f"DELETE FROM {qn(model._meta.db_table)} WHERE product_id IN ({seeded})", [pattern])
+            cursor.execute(f"DELETE FROM {qn(Product._meta.db_table)} WHERE name LIKE %s", [pattern])
+            cursor.execute(f"DELETE FROM {qn(CustomUser._meta.db_table)} WHERE username LIKE %s", [pattern])
@@ -0,0 +1,101 @@
+"""
+Contention benchmark for bid placement.
+
+Fires N bids from a pool of parallel clients at a single lot and reports
+accepted/rejected throughput and latency percentiles. Every client thread
+uses its own database connection, like concurrent requests do.
+"""
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from app.au.bidding import BidRejected, place_bid
+from app.bench import format_summary, summarize
+from app.models import Bid, CustomUser, Product
+
+
+class Command(BaseCommand):
+    help = "Fire N parallel bids at one lot and report throughput and latency."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bids', type=int, default=1000, help="Total number of bids to place.")
+        parser.add_argument('--concurrency', type=int, default=32, help="Number of parallel bidders.")
+        parser.add_argument('--users', type=int, default=50, help="Number of distinct bidding users.")
+        parser.add_argument('--keep', action='store_true', help="Keep the benchmark lot and users.")
+
+    def handle(self, *args, **options):
+        if options['bids'] < 1 or options['concurrency'] < 1 or options['users'] < 1:
+            raise CommandError("--bids, --concurrency and --users must be positive.")
+
+        tag = f"bench-bids-{int(time.time())}"
+        lot = Product.objects.create(name=tag, description=tag, price=Decimal('1.00'), stock=1)
+        users = CustomUser.objects.bulk_create(
+            CustomUser(username=f"{tag}-{i}", email=f"{tag}-{i}@bench.invalid", password='!')
+            for i in range(options['users'])
+        )
+        user_ids = [user.pk for user in users]
+
+        lock = threading.Lock()
+        latencies, accepted, rejected = [], [], 0
+
+        def bid(i: int):
+            nonlocal rejected
+            # Amounts mostly increase with i but overlap, so late bids race
+            # against each other and a realistic share gets rejected.
+            amount = Decimal(i + random.randint(0, options['concurrency'])).quantize(Decimal('0.01')) + 1
+            started = time.perf_counter()
+            try:
+                place_bid(lot.pk, random.choice(user_ids), amount)
+                ok = True
+            except BidRejected:
+                ok = False
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if ok:
+                    accepted.append(amount)
+                else:
+                    rejected += 1
+
+        def run(indexes):
+            try:
+                for i in indexes:
+                    bid(i)
+            finally:
+                connections.close_all()
+
+        workers = options['concurrency']
+        chunks = [range(w, options['bids'], workers) for w in range(workers)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(run, chunks))
+        wall = time.perf_counter() - started
+
+        lot.refresh_from_db()
+        stored = Bid.objects.filter(product=lot).count()
+        consistent = (
+            stored == len(accepted) == lot.bid_count
+            and lot.current_bid == max(accepted, default=None)
+        )
+
+        self.stdout.write(f"bids={options['bids']} concurrency={workers} wall={wall:.3f}s")
+        self.stdout.write(
+            f"accepted={len(accepted)} ({len(accepted) / wall:.1f}/s) "
+            f"rejected={rejected} ({rejected / wall:.1f}/s) "
+            f"total={options['bids'] / wall:.1f}/s"
+        )
+        self.stdout.write(f"latency {format_summary(summarize(latencies))}")
+        self.stdout.write(f"top bid={lot.current_bid} stored bids={stored} bid_count={lot.bid_count}")
+
+        if not options['keep']:
+            lot.delete()
+            CustomUser.objects.filter(pk__in=user_ids).delete()
+
+        if not consistent:
+            raise CommandError("Inconsistent lot state: bids were lost or double counted.")
+        self.stdout.write(self.style.SUCCESS("Lot state is consistent."))
@@ -0,0 +1,153 @@
+"""
+Cold start of a uvicorn worker, with and without the warm-up of app.warmup.
+
+Each trial starts a fresh `uvicorn --workers 1` on a free port, waits until
+it accepts connections and then requests every WARMUP_PATHS path in turn:
+one cold pass, then --passes more for the steady state. A response is fast
+when it takes at most --fast-factor times the steady-state median of its
+path (plus --slack-ms, so that sub-millisecond noise does not count). For
+each mode the report gives, as the median over --trials:
+
+* listening: from process start until the port accepts connections;
+* first response: from process start until the first response is complete;
+* all fast: from process start until the end of the first pass in which
+  every path was fast, i.e. the time to first fast response of the whole
+  hot set;
+* cold penalty: how much longer the cold pass took than a steady one.
+
+The auction scheduler, job runner, rate limits and load shedding are
+switched off in the benchmarked server, so they neither add noise nor turn
+the burst of requests into 429/503 answers. Shared caches (the file cache)
+survive between trials, as they do when one worker of several restarts.
+"""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from statistics import median
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from app.loadtest import HttpClient, Request
+
+STARTUP_TIMEOUT = 60
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_listening(port: int, process: subprocess.Popen) -> None:
+    deadline = time.perf_counter() + STARTUP_TIMEOUT
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise CommandError(f"uvicorn exited with status {process.returncode} during startup.")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.1).close()
+            return
+        except OSError:
+            time.sleep(0.005)
+    raise CommandError(f"uvicorn did not listen within {STARTUP_TIMEOUT}s.")
+
+
+class Command(BaseCommand):
+    help = "Measure time to first fast response of a fresh uvicorn worker with and without warm-up."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trials', type=int, default=3, help="Fresh workers started per mode.")
+        parser.add_argument('--passes', type=int, default=10, help="Steady-state passes over the paths.")
+        parser.add_argument('--fast-factor', type=float, default=2.0)
+        parser.add_argument('--slack-ms', type=float, default=5.0)
+
+    def handle(self, *args, **options):
+        if options['trials'] < 1 or options['passes'] < 1:
+            raise CommandError("--trials and --passes must be positive.")
+        for warm in (False, True):
+            trials = [self._trial(warm, options) for _ in range(options['trials'])]
+            self._report(warm, trials)
+
+    def _trial(self, warm: bool, options: dict) -> dict:
+        port = _free_port()
+        env = {
+            **os.environ,
+            'WARMUP_ENABLED': str(warm),
+            'AUCTION_SCHEDULER_ENABLED': 'False',
+            'JOB_WORKERS_ENABLED': 'False',
+            'RATE_LIMITS_ENABLED': 'False',
+            'LOAD_SHEDDING_ENABLED': 'False',
+        }
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [
+                sys.executable, '-m', 'uvicorn', '--host', '127.0.0.1', '--port', str(port), '--workers', '1',
+                '--lifespan', 'on', '--log-level', 'warning', 'conf.asgi:application',
+            ],
+            cwd=settings.BASE_DIR, env=env,
+        )
+        try:
+            _wait_listening(port, process)
+            listening = time.perf_counter() - started
+            passes = asyncio.run(self._passes(port, options['passes'] + 1))
+        finally:
+            process.terminate()
+            process.wait()
+        return self._analyse(started, listening, passes, options)
+
+    @staticmethod
+    async def _passes(port: int, count: int) -> list:
+        """
+        [(finished_at, {path: latency})] for count passes over WARMUP_PATHS.
+        """
+        client = HttpClient(f'http://127.0.0.1:{port}')
+        passes = []
+        for _ in range(count):
+            latencies = {}
+            for path in settings.WARMUP_PATHS:
+                sent = time.perf_counter()
+                response = await client.send(Request('GET', path))
+                if response.status >= 500:
+                    raise CommandError(f"GET {path} answered {response.status}.")
+                latencies[path] = time.perf_counter() - sent
+            passes.append((time.perf_counter(), latencies))
+        return passes
+
+    @staticmethod
+    def _analyse(started: float, listening: float, passes: list, options: dict) -> dict:
+        cold = passes[0][1]
+        steady = {path: median(latencies[path] for _, latencies in passes[1:]) for path in cold}
+        limits = {
+            path: max(steady[path] * options['fast_factor'], steady[path] + options['slack_ms'] / 1000)
+            for path in cold
+        }
+        all_fast = next(
+            (finished - started for finished, latencies in passes
+             if all(latencies[path] <= limits[path] for path in latencies)),
+            None,
+        )
+        return {
+            'listening': listening,
+            'first_response': listening + cold[settings.WARMUP_PATHS[0]],
+            'all_fast': all_fast,
+            'cold_penalty': sum(cold.values()) - sum(steady.values()),
+            'cold': cold,
+            'steady': steady,
+        }
+
+    def _report(self, warm: bool, trials: list) -> None:
+        def ms(key):
+            values = [trial[key] for trial in trials if trial[key] is not None]
+            return f"{median(values) * 1000:.0f}ms" if values else "never"
+
+        self.stdout.write(
+            f"warm-up {'on' if warm else 'off'}: listening {ms('listening')}, first response "
+            f"{ms('first_response')}, all fast {ms('all_fast')}, cold penalty {ms('cold_penalty')}"
+        )
+        for path in settings.WARMUP_PATHS:
+            cold = median(trial['cold'][path] for trial in trials) * 1000
+            steady = median(trial['steady'][path] for trial in trials) * 1000
+            self.stdout.write(f"    {path:<24} first {cold:8.1f}ms  steady {steady:6.1f}ms")
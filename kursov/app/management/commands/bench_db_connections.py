@@ -0,0 +1,86 @@
+"""
+Benchmark connection setup cost: a fresh connection per request versus a
+connection borrowed from the psycopg 3 pool.
+
+Each simulated request opens the connection the way Django does, runs one
+small query and releases the connection at request end.
+"""
+import copy
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.utils import ConnectionHandler
+
+from app.bench import format_summary, summarize
+
+
+class Command(BaseCommand):
+    help = "Compare request latency with per-request connections and with the connection pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help="Requests per mode.")
+        parser.add_argument('--concurrency', type=int, default=8, help="Parallel request threads.")
+        parser.add_argument('--database', default='default', help="Database alias to copy settings from.")
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError("--requests and --concurrency must be positive.")
+
+        base = copy.deepcopy(settings.DATABASES[options['database']])
+        options_without_pool = {k: v for k, v in base.get('OPTIONS', {}).items() if k != 'pool'}
+        direct = {**base, 'CONN_MAX_AGE': 0, 'OPTIONS': options_without_pool}
+        pooled = {
+            **base,
+            'CONN_MAX_AGE': 0,
+            'OPTIONS': {
+                **options_without_pool,
+                'pool': base.get('OPTIONS', {}).get('pool') or {
+                    'min_size': options['concurrency'],
+                    'max_size': options['concurrency'],
+                },
+            },
+        }
+        handler = ConnectionHandler({'default': base, 'bench_direct': direct, 'bench_pooled': pooled})
+
+        results = {}
+        try:
+            for alias in ('bench_direct', 'bench_pooled'):
+                self._request(handler, alias)  # Open the pool outside of the measurement.
+                results[alias] = self._run(handler, alias, options['requests'], options['concurrency'])
+        finally:
+            handler.close_all()
+            handler['bench_pooled'].close_pool()
+
+        for alias, (wall, latencies) in results.items():
+            self.stdout.write(
+                f"{alias.removeprefix('bench_'):>6}: {len(latencies) / wall:8.1f} req/s  "
+                f"{format_summary(summarize(latencies))}"
+            )
+        direct_p50 = summarize(results['bench_direct'][1])['p50_ms']
+        pooled_p50 = summarize(results['bench_pooled'][1])['p50_ms']
+        self.stdout.write(f"connection setup removed from p50: {direct_p50 - pooled_p50:.2f}ms")
+
+    @staticmethod
+    def _request(handler: ConnectionHandler, alias: str) -> float:
+        started = time.perf_counter()
+        connection = handler[alias]
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+        connection.close()
+        return time.perf_counter() - started
+
+    def _run(self, handler: ConnectionHandler, alias: str, requests: int, concurrency: int):
+        def worker(count: int) -> list:
+            try:
+                return [self._request(handler, alias) for _ in range(count)]
+            finally:
+                handler[alias].close()
+
+        counts = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = [latency for chunk in pool.map(worker, counts) for latency in chunk]
+        return time.perf_counter() - started, latencies
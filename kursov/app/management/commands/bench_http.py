@@ -0,0 +1,96 @@
+"""
+HTTP latency benchmark over the scripted scenarios of app.loadtest.
+
+By default requests are fed straight into the ASGI application of
+conf.asgi in this process; --url sends them to a running uvicorn instead
+(which must use the same database). Each scenario reports RPS, latency
+percentiles and SQL queries per request.
+
+--save-baseline stores the results as the reference for this machine;
+later runs are compared against it and the command fails when p95 or RPS
+get worse by more than --tolerance, or when a scenario runs more SQL
+queries or errors than in the baseline.
+"""
+import asyncio
+import json
+import time
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+
+from app.bench import format_summary
+from app.loadtest import SCENARIOS, AsgiClient, HttpClient, compare, login, run_scenario
+from app.models import CustomUser, Product
+
+PASSWORD = 'bench-http-password'
+
+
+class Command(BaseCommand):
+    help = "Run scripted HTTP scenarios in-process or against --url and compare with stored baselines."
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', help=f"Scenarios to run: {', '.join(SCENARIOS)} (default: all).")
+        parser.add_argument('--url', help="Base URL of a running server, e.g. http://127.0.0.1:8844.")
+        parser.add_argument('--requests', type=int, help="Requests per scenario (default: per scenario).")
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--baseline', default=str(settings.BASE_DIR / 'bench_baselines.json'))
+        parser.add_argument('--save-baseline', action='store_true', help="Store this run as the baseline.")
+        parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed relative slowdown.")
+
+    def handle(self, *args, **options):
+        names = options['scenarios'] or list(SCENARIOS)
+        unknown = set(names) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}.")
+        if options['concurrency'] < 1 or (options['requests'] is not None and options['requests'] < 1):
+            raise CommandError("--requests and --concurrency must be positive.")
+        if options['url']:
+            client = HttpClient(options['url'])
+        else:
+            from conf.asgi import application
+            client = AsgiClient(application)
+
+        tag = f"bench-http-{int(time.time())}"
+        user = CustomUser.objects.create(
+            username=tag, email=f"{tag}@bench.invalid", password=make_password(PASSWORD),
+        )
+        lot = Product.objects.create(name=tag, description=tag, price=Decimal('1.00'), stock=1)
+        state = {'username': user.username, 'password': PASSWORD, 'lot_id': lot.pk, 'bid_base': 2}
+        try:
+            results = asyncio.run(self._run(client, names, state, options))
+        finally:
+            lot.delete()
+            user.delete()
+
+        path = Path(options['baseline'])
+        if options['save_baseline']:
+            stored = json.loads(path.read_text()) if path.exists() else {}
+            path.write_text(json.dumps({**stored, **results}, indent=2, sort_keys=True) + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {path}."))
+            return
+        if not path.exists():
+            self.stdout.write(f"No baseline at {path}; run with --save-baseline to create one.")
+            return
+        problems = compare(results, json.loads(path.read_text()), options['tolerance'])
+        if problems:
+            raise CommandError("Performance regressions:\n" + '\n'.join(problems))
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
+
+    async def _run(self, client, names: list, state: dict, options: dict) -> dict:
+        if 'bid' in names:
+            state['cookies'] = await login(client, state['username'], state['password'])
+        results = {}
+        for name in names:
+            scenario = SCENARIOS[name]
+            requests = options['requests'] or scenario.requests
+            result = await run_scenario(client, scenario, state, requests, options['concurrency'])
+            results[name] = result
+            sql = f"{result['sql_mean']:.1f} (max {result['sql_max']})" if result['sql_mean'] is not None else 'n/a'
+            self.stdout.write(
+                f"{name:<8} {result['rps']:8.1f} rps  {format_summary(result)}  "
+                f"sql/req={sql}  statuses={result['statuses']}"
+            )
+        return results
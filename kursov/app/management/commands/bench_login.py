@@ -0,0 +1,99 @@
+"""
+Login throughput benchmark for one worker.
+
+Runs N logins through app.au.auth.aauthenticate from a number of concurrent
+coroutines on one event loop, the way a single uvicorn worker serves them,
+and reports logins per second, latency percentiles, logins shed with
+HashingBusy and the worst event loop stall seen meanwhile. With --outdated
+the users start with PBKDF2-SHA1 hashes, so the run also measures the hash
+upgrade done on first login.
+"""
+import asyncio
+import random
+import time
+
+from django.contrib.auth.hashers import PBKDF2SHA1PasswordHasher, make_password
+from django.core.management.base import BaseCommand, CommandError
+
+from app.au.auth import HashingBusy, aauthenticate
+from app.bench import format_summary, summarize
+from app.models import CustomUser
+
+PASSWORD = 'bench-login-password'
+TICK = 0.005
+
+
+class Command(BaseCommand):
+    help = "Run N concurrent logins on one event loop and report throughput and loop stalls."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=200, help="Total number of logins.")
+        parser.add_argument('--concurrency', type=int, default=16, help="Number of concurrent clients.")
+        parser.add_argument('--users', type=int, default=20, help="Number of distinct users.")
+        parser.add_argument('--outdated', action='store_true', help="Seed users with outdated hashes.")
+
+    def handle(self, *args, **options):
+        if options['logins'] < 1 or options['concurrency'] < 1 or options['users'] < 1:
+            raise CommandError("--logins, --concurrency and --users must be positive.")
+
+        tag = f"bench-login-{int(time.time())}"
+        hasher = 'pbkdf2_sha1' if options['outdated'] else 'default'
+        encoded = make_password(PASSWORD, hasher=hasher)
+        users = CustomUser.objects.bulk_create(
+            CustomUser(username=f"{tag}-{i}", email=f"{tag}-{i}@bench.invalid", password=encoded)
+            for i in range(options['users'])
+        )
+        try:
+            result = asyncio.run(self._run([user.username for user in users], options))
+            upgraded = CustomUser.objects.filter(pk__in=[user.pk for user in users]).exclude(
+                password__startswith=PBKDF2SHA1PasswordHasher.algorithm,
+            ).count()
+        finally:
+            CustomUser.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+        latencies, failed, shed, stall, wall = result
+        ok = len(latencies)
+        self.stdout.write(f"logins={options['logins']} concurrency={options['concurrency']} wall={wall:.3f}s")
+        self.stdout.write(f"accepted={ok} ({ok / wall:.1f}/s) shed={shed} failed={failed}")
+        self.stdout.write(f"latency {format_summary(summarize(latencies))}")
+        self.stdout.write(f"worst event loop stall={stall * 1000:.1f}ms")
+        if options['outdated']:
+            self.stdout.write(f"upgraded hashes={upgraded}/{len(users)}")
+        if failed:
+            raise CommandError("Some logins with valid credentials failed.")
+
+    async def _run(self, usernames: list, options: dict):
+        latencies, failed, shed = [], 0, 0
+        stall = 0.0
+        done = asyncio.Event()
+
+        async def ticker():
+            nonlocal stall
+            while not done.is_set():
+                started = time.perf_counter()
+                await asyncio.sleep(TICK)
+                stall = max(stall, time.perf_counter() - started - TICK)
+
+        async def client(count: int):
+            nonlocal failed, shed
+            for _ in range(count):
+                started = time.perf_counter()
+                try:
+                    user = await aauthenticate(random.choice(usernames), PASSWORD)
+                except HashingBusy:
+                    shed += 1
+                    continue
+                if user is None:
+                    failed += 1
+                else:
+                    latencies.append(time.perf_counter() - started)
+
+        workers = options['concurrency']
+        counts = [len(range(w, options['logins'], workers)) for w in range(workers)]
+        tick_task = asyncio.create_task(ticker())
+        started = time.perf_counter()
+        await asyncio.gather(*(client(count) for count in counts))
+        wall = time.perf_counter() - started
+        done.set()
+        await tick_task
+        return latencies, failed, shed, stall, wall
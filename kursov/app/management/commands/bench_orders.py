@@ -0,0 +1,123 @@
+"""
+Contention benchmark for order placement.
+
+Parallel clients place multi-line orders for a few lots with little stock,
+with lines listed in random order, until the stock runs out. Afterwards the
+command checks that no lot was oversold, that the stock taken matches the
+stored orders and that no transaction deadlocked. Every client thread uses
+its own database connection, like concurrent requests do.
+"""
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+from django.db.models import Sum
+
+from app.au.ordering import OrderRejected, place_order
+from app.bench import format_summary, summarize
+from app.models import CustomUser, Order, Product
+
+
+class Command(BaseCommand):
+    help = "Place N parallel multi-line orders on a few lots and verify stock is never oversold."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=2000, help="Total number of orders to place.")
+        parser.add_argument('--concurrency', type=int, default=32, help="Number of parallel buyers.")
+        parser.add_argument('--lots', type=int, default=5, help="Number of lots ordered from.")
+        parser.add_argument('--stock', type=int, default=500, help="Initial stock of every lot.")
+        parser.add_argument('--max-lines', type=int, default=3, help="Maximum lots per order.")
+        parser.add_argument('--keep', action='store_true', help="Keep the benchmark lots, orders and users.")
+
+    def handle(self, *args, **options):
+        if min(options['orders'], options['concurrency'], options['lots'], options['max_lines']) < 1:
+            raise CommandError("--orders, --concurrency, --lots and --max-lines must be positive.")
+        if options['stock'] < 0:
+            raise CommandError("--stock must not be negative.")
+
+        tag = f"bench-orders-{int(time.time())}"
+        lots = [
+            Product.objects.create(name=f"{tag}-{i}", description=tag, price=Decimal('1.00'), stock=options['stock'])
+            for i in range(options['lots'])
+        ]
+        lot_ids = [lot.pk for lot in lots]
+        users = CustomUser.objects.bulk_create(
+            CustomUser(username=f"{tag}-{i}", email=f"{tag}-{i}@bench.invalid", password='!')
+            for i in range(options['concurrency'])
+        )
+
+        lock = threading.Lock()
+        latencies, outcomes, taken = [], Counter(), Counter()
+
+        def order(user_id: int):
+            # Shuffled so that without sorted locking, orders would take
+            # the row locks of shared lots in opposite orders.
+            chosen = random.sample(lot_ids, random.randint(1, min(options['max_lines'], len(lot_ids))))
+            lines = {product_id: random.randint(1, 3) for product_id in chosen}
+            started = time.perf_counter()
+            try:
+                place_order(user_id, lines)
+                outcome = 'accepted'
+            except OrderRejected:
+                outcome = 'rejected'
+            except OperationalError:
+                outcome = 'failed'
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                outcomes[outcome] += 1
+                if outcome == 'accepted':
+                    taken.update(lines)
+
+        def run(user_id: int, indexes):
+            try:
+                for _ in indexes:
+                    order(user_id)
+            finally:
+                connections.close_all()
+
+        workers = options['concurrency']
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(run, [user.pk for user in users], [range(w, options['orders'], workers) for w in range(workers)]))
+        wall = time.perf_counter() - started
+
+        stock = dict(Product.objects.filter(pk__in=lot_ids).values_list('pk', 'stock'))
+        ordered = dict(
+            Order.objects.filter(product_id__in=lot_ids).values('product_id')
+            .annotate(total=Sum('quantity')).values_list('product_id', 'total')
+        )
+        problems = []
+        for product_id in lot_ids:
+            sold = options['stock'] - stock[product_id]
+            if stock[product_id] < 0 or ordered.get(product_id, 0) > options['stock']:
+                problems.append(f"lot {product_id} oversold: {ordered.get(product_id, 0)} ordered of {options['stock']}")
+            if sold != ordered.get(product_id, 0) or sold != taken[product_id]:
+                problems.append(
+                    f"lot {product_id}: stock fell by {sold}, orders hold {ordered.get(product_id, 0)}, "
+                    f"clients were granted {taken[product_id]}"
+                )
+        if outcomes['failed']:
+            problems.append(f"{outcomes['failed']} orders failed with database errors (deadlocks?)")
+
+        self.stdout.write(f"orders={options['orders']} concurrency={workers} lots={len(lot_ids)} wall={wall:.3f}s")
+        self.stdout.write(
+            f"accepted={outcomes['accepted']} ({outcomes['accepted'] / wall:.1f}/s) "
+            f"rejected={outcomes['rejected']} failed={outcomes['failed']} "
+            f"total={options['orders'] / wall:.1f}/s"
+        )
+        self.stdout.write(f"latency {format_summary(summarize(latencies))}")
+        self.stdout.write(f"sold={sum(ordered.values())} of {options['stock'] * len(lot_ids)} remaining={stock}")
+
+        if not options['keep']:
+            Product.objects.filter(pk__in=lot_ids).delete()
+            CustomUser.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+        if problems:
+            raise CommandError("Inconsistent stock:\n" + '\n'.join(problems))
+        self.stdout.write(self.style.SUCCESS("Stock was never oversold."))
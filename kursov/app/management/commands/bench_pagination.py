@@ -0,0 +1,79 @@
+"""
+Compare OFFSET pagination (django.core.paginator.Paginator) with keyset
+pagination (app.pagination.KeysetPaginator) at increasing page depths.
+
+Seeds a temporary set of lots with one INSERT ... SELECT generate_series so
+that large tables can be set up quickly.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.paginator import Paginator
+from django.db import connection
+
+from app.models import Product
+from app.pagination import KeysetPaginator
+
+BENCH_PREFIX = 'bench-pagination-'
+
+
+class Command(BaseCommand):
+    help = "Benchmark Paginator against KeysetPaginator at deep page numbers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200_000, help="Number of lots to seed.")
+        parser.add_argument('--per-page', type=int, default=20)
+        parser.add_argument('--pages', default='1,100,1000,5000', help="Comma separated page numbers.")
+        parser.add_argument('--repeat', type=int, default=5, help="Timed runs per page, best one is reported.")
+        parser.add_argument('--keep', action='store_true', help="Keep the seeded lots.")
+
+    def handle(self, *args, **options):
+        per_page = options['per_page']
+        pages = [int(page) for page in options['pages'].split(',')]
+        if max(pages) * per_page > options['rows']:
+            raise CommandError("The deepest page lies beyond the seeded rows; raise --rows.")
+
+        self._seed(options['rows'])
+        try:
+            queryset = Product.objects.filter(name__startswith=BENCH_PREFIX)
+            ordering = ('-created_at', '-id')
+            self.stdout.write(f"{'page':>8} {'offset ms':>10} {'keyset ms':>10}")
+            for number in pages:
+                offset_ms = self._best(options['repeat'], lambda: list(
+                    Paginator(queryset.order_by(*ordering), per_page).page(number).object_list
+                ))
+                # The cursor a client would hold after reading page number - 1.
+                keyset = KeysetPaginator(queryset, ordering, per_page)
+                cursor = None
+                if number > 1:
+                    boundary = queryset.order_by(*ordering)[(number - 1) * per_page - 1]
+                    cursor = keyset.encode_cursor(boundary, 'next')
+                keyset_ms = self._best(options['repeat'], lambda: keyset.get_page(cursor).object_list)
+                self.stdout.write(f"{number:>8} {offset_ms:>10.2f} {keyset_ms:>10.2f}")
+        finally:
+            if not options['keep']:
+                Product.objects.filter(name__startswith=BENCH_PREFIX).delete()
+
+    @staticmethod
+    def _best(repeat: int, run) -> float:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - started)
+        return min(timings) * 1000
+
+    def _seed(self, rows: int) -> None:
+        table = Product._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (name, description, price, stock, bid_count, created_at)
+                SELECT %s || i, 'benchmark lot', (random() * 1000)::numeric(10, 2), 1, 0,
+                       now() - make_interval(secs => i)
+                FROM generate_series(1, %s) AS i
+                """,
+                [BENCH_PREFIX, rows],
+            )
+            cursor.execute(f"ANALYZE {table}")
+        self.stdout.write(f"seeded {rows} lots")
@@ -0,0 +1,67 @@
+"""
+Stream products or categories to a CSV or JSONL file.
+
+Rows are read in id order through a server-side cursor
+(.iterator(chunk_size=...)), so memory use does not depend on the table
+size. The last written id is checkpointed together with the file length at
+that point; --resume truncates the file to that length, dropping rows (or
+half a row) flushed after the checkpoint, and appends the rows that follow
+the id.
+"""
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.catalog_io import CATALOG_MODELS, FORMATS, Checkpoint, detect_format, row_writer
+
+
+class Command(BaseCommand):
+    help = "Export products or categories to a CSV or JSONL file ('-' for stdout)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Output file, or '-' for stdout.")
+        parser.add_argument('--model', choices=CATALOG_MODELS, default='product')
+        parser.add_argument('--format', choices=FORMATS, help="Defaults to the file extension.")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--resume', action='store_true', help="Append rows after the last exported id.")
+
+    def handle(self, *args, **options):
+        model, columns = CATALOG_MODELS[options['model']]
+        to_stdout = options['path'] == '-'
+        if to_stdout and options['resume']:
+            raise CommandError("--resume needs an output file.")
+        fmt = detect_format(options['path'], options['format'])
+        checkpoint = None if to_stdout else Checkpoint(options['path'])
+        state = checkpoint.load() if options['resume'] else {}
+        after = state.get('last_id', 0)
+        if 'offset' in state:
+            os.truncate(options['path'], state['offset'])
+
+        queryset = model.objects.filter(pk__gt=after).order_by('pk').values_list(*columns)
+        stream = sys.stdout if to_stdout else open(
+            options['path'], 'a' if options['resume'] else 'w', newline='', encoding='utf-8',
+        )
+        exported, last_id = 0, after
+        started = time.perf_counter()
+        try:
+            write = row_writer(stream, fmt, columns, header=not options['resume'])
+            for values in queryset.iterator(chunk_size=options['chunk_size']):
+                write(values)
+                exported += 1
+                last_id = values[0]
+                if checkpoint and exported % options['chunk_size'] == 0:
+                    stream.flush()
+                    checkpoint.save(last_id=last_id, offset=stream.tell())
+        finally:
+            stream.flush()
+            if not to_stdout:
+                checkpoint.save(last_id=last_id, offset=stream.tell())
+                stream.close()
+
+        elapsed = time.perf_counter() - started
+        rate = exported / elapsed if elapsed else 0.0
+        self.stderr.write(f"Exported {exported} {options['model']} rows in {elapsed:.1f}s ({rate:.0f} rows/s).")
+        if checkpoint:
+            checkpoint.clear()
@@ -0,0 +1,113 @@
+"""
+Stream products or categories from a CSV or JSONL file into the database.
+
+Rows are read one at a time and written in batches with a single
+INSERT ... ON CONFLICT (id) DO UPDATE per batch, so memory use does not
+depend on the file size. Rows with an "id" update the existing record,
+rows without one are created. Every committed batch is recorded in a
+checkpoint file; --resume skips the rows that were already imported.
+Updated products get a new version (their ETag, see app.conditional) and
+the cached payloads of all written rows are invalidated.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import DatabaseError, connection, transaction
+
+from app.cache import catalog_cache
+from app.conditional import bump_versions
+from app.catalog_io import CATALOG_MODELS, FORMATS, Checkpoint, RowError, build_instance, detect_format, read_rows
+from app.models import Product
+
+
+def _invalidate(model, ids: list) -> None:
+    if model is not Product:
+        catalog_cache.bump('category')
+        return
+    # Created ids too: a lookup of an id before it existed is cached as None.
+    for pk in ids:
+        catalog_cache.bump('product', pk)
+        catalog_cache.bump('lot', pk)
+
+
+class Command(BaseCommand):
+    help = "Import products or categories from a CSV or JSONL file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Input file.")
+        parser.add_argument('--model', choices=CATALOG_MODELS, default='product')
+        parser.add_argument('--format', choices=FORMATS, help="Defaults to the file extension.")
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--resume', action='store_true', help="Continue after the last committed batch.")
+
+    def handle(self, *args, **options):
+        model, columns = CATALOG_MODELS[options['model']]
+        fmt = detect_format(options['path'], options['format'])
+        checkpoint = Checkpoint(options['path'])
+        skip = checkpoint.load().get('rows', 0) if options['resume'] else 0
+        if skip:
+            self.stdout.write(f"Resuming after {skip} rows.")
+
+        imported, batch = skip, []
+        started = time.perf_counter()
+        try:
+            with open(options['path'], newline='', encoding='utf-8') as stream:
+                for line, row in enumerate(read_rows(stream, fmt), start=1):
+                    if line <= skip:
+                        continue
+                    batch.append(build_instance(model, columns, row, line))
+                    if len(batch) >= options['batch_size']:
+                        imported += self._write(model, columns, batch)
+                        checkpoint.save(rows=imported)
+                        batch = []
+                        self._progress(imported - skip, started)
+                imported += self._write(model, columns, batch)
+        # DatabaseError: duplicate keys, or values over a column's max_length
+        # or max_digits, which build_instance does not check.
+        except (RowError, ValueError, DatabaseError) as exc:
+            raise CommandError(f"{exc} ({imported} rows committed, rerun with --resume after fixing the file)")
+
+        checkpoint.clear()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {imported - skip} {options['model']} rows in {elapsed:.1f}s "
+            f"({(imported - skip) / elapsed if elapsed else 0:.0f} rows/s)."
+        ))
+
+    @classmethod
+    def _write(cls, model, columns: list, batch: list) -> int:
+        if not batch:
+            return 0
+        update_fields = [name for name in columns if name != 'id']
+        with_id = [obj for obj in batch if obj.pk is not None]
+        without_id = [obj for obj in batch if obj.pk is None]
+        with transaction.atomic():
+            if with_id:
+                model.objects.bulk_create(
+                    with_id, update_conflicts=True, unique_fields=['id'], update_fields=update_fields,
+                )
+                # Before the rows without ids draw from the sequence, here or
+                # in a later batch.
+                cls._reset_sequence(model)
+                if model is Product:
+                    # The upsert cannot increment; new ETags for the updated lots.
+                    bump_versions([obj.pk for obj in with_id])
+            if without_id:
+                model.objects.bulk_create(without_id)
+            # Bulk writes send no model signals, so invalidate cached payloads here.
+            ids = [obj.pk for obj in batch]
+            transaction.on_commit(lambda: _invalidate(model, ids))
+        return len(batch)
+
+    @staticmethod
+    def _reset_sequence(model) -> None:
+        # Rows imported with explicit ids do not advance the id sequence.
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [model]):
+                cursor.execute(sql)
+
+    def _progress(self, rows: int, started: float) -> None:
+        elapsed = time.perf_counter() - started
+        rate = rows / elapsed if elapsed else 0.0
+        self.stdout.write(f"{rows} rows in {elapsed:.1f}s ({rate:.0f} rows/s)")
@@ -0,0 +1,97 @@
+"""
+Rebuild or verify the denormalized ProductRating aggregates from Review rows.
+
+The rating is part of the lot pages, so a rebuild bumps the version (see
+app.conditional) and the cached payloads of every lot it rewrote.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from app.cache import catalog_cache
+from app.conditional import bump_versions
+from app.models import ProductRating
+from app.ratings import AGGREGATE_FIELDS, aggregate_reviews
+
+
+def _invalidate(product_ids: list) -> None:
+    for pk in product_ids:
+        catalog_cache.bump('product', pk)
+        catalog_cache.bump('lot', pk)
+
+
+class Command(BaseCommand):
+    help = "Recompute product review aggregates, or check them with --verify."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', help="Only report aggregates that drifted.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['verify']:
+            drifted = self._verify(options['batch_size'])
+            if drifted:
+                raise CommandError(f"{drifted} product ratings differ from their reviews.")
+            self.stdout.write(self.style.SUCCESS("All product ratings match their reviews."))
+        else:
+            rebuilt = self._rebuild(options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuilt} product ratings."))
+        self.stdout.write(f"Done in {time.perf_counter() - started:.2f}s.")
+
+    def _rebuild(self, batch_size: int) -> int:
+        rebuilt = 0
+        with transaction.atomic():
+            reset = ProductRating.objects.filter(review_count__gt=0)
+            affected = set(reset.values_list('product_id', flat=True))
+            reset.update(
+                review_count=0, rating_sum=0, stars_1=0, stars_2=0, stars_3=0, stars_4=0, stars_5=0,
+                last_review_at=None,
+            )
+            batch = []
+            for row in aggregate_reviews().iterator(chunk_size=batch_size):
+                batch.append(ProductRating(product_id=row['product_id'], **{f: row[f] for f in AGGREGATE_FIELDS}))
+                if len(batch) >= batch_size:
+                    rebuilt += self._upsert(batch)
+                    affected.update(rating.product_id for rating in batch)
+                    batch = []
+            rebuilt += self._upsert(batch)
+            affected.update(rating.product_id for rating in batch)
+            affected = sorted(affected)
+            for start in range(0, len(affected), batch_size):
+                bump_versions(affected[start:start + batch_size])
+            transaction.on_commit(lambda: _invalidate(affected))
+        return rebuilt
+
+    @staticmethod
+    def _upsert(batch: list) -> int:
+        ProductRating.objects.bulk_create(
+            batch, update_conflicts=True, unique_fields=['product'], update_fields=AGGREGATE_FIELDS,
+        )
+        return len(batch)
+
+    def _verify(self, batch_size: int) -> int:
+        # Merge two streams ordered by product id, so memory stays constant.
+        stored = iter(
+            ProductRating.objects.filter(review_count__gt=0).order_by('product_id').iterator(chunk_size=batch_size)
+        )
+        expected_rows = iter(aggregate_reviews().order_by('product_id').iterator(chunk_size=batch_size))
+        rating, row = next(stored, None), next(expected_rows, None)
+        drifted = 0
+        while rating is not None or row is not None:
+            if row is None or (rating is not None and rating.product_id < row['product_id']):
+                drifted += 1
+                self.stdout.write(f"lot {rating.product_id}: stored a rating but has no reviews")
+                rating = next(stored, None)
+                continue
+            actual = None
+            if rating is not None and rating.product_id == row['product_id']:
+                actual = {f: getattr(rating, f) for f in AGGREGATE_FIELDS}
+                rating = next(stored, None)
+            expected = {f: row[f] for f in AGGREGATE_FIELDS}
+            if actual != expected:
+                drifted += 1
+                self.stdout.write(f"lot {row['product_id']}: stored {actual}, expected {expected}")
+            row = next(expected_rows, None)
+        return drifted
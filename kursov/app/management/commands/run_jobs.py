@@ -0,0 +1,50 @@
+"""
+Run background jobs outside the web workers, see app.jobs.
+
+Meant for a dedicated container (set JOB_WORKERS_ENABLED=False on the web
+workers then), or for draining the queue once with --once. --retry-failed
+puts jobs that ran out of attempts back in the queue first, e.g. after a
+mail server outage.
+"""
+import asyncio
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from app.jobs import JOBS, get_runner
+from app.models import Job
+
+
+class Command(BaseCommand):
+    help = "Run background jobs until stopped, or until none are due with --once."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, help="Jobs run at once (default: JOB_CONCURRENCY).")
+        parser.add_argument('--once', action='store_true', help="Exit when no jobs are due.")
+        parser.add_argument('--retry-failed', action='store_true', help="Requeue jobs that ran out of attempts.")
+
+    def handle(self, *args, **options):
+        if options['concurrency'] is not None and options['concurrency'] < 1:
+            raise CommandError("--concurrency must be positive.")
+        if options['retry_failed']:
+            requeued = Job.objects.filter(failed_at__isnull=False).update(
+                failed_at=None, attempts=0, run_at=timezone.now(),
+            )
+            self.stdout.write(f"Requeued {requeued} failed jobs.")
+        runner = get_runner(options['concurrency'])
+        self.stdout.write(f"Running jobs: {', '.join(sorted(JOBS))} ({runner.concurrency} at a time).")
+        asyncio.run(self._run(runner, options['once']))
+        self.stdout.write(self.style.SUCCESS("Job runner stopped."))
+
+    @staticmethod
+    async def _run(runner, once: bool) -> None:
+        task = asyncio.create_task(runner.run(until_empty=once))
+        loop = asyncio.get_running_loop()
+        # Stop cleanly on docker stop: interrupted jobs go back to the queue.
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, task.cancel)
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
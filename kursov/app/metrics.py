@@ -0,0 +1,279 @@
+"""
+Per-request performance metrics.
+
+MetricsMiddleware times every request and, through a context variable,
+collects the SQL queries (via a database execute wrapper) and template
+renders (via app.rendering) done on its behalf. Each response gets a
+Server-Timing header, and the values are added to histograms labelled by
+view.
+
+Every uvicorn worker keeps its histograms in memory and a background thread
+writes them to METRICS_DIR/<pid>-<start time>.json at most every
+METRICS_FLUSH_INTERVAL seconds. The /metrics view merges the files of all
+live workers, so the totals cover the whole server no matter which worker
+answers the scrape, and deletes those of workers that exited: the totals
+then drop, which Prometheus treats as a counter reset. The start time in
+the name keeps a worker that got a dead one's pid from taking over its file.
+"""
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# name -> (help, buckets)
+HISTOGRAMS = {
+    'kursov_request_duration_seconds': ("Time spent in the Django handler per request.", LATENCY_BUCKETS),
+    'kursov_request_db_seconds': ("Time spent executing SQL per request.", LATENCY_BUCKETS),
+    'kursov_request_db_queries': ("SQL queries executed per request.", QUERY_BUCKETS),
+    'kursov_template_render_seconds': ("Time spent rendering one template.", LATENCY_BUCKETS),
+}
+
+
+@dataclass
+class RequestStats:
+    db_queries: int = 0
+    db_time: float = 0.0
+    render_time: float = 0.0
+
+
+_current: ContextVar[RequestStats | None] = ContextVar('request_stats', default=None)
+
+
+class Registry:
+    """
+    Histograms of this worker, keyed by metric name and sorted label items.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+        self.dirty = threading.Event()
+
+    def observe(self, name: str, labels: tuple, value: float) -> None:
+        buckets = HISTOGRAMS[name][1]
+        with self._lock:
+            series = self._series.get((name, labels))
+            if series is None:
+                # Per-bucket counts (the last one is +Inf), sum, count.
+                series = self._series[(name, labels)] = [[0] * (len(buckets) + 1), 0.0, 0]
+            series[0][bisect_left(buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+        self.dirty.set()
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return [
+                {'name': name, 'labels': list(labels), 'buckets': list(buckets), 'sum': total, 'count': count}
+                for (name, labels), (buckets, total, count) in self._series.items()
+            ]
+
+
+registry = Registry()
+_flush_lock = threading.Lock()
+_flusher_lock = threading.Lock()
+_flusher = None
+
+
+def _process_key(pid: int) -> str | None:
+    """
+    '<pid>-<start time>' of a live process, which unlike the pid is not reused; None if it exited.
+    """
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            stat = f.read()
+    except FileNotFoundError:
+        if os.path.isdir('/proc'):
+            return None
+        # No procfs (not Linux): go by the pid alone.
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return None
+        except PermissionError:
+            pass
+        return str(pid)
+    # The start time is field 22; the command name (field 2) may hold spaces.
+    return f'{pid}-{stat.rsplit(")", 1)[1].split()[19]}'
+
+
+def _worker_path() -> Path:
+    return Path(settings.METRICS_DIR) / f'{_process_key(os.getpid())}.json'
+
+
+def flush() -> None:
+    """
+    Write this worker's histograms to its file in METRICS_DIR.
+    """
+    with _flush_lock:
+        registry.dirty.clear()
+        path = _worker_path()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix('.tmp')
+        tmp.write_text(json.dumps(registry.snapshot()))
+        os.replace(tmp, path)
+
+
+def _flush_forever() -> None:
+    while True:
+        registry.dirty.wait()
+        time.sleep(settings.METRICS_FLUSH_INTERVAL)
+        try:
+            flush()
+        except OSError:
+            pass
+
+
+def _start_flusher() -> None:
+    global _flusher
+    with _flusher_lock:
+        # Started per process, so forked workers get their own thread.
+        if _flusher is None or _flusher[0] != os.getpid():
+            thread = threading.Thread(target=_flush_forever, name='metrics-flush', daemon=True)
+            thread.start()
+            _flusher = (os.getpid(), thread)
+
+
+def record_render(template_name: str, seconds: float) -> None:
+    stats = _current.get()
+    if stats is not None:
+        stats.render_time += seconds
+    registry.observe('kursov_template_render_seconds', (('template', template_name),), seconds)
+
+
+def sql_wrapper(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_queries += 1
+        stats.db_time += time.perf_counter() - started
+
+
+def install_sql_wrapper(sender, connection, **kwargs) -> None:
+    """
+    connection_created receiver that adds sql_wrapper to every new connection.
+    """
+    if sql_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(sql_wrapper)
+
+
+class MetricsMiddleware:
+    """
+    Time each request, add a Server-Timing header and record its histograms.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        _start_flusher()
+
+    def __call__(self, request: HttpRequest):
+        if self.is_async:
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, stats, time.perf_counter() - started)
+
+    async def __acall__(self, request: HttpRequest):
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, stats, time.perf_counter() - started)
+
+    @staticmethod
+    def _finish(request: HttpRequest, response: HttpResponse, stats: RequestStats, elapsed: float) -> HttpResponse:
+        match = request.resolver_match
+        view = match.view_name if match else '<unmatched>'
+        labels = (('method', request.method), ('status', str(response.status_code)), ('view', view))
+        registry.observe('kursov_request_duration_seconds', labels, elapsed)
+        registry.observe('kursov_request_db_seconds', (('view', view),), stats.db_time)
+        registry.observe('kursov_request_db_queries', (('view', view),), stats.db_queries)
+        response['Server-Timing'] = (
+            f'app;dur={elapsed * 1000:.1f}, '
+            f'db;dur={stats.db_time * 1000:.1f};desc="{stats.db_queries} queries", '
+            f'tpl;dur={stats.render_time * 1000:.1f}'
+        )
+        return response
+
+
+def merged_snapshot() -> dict:
+    """
+    Sum the histograms written by every live worker, deleting those of the others.
+    """
+    merged = {}
+    for path in Path(settings.METRICS_DIR).glob('*.json'):
+        pid = path.stem.split('-')[0]
+        if not pid.isdigit() or path.stem != _process_key(int(pid)):
+            path.unlink(missing_ok=True)
+            continue
+        try:
+            entries = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        for entry in entries:
+            key = (entry['name'], tuple(tuple(item) for item in entry['labels']))
+            series = merged.setdefault(key, [[0] * len(entry['buckets']), 0.0, 0])
+            series[0] = [a + b for a, b in zip(series[0], entry['buckets'])]
+            series[1] += entry['sum']
+            series[2] += entry['count']
+    return merged
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: tuple, **extra) -> str:
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in (*labels, *extra.items()))
+
+
+def render_prometheus(merged: dict) -> str:
+    lines = []
+    for name, (help_text, bounds) in HISTOGRAMS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for (series_name, labels), (buckets, total, count) in sorted(merged.items()):
+            if series_name != name:
+                continue
+            cumulative = 0
+            for bound, observed in zip((*bounds, '+Inf'), buckets):
+                cumulative += observed
+                lines.append(f'{name}_bucket{{{_format_labels(labels, le=bound)}}} {cumulative}')
+            lines.append(f'{name}_sum{{{_format_labels(labels)}}} {total}')
+            lines.append(f'{name}_count{{{_format_labels(labels)}}} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request: HttpRequest) -> HttpResponse:
+    """
+    Prometheus text exposition of the histograms of all workers.
+    """
+    flush()
+    return HttpResponse(render_prometheus(merged_snapshot()), content_type='text/plain; version=0.0.4')
@@ -0,0 +1,115 @@
+"""
+Refreshing nginx's micro-cache of the lot pages after writes.
+
+nginx keeps anonymous GETs of the lot listings and lot details for
+MICROCACHE_TTL seconds (see Dockerfiles/nginx/nginx.conf), so hot lots are
+mostly served without reaching Django and an expired entry is revalidated
+with the ETag of app.conditional. So that a bid does not stay invisible for
+that time, the on-commit hooks of the writes that change a lot call
+purge_lot(), which has nginx refetch the lot's detail and the first
+listing pages.
+
+Open-source nginx cannot delete cache entries (proxy_cache_purge is an
+NGINX Plus or third-party module feature), so the "purge" is a GET to a
+second nginx server at NGINX_PURGE_URL, reachable only on the backend
+network, that always bypasses the cache and stores the fresh response
+under the same key. Other pages (other sort orders, later cursors) simply
+expire, as do the pages of lots changed by management commands
+(import_catalog, rebuild_ratings): they bump the versions, so the pages are
+refetched at the next revalidation, but send no refreshes, which would
+flood the app on a large import and be lost when the command exits.
+
+The requests go out from a daemon thread per worker, MICROCACHE_PURGE_DELAY
+after the write: the refresh may reach any worker, and one that read the
+lot's catalog cache version just before the write goes on serving the old
+payload for up to CATALOG_CACHE['version_ttl']. A path queued again before
+its refresh went out is not queued twice, so a burst of bids on a lot costs
+one refresh per page instead of one per bid. Failures are only logged: the
+entries expire soon enough on their own.
+"""
+import logging
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from django.conf import settings
+from django.urls import reverse
+
+logger = logging.getLogger(__name__)
+
+
+class CachePurger:
+    """
+    Background thread refreshing nginx cache entries by path.
+    """
+    def __init__(self, base_url: str, delay: float, timeout: float = 2.0):
+        self.base_url = base_url.rstrip('/')
+        self.delay = delay
+        self.timeout = timeout
+        # Path: monotonic time it is due. Paths are due in insertion order,
+        # as they all wait the same delay.
+        self._pending = {}
+        self._condition = threading.Condition()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_started(self) -> None:
+        # Started per process, so forked workers get their own thread.
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='microcache-purger', daemon=True)
+        self._thread.start()
+
+    def purge(self, paths) -> None:
+        if not self.base_url:
+            return
+        due = time.monotonic() + self.delay
+        with self._condition:
+            self._ensure_started()
+            for path in paths:
+                self._pending.setdefault(path, due)
+            self._condition.notify()
+
+    def _next(self) -> str:
+        with self._condition:
+            while True:
+                if not self._pending:
+                    self._condition.wait()
+                    continue
+                path, due = next(iter(self._pending.items()))
+                wait = due - time.monotonic()
+                if wait <= 0:
+                    del self._pending[path]
+                    return path
+                self._condition.wait(wait)
+
+    def _run(self) -> None:
+        while True:
+            self._refresh(self._next())
+
+    def _refresh(self, path: str) -> None:
+        try:
+            with urllib.request.urlopen(self.base_url + path, timeout=self.timeout) as response:
+                response.read()
+        except urllib.error.HTTPError as exc:
+            # 404 for a deleted lot is expected; nginx keeps nothing but 200s.
+            logger.debug("Refreshing %s in the nginx cache answered %d.", path, exc.code)
+        except OSError as exc:
+            logger.warning("Could not refresh %s in the nginx cache: %s", path, exc)
+
+
+purger = CachePurger(settings.NGINX_PURGE_URL, settings.MICROCACHE_PURGE_DELAY)
+
+
+def purge_lot(product_id: int) -> None:
+    """
+    Refresh the cached detail of a lot and the first listing pages, which may show it.
+    """
+    purger.purge([
+        reverse('au:auction_detail', args=[product_id]),
+        reverse('au:index'),
+        reverse('au:lot_list'),
+    ])
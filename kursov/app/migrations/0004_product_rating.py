@@ -0,0 +1,61 @@
+# Generated by Django 5.2.2 on 2026-10-18 15:16
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Only forms validated ratings before, so rows outside 1-5 may exist; they
+# are clamped rather than failing the constraint below.
+CLAMP_RATINGS = """
+UPDATE app_review SET rating = LEAST(GREATEST(rating, 1), 5) WHERE rating NOT BETWEEN 1 AND 5;
+"""
+
+BACKFILL_RATINGS = """
+INSERT INTO app_productrating
+    (product_id, review_count, rating_sum, stars_1, stars_2, stars_3, stars_4, stars_5, last_review_at)
+SELECT product_id, count(*), sum(rating),
+       count(*) FILTER (WHERE rating = 1), count(*) FILTER (WHERE rating = 2),
+       count(*) FILTER (WHERE rating = 3), count(*) FILTER (WHERE rating = 4),
+       count(*) FILTER (WHERE rating = 5), max(created_at)
+FROM app_review
+GROUP BY product_id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_product_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductRating',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating', serialize=False, to='app.product')),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('stars_1', models.PositiveIntegerField(default=0)),
+                ('stars_2', models.PositiveIntegerField(default=0)),
+                ('stars_3', models.PositiveIntegerField(default=0)),
+                ('stars_4', models.PositiveIntegerField(default=0)),
+                ('stars_5', models.PositiveIntegerField(default=0)),
+                ('last_review_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Product Rating',
+                'verbose_name_plural': 'Product Ratings',
+            },
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='rating',
+            field=models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(5)]),
+        ),
+        migrations.RunSQL(CLAMP_RATINGS, migrations.RunSQL.noop),
+        migrations.AddConstraint(
+            model_name='review',
+            constraint=models.CheckConstraint(condition=models.Q(('rating__gte', 1), ('rating__lte', 5)), name='review_rating_range'),
+        ),
+        migrations.RunSQL(BACKFILL_RATINGS, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,29 @@
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.db import migrations, models
+
+
+def hash_plain_passwords(apps, schema_editor):
+    CustomUser = apps.get_model('app', 'CustomUser')
+    for user in CustomUser.objects.only('pk', 'password').iterator():
+        if user.password.startswith('!'):
+            continue
+        try:
+            identify_hasher(user.password)
+        except ValueError:
+            CustomUser.objects.filter(pk=user.pk).update(password=make_password(user.password))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_product_rating'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customuser',
+            name='password',
+            field=models.CharField(help_text='Password hash, see app.au.auth.', max_length=128),
+        ),
+        migrations.RunPython(hash_plain_passwords, migrations.RunPython.noop),
+    ]
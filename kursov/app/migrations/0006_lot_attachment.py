@@ -0,0 +1,35 @@
+# Generated by Django 5.2.2 on 2026-10-18 15:43
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_hash_custom_user_passwords'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LotAttachment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('upload_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('filename', models.CharField(max_length=255)),
+                ('size', models.PositiveBigIntegerField()),
+                ('sha256', models.CharField(max_length=64)),
+                ('received', models.PositiveBigIntegerField(default=0)),
+                ('file', models.FileField(blank=True, upload_to='lots/')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attachments', to='app.product')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.customuser')),
+            ],
+            options={
+                'verbose_name': 'Lot Attachment',
+                'verbose_name_plural': 'Lot Attachments',
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.2 on 2026-10-18 15:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_order_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='closed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='ends_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('closed_at__isnull', True), ('ends_at__isnull', False)), fields=['ends_at'], name='product_open_ends_at_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.2 on 2026-10-18 16:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        # Existing lots were last modified no later than now (the value the
+        # column was added with); created_at is the best guess we have.
+        migrations.RunSQL(
+            'UPDATE app_product SET updated_at = created_at WHERE created_at IS NOT NULL',
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -1,4 +1,13 @@
+import uuid
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models.functions import Now
+from django.utils import timezone
 
 # Create your models here.
 class ExampleModel(models.Model):
@@ -35,11 +44,17 @@ class CustomUser(models.Model):
     """
     username = models.CharField(max_length=150, unique=True)
     email = models.EmailField(unique=True)
-    password = models.CharField(max_length=128)
+    password = models.CharField(max_length=128, help_text="Password hash, see app.au.auth.")
 
     def __str__(self):
         return self.username
 
+    def set_password(self, raw_password: str) -> None:
+        """
+        Hash raw_password synchronously; async code should use app.au.auth.ahash_password.
+        """
+        self.password = make_password(raw_password)
+
     class Meta:
         verbose_name = "Custom User"
         verbose_name_plural = "Custom Users"
@@ -52,19 +67,66 @@ class Product(models.Model):
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField()
+    current_bid = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    bid_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Auction end; lots without one stay open. Closed by app.au.closing.
+    ends_at = models.DateTimeField(blank=True, null=True)
+    closed_at = models.DateTimeField(blank=True, null=True, editable=False)
+    # Maintained by a database trigger from name and description, see
+    # migration 0003 and app.au.search.
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Bumped by every write that changes what the lot pages show, including
+    # queryset updates (bids, orders, closing) and the lot's reviews and
+    # comments; the ETag and Last-Modified of those pages, see app.conditional.
+    # Database defaults too, for raw INSERTs (benchmark and audit commands).
+    version = models.PositiveIntegerField(default=1, db_default=1, editable=False)
+    updated_at = models.DateTimeField(auto_now=True, db_default=Now())
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            # Incremented in the UPDATE, so a bid bumping the version
+            # concurrently is not lost.
+            self.version = models.F('version') + 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version', 'updated_at'}
+        super().save(*args, **kwargs)
+        if not isinstance(self.version, int):
+            self.refresh_from_db(fields=['version'])
+
+    def _do_insert(self, *args, **kwargs):
+        # save() found no row to update (deleted meanwhile) and inserts it
+        # again: there is no version to increment.
+        if not isinstance(self.version, int):
+            self.version = 1
+        return super()._do_insert(*args, **kwargs)
+
     class Meta:
         verbose_name = "Product"
         verbose_name_plural = "Products"
+        indexes = [
+            # Keyset pagination of the lot listings (see app.pagination).
+            models.Index(fields=['-created_at', '-id'], name='product_created_id_idx'),
+            models.Index(fields=['price', 'id'], name='product_price_id_idx'),
+            GinIndex(fields=['search_vector'], name='product_search_idx'),
+            # Open lots by end time, for the closing scheduler.
+            models.Index(
+                fields=['ends_at'], name='product_open_ends_at_idx',
+                condition=models.Q(closed_at__isnull=True, ends_at__isnull=False),
+            ),
+            GinIndex(fields=['name'], name='product_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ]
 
 class Order(models.Model):
     """
     Order model for e-commerce applications.
     """
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    # Null for orders placed before orders were tied to users.
+    user = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, blank=True, null=True, related_name='orders')
     quantity = models.PositiveIntegerField()
     order_date = models.DateTimeField(auto_now_add=True)
 
@@ -74,6 +136,10 @@ class Order(models.Model):
     class Meta:
         verbose_name = "Order"
         verbose_name_plural = "Orders"
+        indexes = [
+            # Orders by date range, e.g. the recent orders of a day.
+            models.Index(fields=['order_date'], name='order_date_idx'),
+        ]
 
 class Category(models.Model):
     """
@@ -104,6 +170,10 @@ class Comment(models.Model):
     class Meta:
         verbose_name = "Comment"
         verbose_name_plural = "Comments"
+        indexes = [
+            # Latest comments of a lot (see app.catalog.lot_detail_queryset).
+            models.Index(fields=['product', '-created_at', '-id'], name='comment_product_recent_idx'),
+        ]
 
 class Review(models.Model):
     """
@@ -111,7 +181,7 @@ class Review(models.Model):
     """
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
-    rating = models.PositiveIntegerField()
+    rating = models.PositiveIntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)])
     comment = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -121,3 +191,110 @@ class Review(models.Model):
     class Meta:
         verbose_name = "Review"
         verbose_name_plural = "Reviews"
+        indexes = [
+            # Latest reviews of a lot (see app.catalog.lot_detail_queryset).
+            models.Index(fields=['product', '-created_at', '-id'], name='review_product_recent_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(condition=models.Q(rating__gte=1, rating__lte=5), name='review_rating_range'),
+        ]
+
+class ProductRating(models.Model):
+    """
+    Review aggregates of a product, maintained incrementally by app.ratings.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='rating')
+    review_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    stars_1 = models.PositiveIntegerField(default=0)
+    stars_2 = models.PositiveIntegerField(default=0)
+    stars_3 = models.PositiveIntegerField(default=0)
+    stars_4 = models.PositiveIntegerField(default=0)
+    stars_5 = models.PositiveIntegerField(default=0)
+    last_review_at = models.DateTimeField(blank=True, null=True)
+
+    @property
+    def average(self):
+        return self.rating_sum / self.review_count if self.review_count else None
+
+    @property
+    def histogram(self):
+        return [self.stars_1, self.stars_2, self.stars_3, self.stars_4, self.stars_5]
+
+    def __str__(self):
+        return f"Rating of lot {self.product_id}"
+
+    class Meta:
+        verbose_name = "Product Rating"
+        verbose_name_plural = "Product Ratings"
+
+class Bid(models.Model):
+    """
+    Bid model for auction lots.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Bid {self.amount} on lot {self.product_id}"
+
+    class Meta:
+        verbose_name = "Bid"
+        verbose_name_plural = "Bids"
+        indexes = [
+            models.Index(fields=['product', '-amount'], name='bid_product_amount_idx'),
+        ]
+
+class LotAttachment(models.Model):
+    """
+    A file attached to a lot (screenshot, proof of ownership), uploaded in chunks.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='attachments')
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
+    upload_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    received = models.PositiveBigIntegerField(default=0)
+    file = models.FileField(upload_to='lots/', blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+
+    @property
+    def is_complete(self):
+        return self.completed_at is not None
+
+    def __str__(self):
+        return f"{self.filename} on lot {self.product_id}"
+
+    class Meta:
+        verbose_name = "Lot Attachment"
+        verbose_name_plural = "Lot Attachments"
+
+class Job(models.Model):
+    """
+    A background job in the outbox, see app.jobs.
+    """
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    # Next time the job may run: when it was enqueued, the end of the lease
+    # of the worker running it, or the next retry.
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Set once the job ran out of attempts; it is then kept for inspection.
+    failed_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Job {self.name} #{self.pk}"
+
+    class Meta:
+        verbose_name = "Background Job"
+        verbose_name_plural = "Background Jobs"
+        indexes = [
+            # Pending jobs by due time, for the workers' claim query.
+            models.Index(fields=['run_at'], name='job_pending_run_at_idx', condition=models.Q(failed_at__isnull=True)),
+        ]
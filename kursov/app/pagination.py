@@ -0,0 +1,143 @@
+"""
+Keyset (cursor) pagination.
+
+Unlike django.core.paginator.Paginator this never runs COUNT(*) and never
+uses OFFSET: a page is "the next per_page rows after the last row of the
+previous page" in a fixed ordering that ends with a unique column. With an
+index on the ordering columns every page costs the same, at any depth.
+
+Cursors are opaque url-safe strings holding the ordering values of the
+boundary row.
+"""
+import base64
+import datetime
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q, QuerySet
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    """
+    DjangoJSONEncoder without its millisecond truncation of times: a cursor
+    must hold the boundary position exactly, or rows sharing its millisecond
+    are skipped or repeated.
+    """
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+class InvalidCursor(ValueError):
+    """
+    Raised when a cursor cannot be decoded for the paginated ordering.
+    """
+
+
+class KeysetPage:
+    """
+    One page of a keyset-paginated queryset.
+    """
+    def __init__(self, object_list: list, next_cursor: str | None, previous_cursor: str | None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self) -> bool:
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset by the values of its ordering columns.
+
+    ``ordering`` uses the order_by() syntax and must end with a unique field,
+    usually the primary key, so that every row has a distinct position.
+    """
+    def __init__(self, queryset: QuerySet, ordering=('-created_at', '-id'), per_page: int = 20):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.fields = [name.lstrip('-') for name in self.ordering]
+        self.descending = [name.startswith('-') for name in self.ordering]
+
+    def encode_cursor(self, obj, direction: str) -> str:
+        values = [getattr(obj, name) for name in self.fields]
+        raw = json.dumps([direction, values], cls=_CursorEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor: str) -> tuple:
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            direction, values = json.loads(raw)
+            if direction not in ('next', 'prev') or len(values) != len(self.fields):
+                raise ValueError
+            model = self.queryset.model
+            values = [
+                model._meta.get_field(name).to_python(value)
+                for name, value in zip(self.fields, values)
+            ]
+        except Exception:
+            raise InvalidCursor("Invalid pagination cursor.")
+        return direction, values
+
+    def _after(self, values: list, reverse: bool) -> Q:
+        """
+        Rows strictly after the given position in the (possibly reversed) ordering.
+
+        Builds a >= x AND ((a > x) OR (a = x AND b > y) OR ...) for the
+        ordering columns. The leading a >= x bound lets PostgreSQL start an
+        index range scan at the cursor instead of filtering from the start.
+        """
+        condition = Q()
+        for i, name in enumerate(self.fields):
+            lookup = 'lt' if self.descending[i] != reverse else 'gt'
+            term = Q(**{f'{name}__{lookup}': values[i]})
+            for prev in range(i):
+                term &= Q(**{self.fields[prev]: values[prev]})
+            condition |= term
+        lookup = 'lte' if self.descending[0] != reverse else 'gte'
+        return Q(**{f'{self.fields[0]}__{lookup}': values[0]}) & condition
+
+    def get_page(self, cursor: str | None = None) -> KeysetPage:
+        """
+        Return the page that follows (or precedes) the position in ``cursor``.
+        """
+        direction, values = self.decode_cursor(cursor) if cursor else ('next', None)
+        reverse = direction == 'prev'
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(name[1:] if name.startswith('-') else f'-{name}' for name in ordering)
+
+        queryset = self.queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._after(values, reverse))
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+
+        if not rows:
+            return KeysetPage([], None, None)
+        if reverse:
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+        return KeysetPage(
+            rows,
+            self.encode_cursor(rows[-1], 'next') if has_next else None,
+            self.encode_cursor(rows[0], 'prev') if has_previous else None,
+        )
@@ -0,0 +1,177 @@
+"""
+Registry of hot queries, audited with EXPLAIN by the audit_queries command.
+
+Each entry runs the real code path of a page or job (not a copy of its
+SQL; cached payloads are audited through their loaders), so the audit
+follows the ORM queries as they change. Every statement the entry executes
+is captured with its parameters and explained with EXPLAIN (ANALYZE,
+BUFFERS, FORMAT JSON) inside a transaction that is rolled back. A plan is
+flagged when it sequentially scans a table the entry does not explicitly
+allow, or when it runs longer than the slow threshold.
+"""
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from app.au.closing import due_lots, winning_bids
+from app.au.search import search_products
+from app.au.views import EXPORT_CHUNK_SIZE, LOT_ORDERINGS, LOTS_PER_PAGE
+from app.catalog import _load_categories, _load_lot
+from app.models import Order, Product
+from app.pagination import KeysetPaginator
+
+
+@dataclass
+class HotQuery:
+    name: str
+    run: object
+    # Tables that are small by design and may be read whole.
+    allow_seq_scan: tuple = ()
+
+
+@dataclass
+class Finding:
+    query: str
+    sql: str
+    execution_ms: float
+    buffers: int
+    seq_scans: list = field(default_factory=list)
+    slow: bool = False
+    error: str | None = None
+
+    @property
+    def flagged(self) -> bool:
+        return bool(self.seq_scans or self.slow or self.error)
+
+
+HOT_QUERIES = {}
+
+
+def hot_query(name: str, allow_seq_scan: tuple = ()):
+    """
+    Register a function taking the audit context as a hot query.
+    """
+    def decorator(func):
+        HOT_QUERIES[name] = HotQuery(name, func, allow_seq_scan)
+        return func
+    return decorator
+
+
+def _lot_page(ordering: tuple) -> list:
+    paginator = KeysetPaginator(Product.objects.select_related('rating'), ordering, per_page=LOTS_PER_PAGE)
+    return list(paginator.get_page(None).object_list)
+
+
+@hot_query('lots_newest')
+def lots_newest(context: dict):
+    return _lot_page(LOT_ORDERINGS['newest'])
+
+
+@hot_query('lots_by_price')
+def lots_by_price(context: dict):
+    return _lot_page(LOT_ORDERINGS['price'])
+
+
+@hot_query('lot_detail')
+def lot_detail(context: dict):
+    return _load_lot(context['product_id'])
+
+
+@hot_query('categories', allow_seq_scan=('app_category',))
+def categories(context: dict):
+    return _load_categories()
+
+
+@hot_query('search')
+def search(context: dict):
+    return list(search_products('steam account', limit=LOTS_PER_PAGE))
+
+
+@hot_query('recent_orders')
+def recent_orders(context: dict):
+    since = timezone.now() - timedelta(hours=1)
+    return list(Order.objects.filter(order_date__gte=since).order_by('-order_date')[:100])
+
+
+@hot_query('orders_export')
+def orders_export(context: dict):
+    return list(
+        Order.objects.order_by('id').values('id', 'product_id', 'user_id', 'quantity', 'order_date')[:EXPORT_CHUNK_SIZE]
+    )
+
+
+@hot_query('closing_due_lots')
+def closing_due_lots(context: dict):
+    return due_lots(timezone.now() + timedelta(minutes=5))
+
+
+@hot_query('closing_winning_bids')
+def closing_winning_bids(context: dict):
+    return list(winning_bids(context['product_ids']))
+
+
+def capture_statements(run, using: str = DEFAULT_DB_ALIAS) -> list:
+    """
+    Run run() and return the (sql, params) of every statement it executed.
+    """
+    statements = []
+
+    def record(execute, sql, params, many, context):
+        statements.append((sql, params))
+        return execute(sql, params, many, context)
+
+    with connections[using].execute_wrapper(record):
+        run()
+    return statements
+
+
+def _walk(plan: dict):
+    yield plan
+    for child in plan.get('Plans', ()):
+        yield from _walk(child)
+
+
+def explain(sql: str, params, using: str = DEFAULT_DB_ALIAS) -> dict:
+    """
+    EXPLAIN (ANALYZE, BUFFERS) one statement without keeping its effects.
+    """
+    with transaction.atomic(using=using):
+        with connections[using].cursor() as cursor:
+            cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}', params)
+            (result,), = cursor.fetchall()
+        transaction.set_rollback(True, using=using)
+    return result[0]
+
+
+def audit(query: HotQuery, context: dict, slow_ms: float, using: str = DEFAULT_DB_ALIAS) -> list:
+    """
+    Explain every statement of a hot query and return one Finding per statement.
+    """
+    try:
+        statements = capture_statements(lambda: query.run(context), using)
+    except Exception as exc:
+        return [Finding(query.name, '', 0.0, 0, error=f'{type(exc).__name__}: {exc}')]
+    findings = []
+    for sql, params in statements:
+        try:
+            result = explain(sql, params, using)
+        except Exception as exc:
+            findings.append(Finding(query.name, sql, 0.0, 0, error=f'{type(exc).__name__}: {exc}'))
+            continue
+        nodes = list(_walk(result['Plan']))
+        seq_scans = sorted({
+            node['Relation Name'] for node in nodes
+            if node['Node Type'] == 'Seq Scan' and node['Relation Name'] not in query.allow_seq_scan
+        })
+        root = result['Plan']
+        findings.append(Finding(
+            query=query.name,
+            sql=sql,
+            execution_ms=result['Execution Time'],
+            buffers=root.get('Shared Hit Blocks', 0) + root.get('Shared Read Blocks', 0),
+            seq_scans=seq_scans,
+            slow=result['Execution Time'] > slow_ms,
+        ))
+    return findings
@@ -0,0 +1,67 @@
+"""
+Query budgets.
+
+assert_max_queries() fails when a block runs more SQL queries than allowed,
+which catches N+1 regressions in tests (see app.tests). The query_budget()
+decorator applies the same check to a function at runtime when
+QUERY_BUDGETS_ENFORCED=True, so a regression also fails loudly in
+development and CI smoke runs; it is off by default and in production.
+
+Queries are counted with a database execute wrapper, so DEBUG query logging
+is not required.
+"""
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class QueryBudgetExceeded(AssertionError):
+    """
+    Raised when a block runs more queries than its budget.
+    """
+
+
+@contextmanager
+def capture_queries(using: str = DEFAULT_DB_ALIAS):
+    """
+    Collect the SQL of every query run on the given connection inside the block.
+    """
+    captured = []
+
+    def record(execute, sql, params, many, context):
+        captured.append(sql)
+        return execute(sql, params, many, context)
+
+    with connections[using].execute_wrapper(record):
+        yield captured
+
+
+@contextmanager
+def assert_max_queries(limit: int, using: str = DEFAULT_DB_ALIAS):
+    """
+    Fail if the block runs more than limit queries.
+    """
+    with capture_queries(using) as captured:
+        yield captured
+    if len(captured) > limit:
+        listing = '\n'.join(f'{i}. {sql}' for i, sql in enumerate(captured, start=1))
+        raise QueryBudgetExceeded(f"{len(captured)} queries executed, budget is {limit}:\n{listing}")
+
+
+def query_budget(limit: int, using: str = DEFAULT_DB_ALIAS):
+    """
+    Decorator enforcing assert_max_queries(limit) on every call when
+    QUERY_BUDGETS_ENFORCED is set.
+    """
+    def decorator(func):
+        if not settings.QUERY_BUDGETS_ENFORCED:
+            return func
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with assert_max_queries(limit, using):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
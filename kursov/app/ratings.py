@@ -0,0 +1,77 @@
+"""
+Incremental maintenance of ProductRating.
+
+Every created, changed or deleted Review applies a +1/-1 delta to the
+aggregate row of its product with a single UPDATE of F() expressions, so
+concurrent reviews never overwrite each other's counts and listing pages
+read ratings with a join instead of aggregating reviews.
+
+Bulk operations that bypass model signals (queryset.update(), bulk_create)
+must be followed by ``manage.py rebuild_ratings``.
+"""
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Greatest
+
+from app.models import Product, ProductRating, Review
+
+STAR_FIELDS = {star: f'stars_{star}' for star in range(1, 6)}
+AGGREGATE_FIELDS = ['review_count', 'rating_sum', *STAR_FIELDS.values(), 'last_review_at']
+
+
+def apply_review(product_id: int, rating: int, delta: int, created_at=None) -> None:
+    """
+    Add (delta=1) or remove (delta=-1) one review from the product aggregates.
+    """
+    if delta > 0:
+        # Removing never creates the row: it may be gone already when the
+        # review is deleted together with its product.
+        ProductRating.objects.bulk_create([ProductRating(product_id=product_id)], ignore_conflicts=True)
+    changes = {
+        'review_count': F('review_count') + delta,
+        'rating_sum': F('rating_sum') + delta * rating,
+    }
+    if rating in STAR_FIELDS:
+        changes[STAR_FIELDS[rating]] = F(STAR_FIELDS[rating]) + delta
+    if delta > 0 and created_at is not None:
+        changes['last_review_at'] = Greatest('last_review_at', created_at)
+    elif delta < 0:
+        changes['last_review_at'] = Subquery(
+            Review.objects
+            .filter(product_id=OuterRef('product_id'))
+            .order_by('-created_at')
+            .values('created_at')[:1]
+        )
+    ProductRating.objects.filter(product_id=product_id).update(**changes)
+
+
+def aggregate_reviews():
+    """
+    Aggregates of all reviews computed from scratch, one dict per product.
+    """
+    return (
+        Review.objects
+        .order_by()
+        .values('product_id')
+        .annotate(
+            review_count=Count('id'),
+            rating_sum=Sum('rating'),
+            last_review_at=Max('created_at'),
+            **{field: Count('id', filter=Q(rating=star)) for star, field in STAR_FIELDS.items()},
+        )
+    )
+
+
+def rating_summary(product: Product) -> dict:
+    """
+    Average rating and review count of a product loaded with
+    select_related('rating'); lots without reviews have no rating row.
+    """
+    try:
+        rating = product.rating
+    except ProductRating.DoesNotExist:
+        return {'rating': None, 'review_count': 0}
+    average = rating.average
+    return {
+        'rating': round(average, 2) if average is not None else None,
+        'review_count': rating.review_count,
+    }
@@ -0,0 +1,83 @@
+"""
+Template rendering helpers with per-template render timings.
+
+arender() is the async counterpart of django.shortcuts.render(): the
+template is rendered in the request's sync thread (thread_sensitive, so any
+lazy database access from the template stays on the request's connection)
+and the event loop is free in the meantime.
+
+Every render is timed and added to render_timings, keyed by template name,
+and to the request metrics (app.metrics); renders slower than
+SLOW_RENDER_SECONDS are also logged.
+"""
+import logging
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.http import HttpRequest, HttpResponse
+from django.template import loader
+
+from app.metrics import record_render
+
+logger = logging.getLogger(__name__)
+
+SLOW_RENDER_SECONDS = 0.05
+
+
+class RenderTimings:
+    """
+    Render count, total and worst time per template for this process.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, template_name: str, seconds: float) -> None:
+        with self._lock:
+            count, total, worst = self._stats.get(template_name, (0, 0.0, 0.0))
+            self._stats[template_name] = (count + 1, total + seconds, max(worst, seconds))
+        if seconds >= SLOW_RENDER_SECONDS:
+            logger.warning("Slow render of %s: %.1f ms", template_name, seconds * 1000)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                name: {'count': count, 'total': total, 'mean': total / count, 'max': worst}
+                for name, (count, total, worst) in self._stats.items()
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+render_timings = RenderTimings()
+
+
+def render_to_string(template_name: str, context: dict | None = None, request: HttpRequest | None = None) -> str:
+    started = time.perf_counter()
+    try:
+        return loader.render_to_string(template_name, context, request)
+    finally:
+        elapsed = time.perf_counter() - started
+        render_timings.record(template_name, elapsed)
+        record_render(template_name, elapsed)
+
+
+def render(request: HttpRequest, template_name: str, context: dict | None = None,
+           content_type: str | None = None, status: int | None = None) -> HttpResponse:
+    """
+    Timed drop-in replacement for django.shortcuts.render().
+    """
+    content = render_to_string(template_name, context, request)
+    return HttpResponse(content, content_type, status)
+
+
+async def arender(request: HttpRequest, template_name: str, context: dict | None = None,
+                  content_type: str | None = None, status: int | None = None) -> HttpResponse:
+    """
+    render() for async views that does not block the event loop.
+    """
+    content = await sync_to_async(render_to_string)(template_name, context, request)
+    return HttpResponse(content, content_type, status)
@@ -0,0 +1,282 @@
+"""
+Read replicas.
+
+PG_REPLICAS lists streaming replicas of the primary; each one becomes a
+DATABASES alias replica_<n> (see conf.settings). PrimaryReplicaRouter
+sends reads to a replica only where stale data is harmless:
+
+* Only requests that went through PrimaryStickinessMiddleware read from
+  replicas; management commands, background tasks and tests always use
+  the primary.
+* Unsafe methods (POST, ...) read from the primary, and so does a client
+  for PRIMARY_STICKY_SECONDS after one of its requests wrote (the
+  db_primary_until cookie), so users see their own bids and orders.
+* A write pins the rest of its request to the primary, and reads inside a
+  transaction on the primary stay there.
+* Sessions and the loaders of app.cache.CatalogCache read from the
+  primary, so a lagging replica cannot log a user out or put data older
+  than the last invalidation back into the shared cache.
+* A request reads from one replica throughout, chosen at its first read.
+
+Each worker runs a ReplicaMonitor thread that measures the replay lag of
+every replica every REPLICA_LAG_CHECK_INTERVAL seconds: it remembers the
+primary's WAL position at each check, and a replica is as far behind as the
+oldest position it has not replayed yet. (The age of the last replayed
+transaction would overstate the lag of a replica that is only milliseconds
+behind after an idle period.) Replicas more than REPLICA_MAX_LAG behind,
+unreachable or promoted are taken out of rotation until they catch up; with
+none left, all reads go to the primary.
+"""
+import logging
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+import psycopg
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import HttpRequest, HttpResponse
+
+from app.au.broker import conninfo
+
+logger = logging.getLogger(__name__)
+
+STICKY_COOKIE = 'db_primary_until'
+SAFE_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS'})
+PRIMARY_ONLY_APPS = frozenset({'sessions'})
+CONNECT_TIMEOUT = 2
+
+# WAL positions, compared as byte offsets from 0/0. A server that is not in
+# recovery reports NULL: it was promoted and no longer follows the primary.
+PRIMARY_POSITION_QUERY = "SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), '0/0')::bigint"
+REPLAY_POSITION_QUERY = """
+SELECT CASE WHEN pg_is_in_recovery() THEN pg_wal_lsn_diff(pg_last_wal_replay_lsn(), '0/0')::bigint END
+"""
+
+
+@dataclass
+class RoutingState:
+    """
+    Replica routing decisions of one request.
+    """
+    primary: bool = False
+    wrote: bool = False
+    replica: str | None = None
+
+
+_state = ContextVar('replica_routing', default=None)
+
+
+@contextmanager
+def use_primary():
+    """
+    Read from the primary inside the block, whatever the request would use.
+    """
+    state = _state.get()
+    if state is None:
+        yield
+        return
+    previous, state.primary = state.primary, True
+    try:
+        yield
+    finally:
+        state.primary = previous
+
+
+class ReplicaMonitor:
+    """
+    Background thread keeping the set of replicas within REPLICA_MAX_LAG.
+    """
+    def __init__(self, aliases: list, max_lag: float, interval: float):
+        self.aliases = list(aliases)
+        self.max_lag = max_lag
+        self.interval = interval
+        self.lag = {}
+        # (monotonic time, primary WAL position) of recent checks, oldest first.
+        self._positions = deque()
+        # Replaced as a whole, so readers never see a half-updated tuple.
+        self.healthy = ()
+        self._connections = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def start(self) -> None:
+        with self._lock:
+            # Started per process, so forked workers get their own thread.
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._connections = {}
+            self._thread = threading.Thread(target=self._run, name='replica-monitor', daemon=True)
+            self._thread.start()
+
+    def pick(self) -> str | None:
+        healthy = self.healthy
+        return random.choice(healthy) if healthy else None
+
+    def _query(self, alias: str, sql: str, params=None):
+        conn = self._connections.get(alias)
+        if conn is None or conn.closed:
+            conn = psycopg.connect(conninfo(alias), autocommit=True, connect_timeout=CONNECT_TIMEOUT)
+            self._connections[alias] = conn
+        try:
+            return conn.execute(sql, params).fetchone()[0]
+        except psycopg.Error:
+            conn.close()
+            raise
+
+    def _lag(self, replayed: int, now: float) -> float:
+        """
+        Seconds since the primary was at a WAL position the replica has not replayed.
+        """
+        behind_since = None
+        for checked_at, position in reversed(self._positions):
+            if position <= replayed:
+                break
+            behind_since = checked_at
+        return 0.0 if behind_since is None else now - behind_since
+
+    def check(self) -> None:
+        """
+        Measure the lag of every replica and update the healthy set.
+        """
+        now = time.monotonic()
+        try:
+            self._positions.append((now, self._query(DEFAULT_DB_ALIAS, PRIMARY_POSITION_QUERY)))
+        except psycopg.Error:
+            logger.warning("Cannot reach the primary to measure replica lag.", exc_info=True)
+            self._positions.clear()
+        # Older positions only tell that a replica is more than max_lag behind,
+        # which the oldest kept one already shows.
+        while len(self._positions) > 1 and now - self._positions[1][0] > self.max_lag:
+            self._positions.popleft()
+        lag = {}
+        for alias in self.aliases:
+            lag[alias] = None
+            if not self._positions:
+                continue
+            try:
+                replayed = self._query(alias, REPLAY_POSITION_QUERY)
+            except psycopg.Error as exc:
+                if alias in self.healthy:
+                    logger.warning("Replica %s is unreachable: %s", alias, exc)
+                continue
+            if replayed is None:
+                if alias in self.healthy:
+                    logger.warning("Replica %s is not in recovery, taking it out of rotation.", alias)
+                continue
+            lag[alias] = self._lag(replayed, now)
+        healthy = tuple(alias for alias in self.aliases if lag[alias] is not None and lag[alias] <= self.max_lag)
+        for alias in set(self.healthy) - set(healthy):
+            if lag[alias] is not None:
+                logger.warning("Replica %s is over %.1fs behind, taking it out of rotation.", alias, lag[alias])
+        for alias in set(healthy) - set(self.healthy):
+            logger.info("Replica %s is back in rotation.", alias)
+        self.lag, self.healthy = lag, healthy
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.check()
+            except Exception:
+                logger.exception("Replica lag check failed.")
+                self.healthy = ()
+            time.sleep(self.interval)
+
+
+monitor = ReplicaMonitor(settings.REPLICA_DATABASES, settings.REPLICA_MAX_LAG, settings.REPLICA_LAG_CHECK_INTERVAL)
+
+
+class PrimaryReplicaRouter:
+    """
+    Route reads of marked requests to a healthy replica, everything else to the primary.
+    """
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state.primary or state.wrote or model._meta.app_label in PRIMARY_ONLY_APPS:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        if state.replica is None or state.replica not in monitor.healthy:
+            state.replica = monitor.pick()
+        return state.replica or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas are copies of the primary, so objects relate across them.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def _sticky(request: HttpRequest) -> bool:
+    try:
+        return float(request.COOKIES.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+class PrimaryStickinessMiddleware:
+    """
+    Let safe requests read from replicas and keep writers on the primary for a while.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REPLICA_DATABASES:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        monitor.start()
+
+    @staticmethod
+    def _state_for(request: HttpRequest) -> RoutingState:
+        return RoutingState(primary=request.method not in SAFE_METHODS or _sticky(request))
+
+    def __call__(self, request: HttpRequest):
+        if self.is_async:
+            return self.__acall__(request)
+        state = self._state_for(request)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self._finish(response, state)
+
+    async def __acall__(self, request: HttpRequest):
+        state = self._state_for(request)
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self._finish(response, state)
+
+    @staticmethod
+    def _finish(response: HttpResponse, state: RoutingState) -> HttpResponse:
+        if state.wrote:
+            seconds = settings.PRIMARY_STICKY_SECONDS
+            response.set_cookie(
+                STICKY_COOKIE, f'{time.time() + seconds:.3f}',
+                max_age=math.ceil(seconds), httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,93 @@
+"""
+Session engine with a per-worker memory tier (SESSION_ENGINE = 'app.sessions').
+
+Reads go through three tiers: a small in-process LRU that keeps each
+session for SESSION_LOCAL_TTL seconds, then the shared cache, then the
+django_session table, as with the cached_db engine. A request that finds
+its session in memory therefore costs no I/O at all.
+
+Writes still go to the database and the shared cache, but only when the
+serialized data actually differs from what was loaded: assigning a value
+that is already stored marks the session modified without causing an
+UPDATE.
+
+Another worker may keep serving its memory copy of a session for up to
+SESSION_LOCAL_TTL seconds after it was changed elsewhere, so keep that
+setting short (1s by default). That includes deletes: logout (flush) and
+login (cycle_key) drop the old session key from the database, the shared
+cache and this worker's memory, but a request that still carries the old
+cookie and reaches another worker that holds it is served the old session,
+still logged in, until that copy expires. The memory tier is not checked
+against the shared one on a hit, which would cost the I/O it saves.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+
+from app.cache import LocalLRU
+
+_local = LocalLRU(settings.SESSION_LOCAL_CACHE_SIZE)
+
+
+def _digest(payload: bytes) -> bytes:
+    return hashlib.blake2b(payload, digest_size=16).digest()
+
+
+class SessionStore(CachedDBStore):
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._loaded_digest = None
+
+    def _remember(self, data: dict) -> dict:
+        payload = self.serializer().dumps(data)
+        self._loaded_digest = _digest(payload)
+        if settings.SESSION_LOCAL_TTL > 0 and self.session_key:
+            _local.set(self.session_key, payload, settings.SESSION_LOCAL_TTL)
+        return data
+
+    def _from_local(self) -> dict | None:
+        payload = _local.get(self.session_key, None) if self.session_key else None
+        if payload is None:
+            return None
+        self._loaded_digest = _digest(payload)
+        return self.serializer().loads(payload)
+
+    def _unchanged(self) -> bool:
+        return (
+            self._loaded_digest is not None
+            and self.session_key is not None
+            and _digest(self.serializer().dumps(self._get_session())) == self._loaded_digest
+        )
+
+    def load(self):
+        data = self._from_local()
+        if data is None:
+            data = self._remember(super().load())
+        return data
+
+    async def aload(self):
+        data = self._from_local()
+        if data is None:
+            data = self._remember(await super().aload())
+        return data
+
+    def save(self, must_create=False):
+        if not must_create and self._unchanged():
+            return
+        super().save(must_create)
+        self._remember(self._get_session())
+
+    async def asave(self, must_create=False):
+        if not must_create and self._unchanged():
+            return
+        await super().asave(must_create)
+        self._remember(self._get_session())
+
+    def delete(self, session_key=None):
+        _local.delete(session_key or self.session_key)
+        super().delete(session_key)
+
+    async def adelete(self, session_key=None):
+        _local.delete(session_key or self.session_key)
+        await super().adelete(session_key)
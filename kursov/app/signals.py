@@ -0,0 +1,98 @@
+"""
+Signal handlers of the app, connected in AppConfig.ready().
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from app import ratings
+from app.au.closing import announce
+from app.cache import catalog_cache
+from app.conditional import bump_versions
+from app.microcache import purge_lot
+from app.models import Bid, Category, Comment, Product, Review
+
+
+def _bump_on_commit(namespace: str, ident='*') -> None:
+    # Readers must not reload and re-cache the old row before the write commits.
+    transaction.on_commit(lambda: catalog_cache.bump(namespace, ident))
+
+
+def _bump_lot_on_commit(product_id: int) -> None:
+    _bump_on_commit('product', product_id)
+    _bump_on_commit('lot', product_id)
+    transaction.on_commit(lambda: purge_lot(product_id))
+
+
+def _lot_rows_changed(product_id: int, using: str | None) -> None:
+    # A row listed on the lot page changed: a new version for its ETag, in
+    # the same transaction, and fresh cached payloads once it commits.
+    bump_versions([product_id], using=using or 'default')
+    _bump_lot_on_commit(product_id)
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product(sender, instance, **kwargs):
+    _bump_lot_on_commit(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+def schedule_lot_closing(sender, instance, raw=False, **kwargs):
+    if not raw:
+        announce(instance, using=kwargs.get('using') or 'default')
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_categories(sender, instance, **kwargs):
+    _bump_on_commit('category')
+
+
+@receiver(post_save, sender=Bid)
+def invalidate_lot(sender, instance, **kwargs):
+    # Bid placement updates the lot (and its version) with a queryset
+    # UPDATE, which sends no signal of its own: the new Bid row stands in
+    # for it.
+    _bump_lot_on_commit(instance.product_id)
+
+
+@receiver(post_delete, sender=Bid)
+def invalidate_lot_bids(sender, instance, **kwargs):
+    _lot_rows_changed(instance.product_id, kwargs.get('using'))
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def invalidate_lot_comments(sender, instance, **kwargs):
+    # The product payload carries the version too, so both are invalidated.
+    _lot_rows_changed(instance.product_id, kwargs.get('using'))
+
+
+@receiver(pre_save, sender=Review)
+def remember_review_rating(sender, instance, raw=False, **kwargs):
+    # The aggregates need the values the review had before this save.
+    instance._rating_before = None
+    if instance.pk is not None and not raw:
+        instance._rating_before = (
+            Review.objects.filter(pk=instance.pk).values_list('product_id', 'rating').first()
+        )
+
+
+@receiver(post_save, sender=Review)
+def add_review_to_rating(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    before = getattr(instance, '_rating_before', None)
+    after = (instance.product_id, instance.rating)
+    # The lot payload lists the latest reviews, so any change invalidates it.
+    _lot_rows_changed(instance.product_id, kwargs.get('using'))
+    if before == after:
+        return
+    if before is not None:
+        ratings.apply_review(*before, delta=-1)
+        _lot_rows_changed(before[0], kwargs.get('using'))
+    ratings.apply_review(*after, delta=1, created_at=instance.created_at)
+
+
+@receiver(post_delete, sender=Review)
+def remove_review_from_rating(sender, instance, **kwargs):
+    ratings.apply_review(instance.product_id, instance.rating, delta=-1)
+    _lot_rows_changed(instance.product_id, kwargs.get('using'))
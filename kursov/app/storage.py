@@ -0,0 +1,64 @@
+"""
+Static files storage for the nginx-served /static/ volume.
+
+collectstatic writes every file under a content-hashed name (via the
+manifest, which {% static %} uses to resolve names, with DEBUG on too: only
+hashed names get nginx's immutable caching), and then a .gz and,
+when the brotli package is installed, a .br sibling for each compressible
+file. nginx serves those directly with gzip_static/brotli_static, so assets
+are compressed once at build time, at the highest level, instead of on
+every request.
+"""
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import HashedFilesMixin, ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.mjs', '.json', '.map', '.svg', '.txt', '.xml', '.html', '.ico')
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    # Fall back to the plain name for files missing from the manifest
+    # instead of failing the whole page.
+    manifest_strict = False
+
+    def url(self, name, force=False):
+        # ManifestStaticFilesStorage keeps plain names under DEBUG.
+        try:
+            return super().url(name, force=True)
+        except ValueError:
+            # Not collected (development without collectstatic): the plain
+            # name, which the staticfiles finders serve.
+            return super(HashedFilesMixin, self).url(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = {*paths, *self.hashed_files.values()}
+        for name in sorted(names):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS) and self.exists(name):
+                self._compress(self.path(name))
+
+    @staticmethod
+    def _compress(path: str) -> None:
+        with open(path, 'rb') as f:
+            data = f.read()
+        variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append(('.br', brotli.compress(data, quality=11)))
+        for suffix, compressed in variants:
+            target = path + suffix
+            # Compressing tiny files can make them bigger; nginx then serves the original.
+            if len(compressed) >= len(data):
+                if os.path.exists(target):
+                    os.remove(target)
+                continue
+            with open(target + '.tmp', 'wb') as f:
+                f.write(compressed)
+            os.replace(target + '.tmp', target)
@@ -0,0 +1,40 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from app.catalog import LOT_DETAIL_QUERIES, RECENT_COMMENTS, RECENT_REVIEWS, TOP_BIDS, _load_lot
+from app.models import Bid, Comment, CustomUser, Product, Review
+from app.querybudget import assert_max_queries
+
+
+class LotDetailQueryCountTests(TestCase):
+    """
+    The lot detail must load in LOT_DETAIL_QUERIES queries however many
+    bids, reviews and comments the lot has.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(name="Lot", description="A lot.", price=Decimal('10.00'), stock=1)
+        users = [
+            CustomUser.objects.create(username=f'user{i}', email=f'user{i}@example.com', password='-')
+            for i in range(RECENT_COMMENTS + 5)
+        ]
+        Bid.objects.bulk_create(
+            Bid(product=cls.product, user=user, amount=Decimal(10 + i))
+            for i, user in enumerate(users[:TOP_BIDS + 5])
+        )
+        for user in users[:RECENT_REVIEWS + 5]:
+            Review.objects.create(product=cls.product, user=user, rating=4, comment="Fine.")
+        Comment.objects.bulk_create(Comment(product=cls.product, user=user, content="Hi.") for user in users)
+
+    def test_lot_detail_query_count(self):
+        with assert_max_queries(LOT_DETAIL_QUERIES):
+            lot = _load_lot(self.product.pk)
+        self.assertEqual(len(lot['bids']), TOP_BIDS)
+        self.assertEqual(len(lot['reviews']), RECENT_REVIEWS)
+        self.assertEqual(len(lot['comments']), RECENT_COMMENTS)
+        self.assertEqual(lot['review_count'], RECENT_REVIEWS + 5)
+
+    def test_missing_lot(self):
+        with assert_max_queries(1):
+            self.assertIsNone(_load_lot(0))
@@ -0,0 +1,207 @@
+"""
+Worker warm-up, run from the ASGI lifespan before a worker takes requests.
+
+A fresh uvicorn worker would otherwise make its first visitors pay for work
+done once per process: building the URL resolvers, compiling templates,
+opening database connections, filling the catalog cache and the lazy
+imports and first-call setup along the request path. uvicorn accepts
+connections only after the lifespan startup completes, so the warm-up
+steps run there:
+
+* urls: compile every URL pattern and build the reverse lookups;
+* templates: compile every template into the cached loader;
+* databases: open the connection pools (replicas best effort);
+* caches: load the categories and the newest lots into app.cache;
+* requests: send WARMUP_PATHS through the whole application in-process,
+  which warms the middleware, sessions, views and ORM queries.
+
+A step that fails (say the database is still starting) is logged, and the
+worker starts anyway but keeps retrying the failed steps in the background.
+/ready answers 503 until every step succeeded, and the compose
+healthcheck only reports the web-app healthy once it answers 200.
+"""
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import HttpRequest, JsonResponse
+from django.template import TemplateSyntaxError, engines
+from django.template.loaders.cached import Loader as CachedLoader
+from django.urls import URLResolver, get_resolver
+
+from app.catalog import get_categories, get_lot
+from app.loadtest import AsgiClient, Request
+from app.models import Product
+
+logger = logging.getLogger(__name__)
+
+RETRY_INTERVAL = 5.0
+WARM_LOTS = 20
+
+# Importing this module is close enough to the start of the worker.
+_process_started = time.monotonic()
+
+
+@dataclass
+class WarmupReport:
+    """
+    Warm-up progress of this worker, served by /ready.
+    """
+    durations: dict = field(default_factory=dict)
+    errors: dict = field(default_factory=dict)
+    ready_after: float | None = None
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_after is not None
+
+
+report = WarmupReport()
+
+
+def _compile_patterns(resolver: URLResolver) -> None:
+    # Builds the reverse lookups of the resolver's namespace.
+    resolver.reverse_dict
+    for pattern in resolver.url_patterns:
+        pattern.pattern.regex
+        if isinstance(pattern, URLResolver):
+            _compile_patterns(pattern)
+
+
+def warm_urls() -> None:
+    _compile_patterns(get_resolver())
+
+
+def warm_templates() -> None:
+    for backend in engines.all():
+        engine = getattr(backend, 'engine', None)
+        if engine is None:
+            continue
+        loaders = []
+        for loader in engine.template_loaders:
+            loaders.extend(loader.loaders if isinstance(loader, CachedLoader) else [loader])
+        if not any(isinstance(loader, CachedLoader) for loader in engine.template_loaders):
+            continue  # Loaders configured without the cached loader keep nothing.
+        for loader in loaders:
+            # The project's templates; the admin's are rarely needed.
+            directories = [d for d in loader.get_dirs() if Path(d).is_relative_to(settings.BASE_DIR)]
+            for directory in directories:
+                for path in Path(directory).rglob('*.html'):
+                    try:
+                        engine.get_template(path.relative_to(directory).as_posix())
+                    except TemplateSyntaxError as exc:
+                        logger.warning("Template %s does not compile: %s", path, exc)
+
+
+def warm_databases() -> None:
+    for alias in connections:
+        connection = connections[alias]
+        try:
+            connection.ensure_connection()
+            if connection.pool is not None:
+                # Wait until the pool holds its min_size connections.
+                connection.pool.wait(timeout=settings.WARMUP_TIMEOUT)
+        except Exception:
+            if alias == 'default':
+                raise
+            logger.warning("Could not warm database %s.", alias, exc_info=True)
+        finally:
+            connection.close()
+
+
+def warm_caches() -> None:
+    get_categories()
+    for product_id in Product.objects.order_by('-created_at', '-id').values_list('pk', flat=True)[:WARM_LOTS]:
+        get_lot(product_id)
+
+
+def _close_connections(func):
+    def run():
+        try:
+            func()
+        finally:
+            # Hand this thread's connections back to the pools.
+            connections.close_all()
+    return run
+
+
+async def warm_requests(application) -> None:
+    client = AsgiClient(application)
+    for path in settings.WARMUP_PATHS:
+        response = await client.send(Request('GET', path))
+        if response.status >= 500:
+            raise RuntimeError(f"GET {path} answered {response.status}.")
+
+
+STEPS = {
+    'urls': warm_urls,
+    'templates': warm_templates,
+    'databases': warm_databases,
+    'caches': warm_caches,
+    'requests': warm_requests,
+}
+
+
+async def _run_step(name: str, application) -> bool:
+    started = time.perf_counter()
+    step = STEPS[name]
+    try:
+        if asyncio.iscoroutinefunction(step):
+            await asyncio.wait_for(step(application), settings.WARMUP_TIMEOUT)
+        else:
+            # Not in the thread of the sync views: a step that times out
+            # keeps running, and must not hold up every request behind it.
+            call = sync_to_async(_close_connections(step), thread_sensitive=False)
+            await asyncio.wait_for(call(), settings.WARMUP_TIMEOUT)
+    except Exception as exc:
+        report.errors[name] = f'{type(exc).__name__}: {exc}'
+        logger.warning("Warm-up step %s failed: %s", name, report.errors[name])
+        return False
+    report.durations[name] = time.perf_counter() - started
+    report.errors.pop(name, None)
+    return True
+
+
+async def warm_up(application, steps=None) -> list:
+    """
+    Run the warm-up steps (default: all) through the Django ASGI application
+    in order; return the names of those that failed.
+    """
+    steps = STEPS if steps is None else steps
+    failed = [name for name in steps if not await _run_step(name, application)]
+    if not failed:
+        report.ready_after = time.monotonic() - _process_started
+    if steps and not failed:
+        logger.info(
+            "Worker %d warmed up in %.0fms (%s).", os.getpid(), sum(report.durations.values()) * 1000,
+            ', '.join(f'{name} {seconds * 1000:.0f}ms' for name, seconds in report.durations.items()),
+        )
+    return failed
+
+
+async def retry_failed(application, failed: list) -> None:
+    """
+    Background task re-running failed steps until all of them succeed.
+    """
+    while failed:
+        await asyncio.sleep(RETRY_INTERVAL)
+        failed = await warm_up(application, failed)
+
+
+def readiness_view(request: HttpRequest) -> JsonResponse:
+    """
+    200 once this worker is warm, 503 before; with the warm-up timings.
+    """
+    return JsonResponse({
+        'ready': report.ready,
+        'pid': os.getpid(),
+        'ready_after_ms': round(report.ready_after * 1000) if report.ready else None,
+        'steps_ms': {name: round(seconds * 1000, 1) for name, seconds in report.durations.items()},
+        'errors': report.errors,
+    }, status=200 if report.ready else 503)
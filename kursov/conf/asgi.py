@@ -2,6 +2,10 @@
 ASGI config for conf project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP requests are served by Django, WebSocket connections by the live-bid
+feed in app.au.live. The lifespan protocol starts and stops the background
+tasks of each worker (the auction closing scheduler and the job runner),
+after warming the worker up (app.warmup).
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -13,4 +17,66 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'conf.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+import asyncio  # noqa: E402
+import contextlib  # noqa: E402
+import logging  # noqa: E402
+
+from django.conf import settings  # noqa: E402
+
+from app.au.closing import get_scheduler  # noqa: E402  (needs configured settings)
+from app.jobs import get_runner  # noqa: E402
+from app.warmup import retry_failed, warm_up  # noqa: E402
+from app.au.live import websocket_application  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+
+def start_background_tasks() -> list:
+    tasks = []
+    if settings.AUCTION_SCHEDULER_ENABLED:
+        tasks.append(asyncio.create_task(get_scheduler().run(), name='auction-scheduler'))
+    if settings.JOB_WORKERS_ENABLED:
+        tasks.append(asyncio.create_task(get_runner().run(), name='job-runner'))
+    return tasks
+
+
+async def startup() -> list:
+    # Warm up before uvicorn lets the worker accept connections.
+    failed = await warm_up(django_application, None if settings.WARMUP_ENABLED else ())
+    tasks = start_background_tasks()
+    if failed:
+        tasks.append(asyncio.create_task(retry_failed(django_application, failed), name='warm-up-retry'))
+    return tasks
+
+
+async def lifespan(scope, receive, send):
+    tasks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                tasks = await startup()
+            except Exception as exc:
+                logger.exception("Worker startup failed.")
+                await send({'type': 'lifespan.startup.failed', 'message': str(exc)})
+                return
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            for task in tasks:
+                task.cancel()
+            for task in tasks:
+                with contextlib.suppress(asyncio.CancelledError):
+                    await task
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        await websocket_application(scope, receive, send)
+    elif scope['type'] == 'lifespan':
+        await lifespan(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -9,10 +9,13 @@ https://docs.djangoproject.com/en/5.2/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
+import copy
 import os
 
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -23,6 +26,12 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = os.getenv('DJANGO_SECRET_KEY', 'debug-key')
 
+# Build token of the deployed code, written into the image by the
+# Dockerfile. Part of the lot pages' ETags, so that clients and nginx do not
+# keep an old representation after a deploy that changes it.
+RELEASE_FILE = BASE_DIR / 'RELEASE'
+RELEASE = os.getenv('RELEASE') or (RELEASE_FILE.read_text().strip() if RELEASE_FILE.exists() else 'dev')
+
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = bool(os.getenv('DJANGO_DEBUG', 1))
 
@@ -39,13 +48,20 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'app',
 ]
 
 MIDDLEWARE = [
+    'app.metrics.MetricsMiddleware',
+    # Before anything that may do I/O, so shed requests cost next to nothing.
+    'app.admission.LoadSheddingMiddleware',
+    # Outside the session middleware, so session saves count as writes.
+    'app.replicas.PrimaryStickinessMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'app.admission.RateLimitMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -55,6 +71,10 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'conf.urls'
 
+# Request metrics: every worker writes its histograms to METRICS_DIR, /metrics merges them.
+METRICS_DIR = os.getenv('METRICS_DIR', '/tmp/kursov-metrics')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 1))
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -74,6 +94,91 @@ TEMPLATES = [
 
 ASGI_APPLICATION = 'conf.asgi.application'
 
+# Functions decorated with app.querybudget.query_budget raise when they
+# exceed their query budget; meant for development and CI, not production.
+QUERY_BUDGETS_ENFORCED = os.getenv('QUERY_BUDGETS_ENFORCED', 'False') == 'True'
+
+# Worker warm-up in the ASGI lifespan, see app.warmup. WARMUP_PATHS are
+# requested in-process once per worker before it accepts connections.
+WARMUP_ENABLED = os.getenv('WARMUP_ENABLED', 'True') == 'True'
+WARMUP_TIMEOUT = float(os.getenv('WARMUP_TIMEOUT', 30))
+WARMUP_PATHS = ('/app/main/', '/app/au/', '/app/au/lots/', '/app/au/categories/')
+
+# Admission control, see app.admission.
+# Load shedding per worker: between the target and the max of either signal
+# the share of requests answered 503 rises from 0 to all.
+LOAD_SHEDDING_ENABLED = os.getenv('LOAD_SHEDDING_ENABLED', 'True') == 'True'
+SHED_LAG_CHECK_INTERVAL = 0.05
+SHED_LOOP_LAG_TARGET = float(os.getenv('SHED_LOOP_LAG_TARGET', 0.05))
+SHED_LOOP_LAG_MAX = float(os.getenv('SHED_LOOP_LAG_MAX', 0.5))
+SHED_IN_FLIGHT_TARGET = int(os.getenv('SHED_IN_FLIGHT_TARGET', 100))
+SHED_IN_FLIGHT_MAX = int(os.getenv('SHED_IN_FLIGHT_MAX', 400))
+# Never shed: scrapes and health checks must keep working under overload.
+SHED_EXEMPT_PATHS = ('/metrics', '/ready')
+
+# Token buckets shared by the workers of a host: rate is tokens per second,
+# burst the bucket size. Per-user limits count anonymous clients by IP.
+RATE_LIMITS = {
+    'all': {'rate': 20, 'burst': 100},
+    'login': {'views': ['au:login'], 'methods': ['POST'], 'rate': 10 / 60, 'burst': 10},
+    'register': {'views': ['au:register'], 'methods': ['POST'], 'rate': 2 / 60, 'burst': 5},
+    'bid': {'scope': 'user', 'views': ['au:place_bid'], 'rate': 2, 'burst': 5},
+    'order': {'scope': 'user', 'views': ['au:place_order'], 'rate': 1, 'burst': 5},
+} if os.getenv('RATE_LIMITS_ENABLED', 'True') == 'True' else {}
+RATE_LIMIT_FILE = os.getenv(
+    'RATE_LIMIT_FILE', '/dev/shm/kursov-rate-limits' if os.path.isdir('/dev/shm') else '/tmp/kursov-rate-limits',
+)
+RATE_LIMIT_SLOTS = int(os.getenv('RATE_LIMIT_SLOTS', 65536))
+# nginx passes the client address in X-Real-IP; empty to use REMOTE_ADDR.
+RATE_LIMIT_IP_HEADER = os.getenv('RATE_LIMIT_IP_HEADER', 'HTTP_X_REAL_IP')
+# The header is only believed from these peers (nginx's address, see
+# compose.yml); anyone else could send it to pose as another client.
+RATE_LIMIT_TRUSTED_PROXIES = frozenset(
+    ip.strip() for ip in os.getenv('RATE_LIMIT_TRUSTED_PROXIES', '').split(',') if ip.strip()
+)
+# Never limited, when they connect themselves rather than forward a client:
+# in-process clients (benchmarks, warm-up) and healthchecks from loopback,
+# and nginx's internal cache refresh server once its address is added.
+RATE_LIMIT_EXEMPT_IPS = [ip.strip() for ip in os.getenv('RATE_LIMIT_EXEMPT_IPS', '127.0.0.1,::1').split(',') if ip.strip()]
+
+# Live bid feed
+# PostgresBroker reaches sockets on every uvicorn worker; InProcessBroker
+# only those of the current process (single-process development).
+
+LIVE_BIDS_BROKER = os.getenv('LIVE_BIDS_BROKER', 'app.au.broker.PostgresBroker')
+LIVE_BIDS_QUEUE_SIZE = int(os.getenv('LIVE_BIDS_QUEUE_SIZE', 64))
+
+# Closing lots at ends_at, see app.au.closing. Runs in every uvicorn worker,
+# started through the ASGI lifespan.
+AUCTION_SCHEDULER_ENABLED = os.getenv('AUCTION_SCHEDULER_ENABLED', 'True') == 'True'
+AUCTION_SCHEDULE_HORIZON = int(os.getenv('AUCTION_SCHEDULE_HORIZON', 300))
+AUCTION_CLOSE_BATCH_SIZE = int(os.getenv('AUCTION_CLOSE_BATCH_SIZE', 500))
+
+# Background jobs, see app.jobs. A runner starts in every uvicorn worker
+# through the ASGI lifespan; set JOB_WORKERS_ENABLED=False when jobs run in
+# their own container (`manage.py run_jobs`).
+JOB_WORKERS_ENABLED = os.getenv('JOB_WORKERS_ENABLED', 'True') == 'True'
+JOB_CONCURRENCY = int(os.getenv('JOB_CONCURRENCY', 4))
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', 5))
+JOB_TIMEOUT = float(os.getenv('JOB_TIMEOUT', 60))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 5))
+JOB_RETRY_DELAY = float(os.getenv('JOB_RETRY_DELAY', 10))
+JOB_RETRY_MAX_DELAY = float(os.getenv('JOB_RETRY_MAX_DELAY', 3600))
+
+# Outgoing email, sent by background jobs (app.au.notifications).
+EMAIL_BACKEND = os.getenv(
+    'EMAIL_BACKEND',
+    'django.core.mail.backends.console.EmailBackend' if DEBUG else 'django.core.mail.backends.smtp.EmailBackend',
+)
+EMAIL_HOST = os.getenv('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', 25))
+EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'False') == 'True'
+# Well under JOB_TIMEOUT, so a hanging server fails the job instead of its thread.
+EMAIL_TIMEOUT = 10
+DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'noreply@localhost')
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -89,6 +194,116 @@ DATABASES = {
     }
 }
 
+# Connection pooling
+# With PG_POOL=1 every uvicorn worker keeps a psycopg 3 pool of
+# PG_POOL_MIN_SIZE..PG_POOL_MAX_SIZE connections that request threads borrow
+# and return, so no request pays for connection setup. Otherwise connections
+# are reused per thread for CONN_MAX_AGE seconds.
+
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', 4))
+PG_MAX_CONNECTIONS = int(os.getenv('PG_MAX_CONNECTIONS', 1000))
+PG_RESERVED_CONNECTIONS = int(os.getenv('PG_RESERVED_CONNECTIONS', 100))
+PG_POOL = bool(int(os.getenv('PG_POOL', 1)))
+PG_POOL_MIN_SIZE = int(os.getenv('PG_POOL_MIN_SIZE', 4))
+PG_POOL_MAX_SIZE = int(os.getenv('PG_POOL_MAX_SIZE', 32))
+
+# Health checks validate a pooled connection before it is handed out, or a
+# persistent connection before it is reused.
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+if PG_POOL:
+    # Four extra connections per worker: the LISTEN connections of the live
+    # bid feed, the auction scheduler and the job runner, and the replica lag
+    # monitor. The reserve is left for admin sessions and management commands.
+    if WEB_CONCURRENCY * (PG_POOL_MAX_SIZE + 4) > PG_MAX_CONNECTIONS - PG_RESERVED_CONNECTIONS:
+        raise ImproperlyConfigured(
+            f"{WEB_CONCURRENCY} workers x {PG_POOL_MAX_SIZE} pooled connections "
+            f"exceed the PostgreSQL budget of {PG_MAX_CONNECTIONS} connections."
+        )
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': PG_POOL_MIN_SIZE,
+            'max_size': PG_POOL_MAX_SIZE,
+            'timeout': float(os.getenv('PG_POOL_TIMEOUT', 10)),
+            'max_idle': float(os.getenv('PG_POOL_MAX_IDLE', 300)),
+            'max_lifetime': float(os.getenv('PG_POOL_MAX_LIFETIME', 1800)),
+        },
+    }
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.getenv('PG_CONN_MAX_AGE', 60))
+
+# Read replicas
+# PG_REPLICAS is a comma separated list of host[:port] of streaming replicas
+# of the primary, each added as DATABASES['replica_<n>'] with the settings of
+# the primary and its own connection pool. app.replicas routes reads of safe
+# requests to them and drops a replica more than REPLICA_MAX_LAG seconds
+# behind; clients that wrote read from the primary for PRIMARY_STICKY_SECONDS.
+
+PG_REPLICAS = [host.strip() for host in os.getenv('PG_REPLICAS', '').split(',') if host.strip()]
+REPLICA_DATABASES = []
+for index, replica in enumerate(PG_REPLICAS):
+    host, _, port = replica.partition(':')
+    alias = f'replica_{index}'
+    DATABASES[alias] = {
+        **copy.deepcopy(DATABASES['default']),
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ['app.replicas.PrimaryReplicaRouter']
+REPLICA_MAX_LAG = float(os.getenv('REPLICA_MAX_LAG', 5))
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv('REPLICA_LAG_CHECK_INTERVAL', 1))
+PRIMARY_STICKY_SECONDS = float(os.getenv('PRIMARY_STICKY_SECONDS', REPLICA_MAX_LAG))
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# The default cache is the shared tier of app.cache.CatalogCache, so it must
+# be visible to all uvicorn workers: a file-based cache works inside one
+# container, a Redis or Memcached backend across containers.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'app.cache.ThrottledFileBasedCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', '/tmp/kursov-cache'),
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 100_000)),
+        },
+    },
+    # {% cache %} fragments of the page layout only change on deploy, so an
+    # in-process cache per worker is enough and avoids a file read per fragment.
+    'template_fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'template-fragments',
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
+    },
+}
+
+# Sessions: per-worker memory tier, then the shared cache, then the database.
+# See app/sessions.py for the staleness bound of the memory tier.
+SESSION_ENGINE = 'app.sessions'
+SESSION_LOCAL_TTL = float(os.getenv('SESSION_LOCAL_TTL', 1))
+SESSION_LOCAL_CACHE_SIZE = int(os.getenv('SESSION_LOCAL_CACHE_SIZE', 10_000))
+
+CATALOG_CACHE = {
+    'local_size': int(os.getenv('CATALOG_CACHE_LOCAL_SIZE', 1024)),
+    'local_ttl': float(os.getenv('CATALOG_CACHE_LOCAL_TTL', 5)),
+    'ttl': float(os.getenv('CATALOG_CACHE_TTL', 300)),
+    'version_ttl': float(os.getenv('CATALOG_CACHE_VERSION_TTL', 1)),
+}
+
+# nginx micro-cache of the anonymous lot pages (Dockerfiles/nginx/nginx.conf).
+# Writes refresh the pages of the lots they change through NGINX_PURGE_URL,
+# nginx's internal refresh server; empty to disable. See app.microcache.
+NGINX_PURGE_URL = os.getenv('NGINX_PURGE_URL', '')
+# Past the catalog cache's version_ttl, so no worker still serves the old lot.
+MICROCACHE_PURGE_DELAY = float(os.getenv('MICROCACHE_PURGE_DELAY', CATALOG_CACHE['version_ttl'] + 0.1))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -108,6 +323,21 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# The first hasher is used for new hashes; hashes made by the others (or
+# with fewer iterations) are upgraded on the next successful login.
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+# Threads per uvicorn worker that hash passwords, and how many more password
+# operations may wait for them before logins are answered with 503.
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+PASSWORD_HASH_QUEUE = int(os.getenv('PASSWORD_HASH_QUEUE', 32))
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -125,13 +355,42 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
 STATIC_URL = '/static/'
-STATIC_ROOT = '/static/'
-STATIC_DIR = '/var/nginx/static'
+# collectstatic output, shared with nginx through the static volume.
+STATIC_ROOT = os.getenv('STATIC_ROOT', str(BASE_DIR / 'static'))
 
 STATICFILES_DIRS = [
-    STATIC_DIR,
+    BASE_DIR / 'staticfiles',
 ]
 
+# Hashed file names plus precompressed .gz/.br siblings, see app/storage.py.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'app.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
+# Uploaded files (lot attachments), shared with nginx through the media volume.
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.getenv('MEDIA_ROOT', str(BASE_DIR / 'media'))
+
+# Resumable attachment uploads, see app/au/attachments.py.
+ATTACHMENT_MAX_SIZE = int(os.getenv('ATTACHMENT_MAX_SIZE', 20 * 1024 * 1024))
+ATTACHMENT_CHUNK_SIZE = int(os.getenv('ATTACHMENT_CHUNK_SIZE', 2 * 1024 * 1024))
+# Under ASGI Django reads the whole request body first, in memory up to this
+# size and spooled to a temporary file beyond it. A chunk plus its multipart
+# framing must fit, or every byte of it is written to disk twice.
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(os.getenv('FILE_UPLOAD_MAX_MEMORY_SIZE', 2621440))
+if ATTACHMENT_CHUNK_SIZE + 64 * 1024 > FILE_UPLOAD_MAX_MEMORY_SIZE:
+    raise ImproperlyConfigured(
+        f"ATTACHMENT_CHUNK_SIZE ({ATTACHMENT_CHUNK_SIZE}) leaves no room for the multipart framing "
+        f"below FILE_UPLOAD_MAX_MEMORY_SIZE ({FILE_UPLOAD_MAX_MEMORY_SIZE})."
+    )
+ATTACHMENT_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif', '.pdf', '.txt', '.zip')
+ATTACHMENT_UPLOADS_PER_USER = int(os.getenv('ATTACHMENT_UPLOADS_PER_USER', 2))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
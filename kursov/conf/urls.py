@@ -23,6 +23,9 @@ from django.views.i18n import JavaScriptCatalog
 from django.conf.urls.i18n import i18n_patterns
 from django.utils.translation import gettext_lazy as _
 
+from app.metrics import metrics_view
+from app.warmup import readiness_view
+
 admin.site.site_header = _('Admin Panel')
 admin.site.site_title = _('Admin Panel')
 admin.site.index_title = _('Welcome to Admin Panel')
@@ -31,4 +34,6 @@ urlpatterns = [
     path('jsi18n/', JavaScriptCatalog.as_view(), name='javascript-catalog'),
     path('admin/', admin.site.urls),
     path('app/', include('app.urls'), name='app'),
+    path('metrics', metrics_view, name='metrics'),
+    path('ready', readiness_view, name='ready'),
 ]